@@ -0,0 +1,103 @@
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+
+LOG_FORMAT = '%(asctime)s %(levelname)-7s %(threadName)s %(name)s: %(message)s'
+
+
+class RateLimitFilter(logging.Filter):
+    """
+        Drops records once a call site logs faster than its allowance, so a failure repeated on every turn
+        cannot flood the log. Each call site, identified by logger and message template, gets a token bucket;
+        the next record let through reports how many were dropped in between.
+
+        Attributes:
+            rate (float): Records per second allowed per call site.
+            burst (int): Records a call site may log at once before the rate applies.
+    """
+
+    def __init__(self, rate=5.0, burst=20):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}  # (logger, template) -> [tokens, last update, records dropped]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [self.burst, now, 0]
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                return False
+            bucket[0] -= 1
+            dropped, bucket[2] = bucket[2], 0
+        if dropped:
+            record.msg = f"{record.msg} ({dropped} similar messages dropped)"
+        return True
+
+
+class _QueueListener(logging.handlers.QueueListener):
+    # Stopping twice, e.g. by the caller and again at exit, is harmless
+    def stop(self):
+        if self._thread is not None:
+            super().stop()
+
+
+def configure_logging(level=None, path=None, max_bytes=None, backups=None, console=None):
+    """
+        Sends the application's logging through a queue to a size-rotated file, so threads that log never wait
+        on disk or console I/O. Records are filtered by level and rate on the calling thread, before anything
+        is formatted, and written by a single listener thread that is stopped at exit.
+
+        Every argument defaults to an environment variable: LOG_LEVEL (INFO), LOG_FILE (logs/app.log),
+        LOG_MAX_BYTES (5 MB), LOG_BACKUPS (3) and LOG_CONSOLE (0).
+
+        Args:
+            level (str, optional): Minimum level, e.g. 'DEBUG' or 'WARNING'.
+            path (str, optional): Log file.
+            max_bytes (int, optional): Size at which the file is rotated.
+            backups (int, optional): Rotated files kept.
+            console (bool, optional): Whether to also write to stderr.
+
+        Returns:
+            QueueListener: Listener writing the records.
+    """
+    level = (level or os.getenv('LOG_LEVEL', 'INFO')).upper()
+    path = path or os.getenv('LOG_FILE', os.path.join('logs', 'app.log'))
+    max_bytes = max_bytes if max_bytes is not None else int(os.getenv('LOG_MAX_BYTES', str(5 * 1024 * 1024)))
+    backups = backups if backups is not None else int(os.getenv('LOG_BACKUPS', '3'))
+    console = console if console is not None else os.getenv('LOG_CONSOLE', '0') == '1'
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers = [logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups,
+                                                     encoding='utf-8', delay=True)]
+    if console:
+        handlers.append(logging.StreamHandler())
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    records = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(records)
+    queue_handler.addFilter(RateLimitFilter(rate=float(os.getenv('LOG_RATE', '5')),
+                                            burst=int(os.getenv('LOG_BURST', '20'))))
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    listener = _QueueListener(records, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
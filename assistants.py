@@ -0,0 +1,323 @@
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from scheduler import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+MODES = ('Tutee', 'Tutor', 'Generate Conversation')
+ANY_SUBJECT = '*'
+CONFIG_FIELDS = ('assistant_id', 'model', 'instructions', 'max_concurrency', 'requests_per_minute')
+
+
+class AssistantConfig:
+    """
+        Assistant serving one (mode, subject) pair, with the overrides and limits applied to its runs.
+
+        Attributes:
+            mode (str): Mode served.
+            subject (str): Subject served, or '*' for every subject of the mode.
+            assistant_id (str): OpenAI assistant ID.
+            model (str or None): Model that replaces the assistant's own for its runs.
+            instructions (str or None): Instructions that replace the assistant's own for its runs.
+            max_concurrency (int or None): Runs of this assistant in flight at once.
+            requests_per_minute (int or None): Runs of this assistant started per minute.
+    """
+    __slots__ = ('mode', 'subject') + CONFIG_FIELDS
+
+    def __init__(self, mode, subject, assistant_id, model=None, instructions=None, max_concurrency=None,
+                 requests_per_minute=None):
+        self.mode = mode
+        self.subject = subject
+        self.assistant_id = assistant_id
+        self.model = model
+        self.instructions = instructions
+        self.max_concurrency = max_concurrency
+        self.requests_per_minute = requests_per_minute
+
+    def run_options(self):
+        """
+            Returns:
+                dict: Keyword arguments for runs.create or runs.stream carrying the configured overrides.
+        """
+        options = {}
+        if self.model:
+            options['model'] = self.model
+        if self.instructions:
+            options['instructions'] = self.instructions
+        return options
+
+    def limits(self):
+        return self.max_concurrency, self.requests_per_minute
+
+    def __repr__(self):
+        return f"AssistantConfig({self.mode!r}, {self.subject!r}, {self.assistant_id!r})"
+
+
+def parse_registry(data):
+    """
+        Validates a registry document and builds its lookup table.
+
+        The document maps each mode to its subjects and each subject to an object with an assistant_id and
+        optionally model, instructions, max_concurrency and requests_per_minute. The subject '*' serves every
+        subject of its mode that has no entry of its own.
+
+        Args:
+            data (dict): Parsed registry document.
+
+        Returns:
+            dict: AssistantConfig by (mode, subject).
+
+        Raises:
+            ValueError: If the document is malformed; the message lists every problem found.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Assistant registry must map modes to subjects")
+    table = {}
+    errors = []
+    for mode, subjects in data.items():
+        if mode not in MODES:
+            errors.append(f"unknown mode {mode!r}")
+            continue
+        if not isinstance(subjects, dict) or not subjects:
+            errors.append(f"{mode}: expected a non-empty object of subjects")
+            continue
+        for subject, entry in subjects.items():
+            where = f"{mode}/{subject}"
+            if not isinstance(entry, dict):
+                errors.append(f"{where}: expected an object")
+                continue
+            unknown = sorted(set(entry) - set(CONFIG_FIELDS))
+            if unknown:
+                errors.append(f"{where}: unknown fields {', '.join(unknown)}")
+            assistant_id = entry.get('assistant_id')
+            if not isinstance(assistant_id, str) or not assistant_id.startswith('asst_'):
+                errors.append(f"{where}: assistant_id must be an assistant ID like 'asst_...'")
+            for field in ('model', 'instructions'):
+                if entry.get(field) is not None and not isinstance(entry[field], str):
+                    errors.append(f"{where}: {field} must be a string")
+            for field in ('max_concurrency', 'requests_per_minute'):
+                value = entry.get(field)
+                if value is not None and (not isinstance(value, int) or isinstance(value, bool) or value < 1):
+                    errors.append(f"{where}: {field} must be a positive integer")
+            if not unknown:
+                table[(mode, subject)] = AssistantConfig(mode, subject, **entry)
+    for mode in MODES:
+        if not any(key[0] == mode for key in table):
+            errors.append(f"no assistant configured for mode {mode!r}")
+    if errors:
+        raise ValueError("Invalid assistant registry: " + "; ".join(errors))
+    return table
+
+
+class AssistantLimiter:
+    """
+        Caps the runs of one assistant: at most max_concurrency in flight and requests_per_minute started per
+        minute. Either limit may be None.
+    """
+
+    def __init__(self, max_concurrency=None, requests_per_minute=None):
+        self.limits = (max_concurrency, requests_per_minute)
+        self._slots = threading.BoundedSemaphore(max_concurrency) if max_concurrency else None
+        self._bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self._lock = threading.Lock()
+
+    def _wait_for_token(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                delay = self._bucket.delay(1, now)
+                if delay == 0:
+                    self._bucket.take(1, now)
+                    return
+            time.sleep(delay)
+
+    @contextmanager
+    def acquire(self):
+        if self._slots is not None:
+            self._slots.acquire()
+        try:
+            if self._bucket is not None:
+                self._wait_for_token()
+            yield
+        finally:
+            if self._slots is not None:
+                self._slots.release()
+
+
+class AssistantRegistry:
+    """
+        Maps (mode, subject) to the assistant serving it, loaded from a JSON file. The file is parsed once into a
+        lookup table; lookups check the file's modification time at most every reload_interval seconds and swap
+        in a new table when it changed. A file that fails validation on reload is logged and ignored, so a bad
+        edit never takes down running sessions.
+
+        Attributes:
+            path (str): Registry file.
+            reload_interval (float or None): Seconds between checks for changes; None disables hot reloading.
+    """
+
+    def __init__(self, path, reload_interval=5.0):
+        """
+            Loads the registry.
+
+            Args:
+                path (str): Registry file, see parse_registry for its format.
+                reload_interval (float or None): Seconds between checks for changes.
+
+            Raises:
+                OSError: If the file cannot be read.
+                ValueError: If the file is not valid JSON or fails validation.
+        """
+        self.path = path
+        self.reload_interval = reload_interval
+        self._table = {}
+        self._limiters = {}
+        self._mtime = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self.reload()
+
+    @classmethod
+    def from_env(cls):
+        """
+            Builds the application's registry from ASSISTANTS_FILE (assistants.json) and
+            ASSISTANTS_RELOAD_SECONDS (5; 0 disables hot reloading).
+
+            Returns:
+                AssistantRegistry: Loaded registry.
+        """
+        interval = float(os.getenv('ASSISTANTS_RELOAD_SECONDS', '5'))
+        return cls(os.getenv('ASSISTANTS_FILE', 'assistants.json'), reload_interval=interval or None)
+
+    def reload(self):
+        """
+            Reads and validates the file and replaces the lookup table. Limiters whose limits did not change are
+            kept, so runs already holding a slot are still counted.
+
+            Raises:
+                OSError: If the file cannot be read.
+                ValueError: If the file is not valid JSON or fails validation.
+        """
+        with self._lock:
+            mtime = os.stat(self.path).st_mtime_ns
+            with open(self.path, encoding='utf-8') as f:
+                try:
+                    data = json.load(f)
+                except json.JSONDecodeError as e:
+                    raise ValueError(f"Assistant registry {self.path} is not valid JSON: {e}") from e
+            table = parse_registry(data)
+            limiters = {}
+            for config in table.values():
+                if config.limits() == (None, None):
+                    continue
+                limiter = self._limiters.get(config.assistant_id)
+                if limiter is None or limiter.limits != config.limits():
+                    limiter = AssistantLimiter(*config.limits())
+                limiters[config.assistant_id] = limiter
+            self._table = table
+            self._limiters = limiters
+            self._mtime = mtime
+        logger.info("Loaded %d assistants from %s", len(table), self.path)
+
+    def reload_if_changed(self):
+        """
+            Reloads the file if it was modified since it was last loaded.
+
+            Returns:
+                bool: True if a new table was loaded.
+        """
+        try:
+            if os.stat(self.path).st_mtime_ns == self._mtime:
+                return False
+            self.reload()
+        except (OSError, ValueError) as e:
+            logger.error("Keeping the previous assistant registry: %s", e)
+            return False
+        return True
+
+    def lookup(self, mode, subject):
+        """
+            Returns the assistant serving a mode and subject.
+
+            Args:
+                mode (str): Mode.
+                subject (str): Subject.
+
+            Returns:
+                AssistantConfig: Configured assistant.
+
+            Raises:
+                KeyError: If neither the subject nor '*' is configured for the mode.
+        """
+        if self.reload_interval is not None:
+            now = time.monotonic()
+            if now >= self._next_check:
+                self._next_check = now + self.reload_interval
+                self.reload_if_changed()
+        table = self._table
+        config = table.get((mode, subject)) or table.get((mode, ANY_SUBJECT))
+        if config is None:
+            raise KeyError(f"No assistant configured for mode {mode!r} and subject {subject!r}")
+        return config
+
+    def subjects(self, mode):
+        """
+            Returns:
+                list: Subjects configured by name for a mode, sorted.
+        """
+        return sorted(subject for key_mode, subject in self._table if key_mode == mode and subject != ANY_SUBJECT)
+
+    def configs(self):
+        return list(self._table.values())
+
+    @contextmanager
+    def limit(self, config):
+        """
+            Holds one of the assistant's run slots, waiting for its concurrency and rate limits.
+
+            Args:
+                config (AssistantConfig): Assistant about to run.
+        """
+        limiter = self._limiters.get(config.assistant_id)
+        if limiter is None:
+            yield
+            return
+        with limiter.acquire():
+            yield
+
+    def validate(self, retrieve, max_workers=8):
+        """
+            Retrieves every configured assistant in parallel, so a wrong ID shows up at startup rather than in
+            the middle of a session.
+
+            Args:
+                retrieve (callable): retrieve(assistant_id) returns the assistant or raises.
+                max_workers (int): Assistants retrieved at once.
+
+            Returns:
+                tuple: (assistants by ID, list of (AssistantConfig, exception) for every entry that failed).
+        """
+        configs_by_id = {}
+        for config in self.configs():
+            configs_by_id.setdefault(config.assistant_id, []).append(config)
+        assistants = {}
+        errors = []
+        if not configs_by_id:
+            return assistants, errors
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(configs_by_id)),
+                                thread_name_prefix='assistants') as pool:
+            futures = {assistant_id: pool.submit(retrieve, assistant_id) for assistant_id in configs_by_id}
+            for assistant_id, future in futures.items():
+                try:
+                    assistants[assistant_id] = future.result()
+                except Exception as e:
+                    errors.extend((config, e) for config in configs_by_id[assistant_id])
+        for config, e in errors:
+            logger.error("Assistant %s for %s/%s failed validation: %s", config.assistant_id, config.mode,
+                         config.subject, e)
+        return assistants, errors
@@ -0,0 +1,255 @@
+import asyncio
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from openai import AsyncOpenAI
+from assistants import AssistantRegistry
+from backend import Backend, message_rows, write_export
+from cache import TTLCache
+from database import ConnectionManager, ConversationStore, fts_query
+from run_waiter import RunError, default_async_run_waiter
+from session import Session
+
+
+class AsyncBackend:
+    """
+        Coroutine version of Backend for serving many tutoring sessions from one event loop.
+
+        All per-conversation state lives in Session objects passed to each call, so any number of sessions can
+        be in flight at once. OpenAI calls go through AsyncOpenAI. SQLite work runs on a small dedicated thread
+        pool, the same way aiosqlite does, with one pooled connection per pool thread.
+
+        Turns of a single session must be awaited one after another; different sessions may run concurrently.
+
+        Attributes:
+            client (AsyncOpenAI): Async OpenAI client.
+            db_path (str): Path to SQLite database file.
+            store (ConversationStore): SQL for users, conversations and messages.
+            run_waiter (AsyncStreamingRunWaiter or AsyncPollingRunWaiter): Strategy used to wait for runs.
+            run_stats (deque): Timing statistics of the most recent runs.
+            registry (AssistantRegistry): Assistant, model and instructions by mode and subject.
+            assistant_cache (TTLCache): Assistant objects by assistant ID.
+            last_message_ids (dict): ID of the newest fetched message per thread.
+    """
+
+    def __init__(self, client=None, db_path=None, run_waiter=None, db_threads=4, registry=None):
+        """
+            Initializes the AsyncBackend object. Call initialize_database before first use.
+
+            Args:
+                client (AsyncOpenAI, optional): Client to use; one is built from OPENAI_API_KEY by default.
+                db_path (str, optional): Path to SQLite database file; defaults to SQLITE_DB_PATH.
+                run_waiter (optional): Strategy used to wait for assistant runs.
+                db_threads (int): Number of threads running SQLite work.
+                registry (AssistantRegistry, optional): Assistants by mode and subject. Defaults to the file
+                    named by ASSISTANTS_FILE.
+        """
+        self.client = client or AsyncOpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+        self.db_path = db_path or os.getenv("SQLITE_DB_PATH")
+        self.db = ConnectionManager(self.db_path)
+        self.store = ConversationStore(self.db)
+        self.run_waiter = run_waiter or default_async_run_waiter()
+        self.run_stats = deque(maxlen=100)
+        self.assistant_cache = TTLCache(maxsize=64, ttl=3600)
+        self.last_message_ids = {}
+        self.registry = registry or AssistantRegistry.from_env()
+        self._db_executor = ThreadPoolExecutor(max_workers=db_threads, thread_name_prefix='sqlite')
+
+    async def _db(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._db_executor, partial(func, *args))
+
+    async def initialize_database(self):
+        """
+            Applies any schema migrations the database has not seen yet.
+        """
+        await self._db(self.store.initialize)
+
+    async def close(self):
+        """
+            Closes the database connections and stops the SQLite threads.
+        """
+        self._db_executor.shutdown(wait=True)
+        self.db.close_all()
+        await self.client.close()
+
+    async def start_session(self, username, subject, mode):
+        """
+            Registers the username if needed and opens a session with a fresh conversation name.
+
+            Args:
+                username (str): Username.
+                subject (str): Subject.
+                mode (str): Mode ('Tutee', 'Tutor', 'Generate Conversation').
+
+            Returns:
+                Session: New session.
+        """
+        session = Session(username, subject, mode)
+        session.user_id = await self._db(self.store.get_or_create_user_id, username)
+        await self.new_conversation(session)
+        return session
+
+    async def new_conversation(self, session):
+        """
+            Moves a session on to a new conversation, which is named when its first messages are stored.
+
+            Args:
+                session (Session): Session to update.
+        """
+        session.conversation_name = None
+        session.thread_id = None
+
+    async def generate_response(self, session, message_body, on_delta=None):
+        """
+            Sends a message in the session's conversation and returns the assistant's reply.
+
+            Args:
+                session (Session): Session.
+                message_body (str): Message body.
+                on_delta (callable, optional): Called with each fragment of the reply as it arrives.
+
+            Returns:
+                str: New message generated by the assistant.
+        """
+        if session.thread_id is None and session.conversation_name is not None:
+            session.thread_id = await self._db(self.store.find_thread, session.user_id, session.conversation_name)
+        if session.thread_id is None:
+            session.thread_id = (await self.client.beta.threads.create()).id
+
+        await self.client.beta.threads.messages.create(
+            thread_id=session.thread_id,
+            role="user",
+            content=message_body,
+        )
+        return await self.run_assistant(session, on_delta)
+
+    async def run_assistant(self, session, on_delta=None):
+        """
+            Runs the session's assistant on its thread and stores the new messages.
+
+            Args:
+                session (Session): Session with a thread.
+                on_delta (callable, optional): Called with each fragment of the reply as it arrives.
+
+            Returns:
+                str: New message generated by the assistant.
+        """
+        config = self.registry.lookup(session.mode, session.subject)
+        assistant = await self.get_assistant(config.assistant_id)
+        streamed = []
+
+        def forward(delta):
+            streamed.append(delta)
+            if on_delta is not None:
+                on_delta(delta)
+
+        try:
+            run, stats = await self.run_waiter.wait(self.client, session.thread_id, assistant.id, on_delta=forward,
+                                                    **config.run_options())
+        except RunError as e:
+            self.run_stats.append(e.stats)
+            raise
+        self.run_stats.append(stats)
+
+        messages = await self.fetch_new_messages(session.thread_id)
+        new_message = next(message for message in reversed(messages)
+                           if message.role == "assistant").content[0].text.value
+        if on_delta is not None and not streamed:
+            on_delta(new_message)
+        await self.store_conversation(session, messages)
+        return new_message
+
+    async def get_assistant(self, assistant_id):
+        """
+            Retrieves an assistant, using the cached copy when it has not expired.
+
+            Args:
+                assistant_id (str): Assistant ID.
+
+            Returns:
+                Assistant: Assistant object.
+        """
+        assistant = self.assistant_cache.get(assistant_id)
+        if assistant is None:
+            assistant = await self.client.beta.assistants.retrieve(assistant_id)
+            self.assistant_cache.set(assistant_id, assistant)
+        return assistant
+
+    async def fetch_new_messages(self, thread_id):
+        """
+            Fetches the messages added to a thread since the last fetch, oldest first, across all pages.
+
+            Args:
+                thread_id (str): Thread ID.
+
+            Returns:
+                list: New Message objects in chronological order.
+        """
+        after = self.last_message_ids.get(thread_id)
+        if after is None:
+            after = await self._db(self.store.last_message_id, thread_id)
+        params = {"thread_id": thread_id, "order": "asc", "limit": 100}
+        if after is not None:
+            params["after"] = after
+        messages = [message async for message in self.client.beta.threads.messages.list(**params)]
+        if messages:
+            self.last_message_ids[thread_id] = messages[-1].id
+        return messages
+
+    async def store_conversation(self, session, messages):
+        """
+            Stores new messages of the session's conversation.
+
+            Args:
+                session (Session): Session.
+                messages (list): Messages not stored yet, oldest first.
+
+            Returns:
+                int: ID of the conversation row.
+        """
+        conversation_id, session.conversation_name = await self._db(
+            self.store.append_messages, session.thread_id, message_rows(messages), session.user_id,
+            session.username, session.subject, session.mode, session.conversation_name)
+        return conversation_id
+
+    async def get_user_id_by_username(self, username):
+        return await self._db(self.store.get_user_id, username)
+
+    async def retrieve_conversations_by_mode(self, user_id):
+        return await self._db(self.store.conversations_by_mode, user_id)
+
+    async def retrieve_conversations_by_username(self, username):
+        return await self._db(self.store.conversations_by_username, username)
+
+    async def retrieve_user_counts(self, username, search=None, after=None, limit=100):
+        return await self._db(self.store.user_counts, username, search, after, limit)
+
+    async def retrieve_mode_counts(self, username, search=None):
+        return await self._db(self.store.mode_counts, username, search)
+
+    async def retrieve_conversation_names(self, username, mode, search=None, after=None, limit=100):
+        return await self._db(self.store.conversation_names, username, mode, search, after, limit)
+
+    async def search_conversations(self, query, filters=None, limit=50):
+        match = fts_query(query)
+        if match is None:
+            return []
+        return await self._db(partial(self.store.search_messages, match, limit, **(filters or {})))
+
+    async def retrieve_previous_conversation(self, user_id, conversation_name):
+        return await self._db(self.store.conversation, user_id, conversation_name)
+
+    async def retrieve_messages(self, conversation_id, after=None, limit=None):
+        return await self._db(self.store.messages, conversation_id, after, limit)
+
+    async def remove_conversation(self, conversation_name, user_id):
+        await self._db(self.store.remove_conversation, user_id, conversation_name)
+
+    async def export_conversation(self, format_of_export, conversation_name, username, user_id, path):
+        conversation = await self.retrieve_previous_conversation(user_id, conversation_name)
+        # Rendering is CPU-bound, so keep it off the event loop
+        await asyncio.to_thread(write_export, format_of_export, conversation, username, conversation_name, path)
+
+    assistant_id_for = Backend.assistant_id_for
+    format_conversation = staticmethod(Backend.format_conversation)
@@ -1,139 +1,327 @@
-import sqlite3
-import json
-from openai import OpenAI
 from dotenv import load_dotenv
-from docx import Document
-from fpdf import FPDF
-import time
 import os
+import logging
+import contextvars
+import io
 import datetime
-import random
+import heapq
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from operator import itemgetter
+from assistants import AssistantRegistry
+from cache import TTLCache
+from database import ConnectionManager, ConversationStore, fts_query
+from metrics import Metrics, read_jsonl
+from response_cache import ResponseCache
+from run_waiter import RunError, default_run_waiter
+from scheduler import ScheduledClient, default_scheduler
+from warm_threads import WarmThread, WarmThreadPool
+from session import Session
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+def metrics_directory():
+    """
+        Directory turn metrics are appended to: METRICS_DIR, or a metrics folder next to the SQLite database so
+        stations sharing the database also share their metrics. METRICS_DIR set to an empty value keeps metrics
+        in memory only.
+
+        Returns:
+            str or None: Directory, or None when metrics are not persisted.
+    """
+    directory = os.getenv("METRICS_DIR")
+    if directory is not None:
+        return directory or None
+    db_path = os.getenv("SQLITE_DB_PATH")
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)) if db_path else '.', 'metrics')
+
+
+OPENING_PROMPTS = {'Generate Conversation': 'Continue Conversation'}
+
+
+@lru_cache(maxsize=4096)
+def format_timestamp(timestamp):
+    """
+        Formats a Unix timestamp for transcripts. Cached, since consecutive messages often share a second.
+
+        Args:
+            timestamp (int): Unix timestamp.
+
+        Returns:
+            str: Local time as YYYY-MM-DD HH:MM:SS.
+    """
+    return datetime.datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def opening_prompt(mode):
+    """
+        Returns the message the GUI sends to open a conversation in a mode.
+
+        Args:
+            mode (str): Mode ('Tutee', 'Tutor', 'Generate Conversation').
+
+        Returns:
+            str: Opening message.
+    """
+    return OPENING_PROMPTS.get(mode, 'Start')
+
+
+def message_rows(messages):
+    """
+        Converts OpenAI thread messages into rows for ConversationStore.append_messages.
+
+        Args:
+            messages (list): Message objects, oldest first.
+
+        Returns:
+            list: (role, content, created_at, message_id) tuples.
+    """
+    return [(message.role, message.content[0].text.value, message.created_at, message.id)
+            for message in messages if message.role in ("user", "assistant")]
+
+
+EXPORT_EXTENSIONS = {'Word Doc': 'docx', 'PDF': 'pdf'}
+PDF_LINE_HEIGHT = 8
+
+
+def transcript_paragraphs(conversation, messages=None):
+    """
+        Yields a transcript one paragraph at a time, so writers never hold the whole text.
+
+        Tutor and Tutee transcripts have one paragraph per message, labelled with its time and speaker. Generated
+        transcripts carry both speakers inside the assistant messages, so they get a timestamp heading followed
+        by one paragraph per assistant message.
+
+        Args:
+            conversation (dict): Conversation data. Unless messages is given, its messages list is used, which
+                ConversationStore.conversation fills in stored order; conversations without one have their
+                user_messages and assistant_messages merged by timestamp.
+            messages (iterable, optional): Message dicts with role, content and timestamp in time order, e.g.
+                from ConversationStore.iter_messages.
+
+        Yields:
+            tuple: (label, text) of the next paragraph; the label is shown in bold and may be empty.
+    """
+    if not conversation:
+        yield "", "Conversation not found."
+        return
+    if messages is None:
+        # Stored order breaks ties between messages of the same second, which a merge by timestamp cannot
+        messages = conversation.get("messages")
+    if messages is None:
+        # Both lists are already in time order, so a stable merge interleaves them in linear time and
+        # each message keeps the role of the list it came from
+        messages = heapq.merge(({"role": "user", **message} for message in conversation.get("user_messages", [])),
+                               ({"role": "assistant", **message}
+                                for message in conversation.get("assistant_messages", [])),
+                               key=itemgetter("timestamp"))
+    if conversation.get('mode', 'Mode') != 'Generate Conversation':
+        speakers = {"user": conversation.get('username', 'User'),
+                    "assistant": f"{conversation.get('subject', 'Subject')} Tutee"}
+        for message in messages:
+            yield f"({format_timestamp(message['timestamp'])}) {speakers[message['role']]}: ", message["content"]
+    else:
+        heading = True
+        for message in messages:
+            if message["role"] != "assistant":
+                continue
+            if heading:
+                yield f"({format_timestamp(message['timestamp'])})", ""
+                heading = False
+            yield "", message["content"]
+
+
+def pdf_text(text):
+    # The core PDF fonts only cover latin-1; replace anything else instead of failing the whole export
+    return text.encode('latin-1', 'replace').decode('latin-1')
+
+
+def render_export(format_of_export, conversation, messages=None):
+    """
+        Renders a conversation as a Word document or PDF in memory, one paragraph per message with the speaker
+        in bold. A module-level function, so bulk exports can run it in worker processes.
+
+        Args:
+            format_of_export (str): 'Word Doc' or 'PDF'.
+            conversation (dict or None): Conversation data from retrieve_previous_conversation.
+            messages (iterable, optional): Messages to render instead of the lists in conversation.
+
+        Returns:
+            bytes: Contents of the file.
+    """
+    paragraphs = transcript_paragraphs(conversation, messages)
+    # The export libraries are imported on first use; they are slow to load and most sessions never export
+    if format_of_export == 'Word Doc':
+        from docx import Document
+        doc = Document()
+        for label, text in paragraphs:
+            paragraph = doc.add_paragraph()
+            if label:
+                paragraph.add_run(label).bold = True
+            if text:
+                paragraph.add_run(text)
+        buffer = io.BytesIO()
+        doc.save(buffer)
+        return buffer.getvalue()
+    elif format_of_export == 'PDF':
+        from fpdf import FPDF
+        pdf = FPDF()
+        pdf.set_auto_page_break(True, margin=15)
+        pdf.add_page()
+        # write() flows each paragraph onto the page as it comes; one multi_cell over the whole transcript
+        # re-measures the entire string and slows down badly on long conversations
+        for label, text in paragraphs:
+            if label:
+                pdf.set_font("Arial", style='B', size=12)
+                pdf.write(PDF_LINE_HEIGHT, pdf_text(label))
+            if text:
+                pdf.set_font("Arial", size=12)
+                pdf.write(PDF_LINE_HEIGHT, pdf_text(text))
+            pdf.ln(PDF_LINE_HEIGHT * 1.5)
+        data = pdf.output(dest='S')
+        # fpdf 1.7 returns the document as a latin-1 str
+        return data.encode('latin-1') if isinstance(data, str) else bytes(data)
+    raise ValueError(f"Unknown export format: {format_of_export}")
+
+
+def write_export(format_of_export, conversation, username, conversation_name, path, messages=None):
+    """
+        Writes a conversation to a Word document or PDF named "<username> - <conversation name>".
+
+        Args:
+            format_of_export (str): 'Word Doc' or 'PDF'.
+            conversation (dict or None): Conversation data from retrieve_previous_conversation.
+            username (str): Username used in the file name.
+            conversation_name (str): Conversation name used in the file name.
+            path (str): Directory to write to.
+            messages (iterable, optional): Messages to render instead of the lists in conversation.
+    """
+    data = render_export(format_of_export, conversation, messages)
+    extension = EXPORT_EXTENSIONS[format_of_export]
+    with open(os.path.join(path, f"{username} - {conversation_name}.{extension}"), 'wb') as file:
+        file.write(data)
+
 
 class Backend:
     """
         Backend class for managing conversations and database operations.
 
+        The backend keeps no per-conversation state: callers pass a Session to every conversation call, so one
+        instance can serve several conversations from different threads.
+
         Attributes:
-            client (OpenAI): OpenAI client for accessing API.
+            client (ScheduledClient): OpenAI client for accessing API, wrapped by the request scheduler. Built on
+                first use, so constructing a Backend does not import openai.
+            scheduler (RequestScheduler): Rate limits, prioritizes and retries OpenAI requests.
             db_path (str): Path to SQLite database file.
-            global_conversation_name (str): Global conversation name.
-            global_user_id (int): Global user ID.
-            global_subject (str): Global subject.
-            global_mode (str): Global mode.
-            tutee_assistant_ids (dict): Dictionary mapping subjects to assistant IDs.
+            db (ConnectionManager): Per-thread pooled connections to the database.
+            store (ConversationStore): SQL for users, conversations and messages.
+            registry (AssistantRegistry): Assistant, model, instructions and limits by mode and subject.
+            run_waiter (PollingRunWaiter or StreamingRunWaiter): Strategy used to wait for assistant runs.
+            run_stats (deque): Timing statistics of the most recent runs.
+            metrics (Metrics): Durations of the stages of recent turns, labelled with subject and mode, appended
+                to METRICS_DIR after every turn.
+            last_message_ids (dict): ID of the newest fetched message per thread.
+            assistant_cache (TTLCache): Assistant objects by assistant ID.
+            thread_cache (TTLCache): Thread IDs by (user ID, conversation name).
+            thread_pool (WarmThreadPool): Threads created ahead of time per subject and mode.
+            pregenerate_openers (bool): Whether pooled threads also carry a pre-generated opening reply.
+            response_cache (ResponseCache or None): Cached first replies, when RESPONSE_CACHE=1.
+            seed_cached_threads (bool): Cleared when the API refuses threads seeded with cached replies.
     """
 
-    def __init__(self):
+    def __init__(self, run_waiter=None, client=None, scheduler=None, registry=None, initialize=True):
         """
             Initializes the Backend object.
-        """
-        OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
-        self.client = OpenAI(api_key=OPENAI_API_KEY)
+
+            Args:
+                run_waiter (PollingRunWaiter or StreamingRunWaiter, optional): Strategy used to wait for
+                    assistant runs. Defaults to streaming with a polling fallback.
+                client (OpenAI, optional): Client to use; one is built from OPENAI_API_KEY by default.
+                scheduler (RequestScheduler, optional): Admits and retries every OpenAI request. Defaults to
+                    limits read from the environment.
+                registry (AssistantRegistry, optional): Assistants by mode and subject. Defaults to the file
+                    named by ASSISTANTS_FILE.
+                initialize (bool): Whether to migrate the database now. Pass False to call initialize_database
+                    later, e.g. in the background while the login screen is up.
+        """
+        self.scheduler = scheduler or default_scheduler()
+        self._client = ScheduledClient(client, self.scheduler) if client is not None else None
+        self._client_lock = threading.Lock()
         self.db_path = os.getenv("SQLITE_DB_PATH")  # Path to SQLite database file
-        self.global_conversation_name = ''
-        self.global_user_id = 0
-        self.global_subject = ''
-        self.global_mode = ''
-        self.generate_conversation_mode = ''
-        self.tutee_assistant_ids = {
-            'Writing': 'asst_xqPTYqajw69DTFS2yidhYVBJ',
-            'Chemistry': 'asst_M2fmEombFqQpmZHUmUBgkfVJ',
-            'Biology': 'asst_A3KVHx9Rp7oM8l585JUAEbIU',
-            'Physics': 'asst_2cDZXQUhhR9nvH93rx5dhTG8',
-            'Nursing': 'asst_SCNZeLiWbJ1XmkLM9GTINtPV',
-            'Math': 'asst_cPu94bL3l0kzcPaExKM270Cx',
-            'Business': 'asst_ySOkMWNC06ql3weCpYQN1Pdi'
-        }
-        self.generate_conversation_ids = {
-            'Writing': 'asst_WqDmAHC9pa4UV38zYlTPo69x',
-            'Chemistry': 'asst_IJwae2Gyx5lIfAHqyok1YseB',
-            'Biology': 'asst_rrg0vXS9kakM0ahggvSd4l0z',
-            'Physics': 'asst_cXq2JK7cFj6CEixHb9AYiyPV',
-            'Nursing': 'asst_4A9ckkItbVIkUV9lECsEUScH',
-            'Math': 'asst_VfXLcUHfYqn83qddaLHk0bPx',
-            'Business': 'asst_rzDLQwfj6ZZIIB5u0RsuwDIO'
-        }
-        self.initialize_database()
+        self.db = ConnectionManager(self.db_path)
+        self.store = ConversationStore(self.db)
+        self.run_waiter = run_waiter or default_run_waiter()
+        self.run_stats = deque(maxlen=100)
+        self.metrics = Metrics(capacity=int(os.getenv("METRICS_CAPACITY", "5000")), directory=metrics_directory())
+        self.last_message_ids = {}
+        self.assistant_cache = TTLCache(maxsize=64, ttl=3600)
+        self.thread_cache = TTLCache(maxsize=1024)
+        self.registry = registry or AssistantRegistry.from_env()
+        self.pregenerate_openers = os.getenv("PREGENERATE_OPENERS", "0") == "1"
+        self.response_cache = None
+        if os.getenv("RESPONSE_CACHE", "0") == "1":
+            self.response_cache = ResponseCache(self.db, max_entries=int(os.getenv("RESPONSE_CACHE_SIZE", "500")))
+        self.seed_cached_threads = True
+        self._stream_executor = ThreadPoolExecutor(max_workers=int(os.getenv("STREAM_THREADS", "8")),
+                                                   thread_name_prefix='stream')
+        self.thread_pool = WarmThreadPool(self.prepare_thread, self.discard_thread,
+                                          size=int(os.getenv("WARM_THREADS_PER_KEY", "2")),
+                                          ttl=float(os.getenv("WARM_THREAD_TTL", "1800")))
+        if initialize:
+            self.initialize_database()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    from openai import OpenAI
+                    # The scheduler owns retries, so the client must not retry on its own as well
+                    self._client = ScheduledClient(OpenAI(api_key=os.environ.get("OPENAI_API_KEY"), max_retries=0),
+                                                   self.scheduler)
+        return self._client
 
     def initialize_database(self):
         """
-            Initializes the database by creating necessary tables if they don't exist.
-        """
-        # Create database tables if they don't exist
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        c.execute('''CREATE TABLE IF NOT EXISTS Conversations (
-                        _id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        thread_id TEXT,
-                        user_id INTEGER,
-                        username TEXT,
-                        subject TEXT,
-                        mode TEXT,
-                        conversation_name TEXT,
-                        user_messages TEXT,
-                        assistant_messages TEXT
-                     )''')
-        c.execute('''CREATE TABLE IF NOT EXISTS User_ID (
-                            user_id INTEGER PRIMARY KEY,
-                            username TEXT
-                         )''')
-        conn.commit()
-        conn.close()
-
-    def generate_user_id(self):
-        """
-            Generates a random user ID.
-
-            Returns:
-                int: Random user ID.
+            Initializes the database by applying any schema migrations it has not seen yet.
         """
-        self.global_user_id = random.randint(100, 999)
-        return self.global_user_id
+        # Create or upgrade the database tables
+        self.store.initialize()
 
-    def create_conversation_name(self):
+    def start_session(self, username, subject, mode):
         """
-            Creates a new conversation name based on subject and mode.
+            Registers the username if needed and opens a session on a new conversation.
 
-            Returns:
-                str: New conversation name.
-        """
-        # Find the maximum conversation number among existing conversations for the current user
-        max_conversation_number = 0
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        c.execute('''SELECT conversation_name FROM Conversations WHERE user_id = ?''', (self.global_user_id,))
-        existing_conversations = c.fetchall()
-        for conversation_tuple in existing_conversations:
-            conversation_name = conversation_tuple[0]  # Extract conversation name from tuple
-            if conversation_name and (conversation_name.startswith(
-                    f"{self.global_subject} {self.global_mode} Conversation ") or (conversation_name.startswith(
-                    f"{self.global_subject} Generated Conversation ")) and self.global_mode == 'Generate Conversation'):
-                conversation_number = int(conversation_name.split(" ")[-1])
-                max_conversation_number = max(max_conversation_number, conversation_number)
-
-        # Increment the maximum conversation number to generate the next conversation name
-        new_conversation_number = max_conversation_number + 1
-        if self.global_mode == "Generate Conversation":
-            self.global_conversation_name = (f"{self.global_subject} Generated Conversation "
-                                             f"{new_conversation_number}")
+            Args:
+                username (str): Username.
+                subject (str): Subject.
+                mode (str): Mode ('Tutee', 'Tutor', 'Generate Conversation').
 
-        else:
-            self.global_conversation_name = (f"{self.global_subject} {self.global_mode} "
-                                             f"Conversation {new_conversation_number}")
-        print("new generated conversation name: ", self.global_conversation_name)
-        return self.global_conversation_name
+            Returns:
+                Session: New session.
+        """
+        session = Session(username, subject, mode, user_id=self.check_username(username))
+        self.thread_pool.prime(subject, mode)
+        return session
 
-    def get_user_id(self):
+    def new_conversation(self, session):
         """
-            Retrieves the global user ID.
+            Moves a session on to a new conversation. The conversation is named when its first messages are
+            stored, so one that is never used does not take a number.
 
-            Returns:
-                int: Global user ID.
+            Args:
+                session (Session): Session to update.
         """
-        return self.global_user_id
+        session.conversation_name = None
+        session.thread_id = None
+        logger.debug("New conversation for user_id %s", session.user_id)
 
     def get_user_id_by_username(self, username):
         """
@@ -145,22 +333,7 @@ class Backend:
         Returns:
             int: User ID associated with the username.
         """
-        print("username:", username)
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        c.execute('''SELECT user_id FROM User_ID WHERE username = ?''', (username,))
-        user_id = c.fetchone()[0]  # Assuming username is unique and fetching the first result
-        conn.close()
-        return user_id
-
-    def get_conversation_name(self):
-        """
-            Retrieves the global conversation name.
-
-            Returns:
-                str: Global conversation name.
-        """
-        return self.global_conversation_name
+        return self.store.get_user_id(username)
 
     def check_username(self, username):
         """
@@ -173,37 +346,19 @@ class Backend:
             Returns:
                 int: User ID.
         """
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        c.execute('''SELECT user_id FROM User_ID WHERE username = ?''', (username,))
-        user_data = c.fetchone()
-        if user_data:
-            self.global_user_id = user_data[0]
-            return self.global_user_id
-        else:
-            self.global_user_id = self.generate_user_id()
-            c.execute('''INSERT INTO User_ID (user_id, username) VALUES (?, ?)''', (self.global_user_id, username))
-            conn.commit()
-            conn.close()
-            return self.global_user_id
+        return self.store.get_or_create_user_id(username)
 
-    def set_subject(self, subject_name):
+    def assistant_id_for(self, session):
         """
-            Sets the global subject.
+            Returns the assistant that serves a session's subject and mode.
 
             Args:
-                subject_name (str): Subject name.
-        """
-        self.global_subject = subject_name
-
-    def set_mode(self, mode):
-        """
-            Sets the global mode.
+                session (Session): Session.
 
-            Args:
-                mode (str): Mode ('Tutee', 'Tutor', 'Generate Conversation').
+            Returns:
+                str: Assistant ID.
         """
-        self.global_mode = mode
+        return self.registry.lookup(session.mode, session.subject).assistant_id
 
     def check_if_thread_exists(self, user_id, conversation_name):
         """
@@ -216,140 +371,404 @@ class Backend:
             Returns:
                 str or None: Thread ID if exists, None otherwise.
         """
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        c.execute('''SELECT thread_id FROM Conversations 
-                     WHERE user_id = ? AND conversation_name = ?''', (user_id, conversation_name))
-        thread = c.fetchone()
-        conn.close()
-        return thread[0] if thread else None
+        return self.store.find_thread(user_id, conversation_name)
 
-    def generate_response(self, message_body, user_id, name, conversation_name):
+    @staticmethod
+    def metric_labels(session):
+        return {"subject": session.subject, "mode": session.mode}
+
+    def generate_response(self, session, message_body, on_delta=None):
         """
             Generates a response using the OpenAI assistant and stores the conversation in the database.
 
             Args:
+                session (Session): Session of the conversation; its thread ID is filled in on the first turn.
                 message_body (str): Message body.
-                user_id (int): User ID.
-                name (str): Username.
-                conversation_name (str): Conversation name.
+                on_delta (callable, optional): Called with each fragment of the reply as it arrives.
 
             Returns:
                 str: New message generated by the assistant.
         """
-        thread_id = self.check_if_thread_exists(user_id, conversation_name)
+        try:
+            with self.metrics.span('turn', self.metric_labels(session)):
+                return self._generate_response(session, message_body, on_delta)
+        finally:
+            self.flush_metrics()
+
+    def flush_metrics(self):
+        """
+            Appends the spans recorded since the last flush to the metrics directory. A failed write is logged and
+            never fails the turn.
+        """
+        try:
+            self.metrics.flush()
+        except OSError as e:
+            logger.warning("Could not write metrics to %s: %s", self.metrics.directory, e)
 
-        if thread_id is None:
-            print(f"Creating new thread for {name} with user_id {user_id}")
-            thread = self.client.beta.threads.create()
-            thread_id = thread.id
+    def load_metrics(self, days=7):
+        """
+            Reads the spans every station sharing the metrics directory recorded recently, or this process's own
+            spans when metrics are not persisted.
+
+            Args:
+                days (float): How far back to read.
+
+            Returns:
+                list: SpanRecords.
+        """
+        if self.metrics.directory is None:
+            return self.metrics.records()
+        self.flush_metrics()
+        return read_jsonl(self.metrics.directory, since=time.time() - days * 86400)
+
+    def _generate_response(self, session, message_body, on_delta=None):
+        labels = self.metric_labels(session)
+        first_turn = False
+        warm_thread = None
+        if session.thread_id is None:
+            # A conversation without a name has not stored anything yet, so it cannot have a thread
+            if session.conversation_name is not None:
+                with self.metrics.span('thread_lookup', labels):
+                    session.thread_id = self.thread_cache.get_or_load(
+                        (session.user_id, session.conversation_name),
+                        lambda: self.check_if_thread_exists(session.user_id, session.conversation_name))
+            if session.thread_id is None:
+                first_turn = True
+                cached_reply = self.serve_cached_reply(session, message_body, on_delta)
+                if cached_reply is not None:
+                    return cached_reply
+                warm_thread = self.claim_thread(session.subject, session.mode, message_body)
+                if warm_thread is not None:
+                    logger.debug("Using pre-created thread for user_id %s", session.user_id)
+                    session.thread_id = warm_thread.thread_id
+                else:
+                    logger.debug("Creating new thread for user_id %s", session.user_id)
+                    with self.metrics.span('thread_create', labels):
+                        session.thread_id = self.client.beta.threads.create().id
+            else:
+                logger.debug("Using existing thread for user_id %s", session.user_id)
+
+        if warm_thread is not None and warm_thread.opener is not None:
+            new_message = self.use_opener(session, warm_thread, on_delta)
         else:
-            print(f"Retrieving existing thread for {name} with wa_id {user_id}")
-            thread = self.client.beta.threads.retrieve(thread_id)
-
-        self.client.beta.threads.messages.create(
-            thread_id=thread_id,
-            role="user",
-            content=message_body,
-        )
-
-        new_message = self.run_assistant(thread, user_id, name, conversation_name)
-        print("Current conversation: ", conversation_name)
-        print(f"To {name}:", new_message)
+            with self.metrics.span('message_create', labels):
+                self.client.beta.threads.messages.create(
+                    thread_id=session.thread_id,
+                    role="user",
+                    content=message_body,
+                )
+            new_message = self.run_assistant(session, on_delta)
+        if first_turn and self.response_cache is not None:
+            config = self.registry.lookup(session.mode, session.subject)
+            self.response_cache.add(config.assistant_id, [message_body], session.mode, new_message,
+                                    config.run_options())
+        # Only the size of the reply is logged; transcripts stay out of the log
+        logger.debug("Reply of %d characters in %s for user_id %s", len(new_message), session.conversation_name,
+                     session.user_id)
         return new_message
 
-    def run_assistant(self, thread, user_id, name, conversation_name):
+    def generate_response_stream(self, session, message_body):
         """
-            Runs the OpenAI assistant and retrieves messages for a given thread.
+            Generates a response like generate_response, yielding the reply in fragments as they arrive.
+            The request runs on one of the backend's stream threads so fragments can be consumed while the run
+            is in progress. The threads are reused, so each keeps one pooled database connection.
 
             Args:
-                thread (Thread): Thread object.
-                user_id (int): User ID.
-                name (str): Username.
-                conversation_name (str): Conversation name.
+                session (Session): Session of the conversation.
+                message_body (str): Message body.
+
+            Yields:
+                str: Next fragment of the assistant's reply.
+        """
+        deltas = queue.Queue()
+        done = object()
+        errors = []
+
+        def produce():
+            try:
+                self.generate_response(session, message_body, on_delta=deltas.put)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                deltas.put(done)
+
+        # Run in a copy of the caller's context so the request priority carries over to the stream thread
+        self._stream_executor.submit(contextvars.copy_context().run, produce)
+        while True:
+            delta = deltas.get()
+            if delta is done:
+                break
+            yield delta
+        if errors:
+            raise errors[0]
+
+    def run_assistant(self, session, on_delta=None):
+        """
+            Runs the session's assistant on its thread and stores the new messages.
+
+            Args:
+                session (Session): Session with a thread.
+                on_delta (callable, optional): Called with each fragment of the reply as it arrives. When the
+                    run waiter cannot stream, it is called once with the whole reply.
 
             Returns:
                 str: New message generated by the assistant.
         """
-        if self.global_mode == 'Generate Conversation':
-            assistant_id = self.generate_conversation_ids[self.global_subject]
-        elif self.global_mode == 'Tutee':
-            assistant_id = self.tutee_assistant_ids[self.global_subject]
-        elif self.global_mode == 'Tutor':
-            assistant_id = 'asst_8beVxeg82dDaJ1jUaP8tDy4n'
-        else:
-            assistant_id = 'asst_8beVxeg82dDaJ1jUaP8tDy4n'
-        print("Generate Conversation Mode:", self.generate_conversation_mode, "Assistant:", assistant_id)
-        assistant = self.client.beta.assistants.retrieve(f"{assistant_id}")
-
-        run = self.client.beta.threads.runs.create(
-            thread_id=thread.id,
-            assistant_id=assistant.id,
-        )
-
-        while run.status != "completed":
-            time.sleep(0.5)
-            run = self.client.beta.threads.runs.retrieve(thread_id=thread.id, run_id=run.id)
-
-        messages = self.client.beta.threads.messages.list(thread_id=thread.id)
-        new_message = messages.data[0].content[0].text.value
-        self.store_conversation(thread, messages, user_id, name, conversation_name)
+        new_message, messages = self._run(session, on_delta)
+        self.store_conversation(session, messages)
         return new_message
 
-    def store_conversation(self, thread, conversation, user_id, name, conversation_name):
+    def _run(self, session, on_delta=None):
+        # Runs the assistant and returns (reply, new messages) without storing anything
+        config = self.registry.lookup(session.mode, session.subject)
+        logger.debug("Running assistant %s for mode %s", config.assistant_id, session.mode)
+        labels = self.metric_labels(session)
+        with self.metrics.span('assistant_retrieve', labels):
+            assistant = self.get_assistant(config.assistant_id)
+
+        streamed = []
+
+        def forward(delta):
+            streamed.append(delta)
+            if on_delta is not None:
+                on_delta(delta)
+
+        try:
+            with self.registry.limit(config):
+                run, stats = self.run_waiter.wait(self.client, session.thread_id, assistant.id, on_delta=forward,
+                                                  **config.run_options())
+        except RunError as e:
+            self.run_stats.append(e.stats)
+            self.record_run(e.stats, labels, ok=False)
+            raise
+        self.run_stats.append(stats)
+        self.record_run(stats, labels)
+        logger.debug("Run stats: %r", stats)
+
+        with self.metrics.span('message_list', labels):
+            messages = self.fetch_new_messages(session.thread_id)
+        new_message = next(message for message in reversed(messages)
+                           if message.role == "assistant").content[0].text.value
+        if on_delta is not None and not streamed:
+            on_delta(new_message)
+        return new_message, messages
+
+    def record_run(self, stats, labels, ok=True):
+        # The waiter already times the run, so its stats become the run_create and run_wait spans
+        self.metrics.record('run_create', stats.create_seconds, labels, ok)
+        self.metrics.record('run_wait', stats.total_seconds, labels, ok)
+
+    def get_assistant(self, assistant_id):
+        """
+            Retrieves an assistant, using the cached copy when it has not expired.
+
+            Args:
+                assistant_id (str): Assistant ID.
+
+            Returns:
+                Assistant: Assistant object.
+        """
+        return self.assistant_cache.get_or_load(assistant_id,
+                                                lambda: self.client.beta.assistants.retrieve(assistant_id))
+
+    def validate_assistants(self, max_workers=8):
         """
-            Stores the conversation in the database.
+            Retrieves every assistant in the registry in parallel and caches the ones found, so misconfigured
+            IDs are reported at startup instead of in the middle of a session.
 
             Args:
-                thread (Thread): Thread object.
-                conversation (Conversation): Conversation object.
-                user_id (int): User ID.
-                name (str): Username.
-                conversation_name (str): Conversation name.
+                max_workers (int): Assistants retrieved at once.
+
+            Returns:
+                list: (AssistantConfig, exception) pairs of the entries that failed; empty when all are valid.
         """
-        thread_id = thread.id
-        user_messages = []
-        assistant_messages = []
-        for message in conversation.data:
-            if message.role == "user":
-                user_messages.append({
-                    "content": message.content[0].text.value,
-                    "timestamp": message.created_at
-                })
-            elif message.role == "assistant":
-                assistant_messages.append({
-                    "content": message.content[0].text.value,
-                    "timestamp": message.created_at
-                })
-
-        # Convert user_messages and assistant_messages to JSON strings
-        user_messages_json = json.dumps(user_messages)
-        assistant_messages_json = json.dumps(assistant_messages)
-
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-
-        # Check if a conversation with the same thread_id exists
-        c.execute('''SELECT * FROM Conversations WHERE thread_id = ?''', (thread_id,))
-        existing_conversation = c.fetchone()
-
-        if existing_conversation:
-            # Update the existing row
-            c.execute('''UPDATE Conversations 
-                         SET user_messages = ?, assistant_messages = ?
-                         WHERE thread_id = ?''',
-                      (user_messages_json, assistant_messages_json, thread_id))
-        else:
-            # Insert a new row
-            c.execute('''INSERT INTO Conversations 
-                         (thread_id, user_id, username, subject, mode, conversation_name, user_messages, 
-                         assistant_messages)
-                         VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
-                      (thread_id, user_id, name, self.global_subject, self.global_mode, conversation_name,
-                       user_messages_json, assistant_messages_json))
+        assistants, errors = self.registry.validate(self.client.beta.assistants.retrieve, max_workers)
+        for assistant_id, assistant in assistants.items():
+            self.assistant_cache.set(assistant_id, assistant)
+        return errors
 
-        conn.commit()
-        conn.close()
+    def prepare_thread(self, subject, mode):
+        """
+            Creates a thread for the warm thread pool, generating the opening turn too when
+            pregenerate_openers is set.
+
+            Args:
+                subject (str): Subject.
+                mode (str): Mode.
+
+            Returns:
+                WarmThread: Prepared thread.
+        """
+        thread_id = self.client.beta.threads.create().id
+        if not self.pregenerate_openers:
+            return WarmThread(thread_id)
+        opener = opening_prompt(mode)
+        self.client.beta.threads.messages.create(thread_id=thread_id, role="user", content=opener)
+        reply, messages = self._run(Session(None, subject, mode, thread_id=thread_id))
+        return WarmThread(thread_id, opener, reply, messages)
+
+    def discard_thread(self, warm_thread):
+        """
+            Deletes a pooled thread that expired or was never used.
+
+            Args:
+                warm_thread (WarmThread): Thread to delete.
+        """
+        self.client.beta.threads.delete(warm_thread.thread_id)
+        self.last_message_ids.pop(warm_thread.thread_id, None)
+
+    def serve_cached_reply(self, session, message_body, on_delta=None):
+        """
+            Answers a conversation's first message from the response cache. The cached exchange is written into
+            a new thread, so the assistant sees it on later turns. If the API refuses assistant messages in a
+            new thread, seeding is switched off and the caller runs the assistant as usual.
+
+            Args:
+                session (Session): Session without a thread yet.
+                message_body (str): First message of the conversation.
+                on_delta (callable, optional): Called once with the whole reply.
+
+            Returns:
+                str or None: Cached reply, or None if the assistant has to run.
+        """
+        if self.response_cache is None or not self.seed_cached_threads:
+            return None
+        config = self.registry.lookup(session.mode, session.subject)
+        reply = self.response_cache.lookup(config.assistant_id, [message_body], session.mode, config.run_options())
+        if reply is None:
+            return None
+        from openai import BadRequestError
+        try:
+            thread = self.client.beta.threads.create(messages=[{"role": "user", "content": message_body},
+                                                               {"role": "assistant", "content": reply}])
+        except BadRequestError as e:
+            logger.warning("Cannot seed threads with cached replies, disabling the response cache for this run: %s",
+                           e)
+            self.seed_cached_threads = False
+            return None
+        logger.debug("Serving cached reply for user_id %s", session.user_id)
+        session.thread_id = thread.id
+        self.store_conversation(session, self.fetch_new_messages(thread.id))
+        if on_delta is not None:
+            on_delta(reply)
+        return reply
+
+    def claim_thread(self, subject, mode, message_body):
+        """
+            Takes a prepared thread for a conversation's first message. A thread whose pre-generated opener
+            does not match the message cannot be used and is discarded.
+
+            Args:
+                subject (str): Subject.
+                mode (str): Mode.
+                message_body (str): First message of the conversation.
+
+            Returns:
+                WarmThread or None: Usable prepared thread, or None if the pool had none.
+        """
+        warm_thread = self.thread_pool.claim(subject, mode)
+        if warm_thread is not None and warm_thread.opener not in (None, message_body):
+            self.thread_pool.discard_later([warm_thread])
+            return None
+        return warm_thread
+
+    def use_opener(self, session, warm_thread, on_delta=None):
+        """
+            Answers a conversation's opening message with the reply pre-generated on its thread.
+
+            Args:
+                session (Session): Session that claimed the thread.
+                warm_thread (WarmThread): Claimed thread with a pre-generated opener.
+                on_delta (callable, optional): Called once with the whole reply.
+
+            Returns:
+                str: Pre-generated reply.
+        """
+        self.store_conversation(session, warm_thread.messages)
+        if on_delta is not None:
+            on_delta(warm_thread.reply)
+        return warm_thread.reply
+
+    def close(self):
+        """
+            Deletes unused pooled threads, stops the stream threads and closes the database connections.
+        """
+        self.thread_pool.close()
+        self._stream_executor.shutdown(wait=True)
+        self.flush_metrics()
+        self.db.close_all()
+
+    def invalidate_caches(self):
+        """
+            Drops every cached assistant and thread, e.g. after assistants were edited on the OpenAI side.
+        """
+        self.assistant_cache.clear()
+        self.thread_cache.clear()
+
+    def cache_stats(self):
+        """
+            Returns hit/miss counters of the assistant and thread caches.
+
+            Returns:
+                dict: Counters by cache name.
+        """
+        return {"assistants": self.assistant_cache.stats(), "threads": self.thread_cache.stats()}
+
+    def fetch_new_messages(self, thread_id):
+        """
+            Fetches the messages added to a thread since the last fetch, oldest first, following pagination
+            so long turns are never truncated.
+
+            Args:
+                thread_id (str): Thread ID.
+
+            Returns:
+                list: New Message objects in chronological order.
+        """
+        after = self.last_message_ids.get(thread_id)
+        if after is None:
+            after = self.get_last_stored_message_id(thread_id)
+        params = {"thread_id": thread_id, "order": "asc", "limit": 100}
+        if after is not None:
+            params["after"] = after
+        # Iterating the page follows the cursor through every remaining page
+        messages = list(self.client.beta.threads.messages.list(**params))
+        if messages:
+            self.last_message_ids[thread_id] = messages[-1].id
+        return messages
+
+    def get_last_stored_message_id(self, thread_id):
+        """
+            Retrieves the OpenAI ID of the newest stored message of a thread.
+
+            Args:
+                thread_id (str): Thread ID.
+
+            Returns:
+                str or None: Message ID, or None if nothing from the thread is stored yet.
+        """
+        return self.store.last_message_id(thread_id)
+
+    def store_conversation(self, session, conversation):
+        """
+            Stores the conversation in the database, naming the session's conversation if this is its first write.
+
+            Args:
+                session (Session): Session the messages belong to.
+                conversation (list): Messages not stored yet, oldest first.
+
+            Returns:
+                int: ID of the conversation row.
+        """
+        labels = self.metric_labels(session)
+        with self.metrics.span('serialize', labels):
+            rows = message_rows(conversation)
+        with self.metrics.span('sqlite_write', labels):
+            conversation_id, session.conversation_name = self.store.append_messages(
+                session.thread_id, rows, session.user_id, session.username, session.subject, session.mode,
+                session.conversation_name)
+        self.thread_cache.set((session.user_id, session.conversation_name), session.thread_id)
+        return conversation_id
 
     def retrieve_conversations_by_mode(self, user_id):
         """
@@ -361,19 +780,7 @@ class Backend:
             Returns:
                 dict: Dictionary of conversations grouped by mode.
         """
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        c.execute('''SELECT mode, conversation_name FROM Conversations WHERE user_id = ?''', (user_id,))
-        conversations = c.fetchall()
-        conn.close()
-
-        conversations_by_mode = {}
-        for mode, conversation_name in conversations:
-            if mode not in conversations_by_mode:
-                conversations_by_mode[mode] = []
-            conversations_by_mode[mode].append(conversation_name)
-
-        return conversations_by_mode
+        return self.store.conversations_by_mode(user_id)
 
     def retrieve_conversations_by_username(self, username):
         """
@@ -385,22 +792,70 @@ class Backend:
         Returns:
             dict: Dictionary of conversations grouped by username and mode.
         """
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        c.execute('''SELECT username, mode, conversation_name FROM Conversations WHERE username != ?''',
-                  (username,))
-        conversations = c.fetchall()
-        conn.close()
-
-        conversations_by_username = {}
-        for username, mode, conversation_name in conversations:
-            if username not in conversations_by_username:
-                conversations_by_username[username] = {}
-            if mode not in conversations_by_username[username]:
-                conversations_by_username[username][mode] = []
-            conversations_by_username[username][mode].append(conversation_name)
-        print(conversations_by_username)
-        return conversations_by_username
+        return self.store.conversations_by_username(username)
+
+    def retrieve_user_counts(self, username, search=None, after=None, limit=100):
+        """
+            Retrieves one page of the users other than the specified username, with their number of conversations.
+
+            Args:
+                username (str): Username of the user to exclude.
+                search (str, optional): Only count conversations whose username or name contains this text.
+                after (str, optional): Last username of the previous page.
+                limit (int): Page size.
+
+            Returns:
+                list: (username, conversation count) tuples in username order.
+        """
+        return self.store.user_counts(username, search, after, limit)
+
+    def retrieve_mode_counts(self, username, search=None):
+        """
+            Retrieves the modes a user has conversations in, with the number of conversations in each.
+
+            Args:
+                username (str): Username.
+                search (str, optional): Only count conversations whose username or name contains this text.
+
+            Returns:
+                list: (mode, conversation count) tuples.
+        """
+        return self.store.mode_counts(username, search)
+
+    def retrieve_conversation_names(self, username, mode, search=None, after=None, limit=100):
+        """
+            Retrieves one page of a user's conversations in one mode.
+
+            Args:
+                username (str): Username.
+                mode (str): Mode.
+                search (str, optional): Only return conversations whose username or name contains this text.
+                after (int, optional): Last conversation ID of the previous page.
+                limit (int): Page size.
+
+            Returns:
+                list: (conversation ID, conversation name) pairs, oldest first.
+        """
+        return self.store.conversation_names(username, mode, search, after, limit)
+
+    def search_conversations(self, query, filters=None, limit=50):
+        """
+            Searches the text of stored conversations.
+
+            Args:
+                query (str): Words to search for, as typed by the user.
+                filters (dict, optional): username, subject, mode, and since/until Unix timestamps bounding the
+                    first message.
+                limit (int): Maximum number of matches.
+
+            Returns:
+                list: Matching messages, best first, each with its conversation and a snippet with the matched
+                    words in [brackets].
+        """
+        match = fts_query(query)
+        if match is None:
+            return []
+        return self.store.search_messages(match, limit, **(filters or {}))
 
     def retrieve_previous_conversation(self, user_id, conversation_name):
         """
@@ -413,47 +868,21 @@ class Backend:
             Returns:
                 dict or None: Previous conversation data.
         """
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        c.execute('''SELECT * FROM Conversations 
-                     WHERE user_id = ? AND conversation_name = ?''', (user_id, conversation_name))
-        conversation_data = c.fetchone()
-        conn.close()
-        if conversation_data:
-            conversation = {
-                "thread_id": conversation_data[1],  # Assuming thread_id is at index 1
-                "user_id": conversation_data[2],  # Assuming user_id is at index 2
-                "username": conversation_data[3],  # Assuming username is at index 3
-                "subject": conversation_data[4],  # Assuming subject is at index 4
-                "mode": conversation_data[5],  # Assuming mode is at index 5
-                "conversation_name": conversation_data[6],  # Assuming conversation_name is at index 6
-                "user_messages": [],
-                "assistant_messages": []
-            }
-            # Retrieve user and assistant messages
-            user_messages_json = conversation_data[7]  # Assuming user_messages is at index 7
-            assistant_messages_json = conversation_data[8]  # Assuming assistant_messages is at index 8
-
-            user_messages = json.loads(user_messages_json)
-            assistant_messages = json.loads(assistant_messages_json)
-
-            for message_data in user_messages:
-                message = {
-                    "content": message_data["content"],
-                    "timestamp": message_data["timestamp"]
-                }
-                conversation["user_messages"].append(message)
-
-            for message_data in assistant_messages:
-                message = {
-                    "content": message_data["content"],
-                    "timestamp": message_data["timestamp"]
-                }
-                conversation["assistant_messages"].append(message)
-
-            return conversation
-        else:
-            return None
+        return self.store.conversation(user_id, conversation_name)
+
+    def retrieve_messages(self, conversation_id, after=None, limit=None):
+        """
+            Retrieves the messages of a conversation in chronological order, optionally one page at a time.
+
+            Args:
+                conversation_id (int): ID of the conversation row.
+                after (tuple, optional): (timestamp, _id) of the last message of the previous page.
+                limit (int, optional): Maximum number of messages to return.
+
+            Returns:
+                list: Message dicts with _id, role, content, timestamp and message_id.
+        """
+        return self.store.messages(conversation_id, after, limit)
 
     def remove_conversation(self, conversation_name, user_id):
         """
@@ -463,29 +892,15 @@ class Backend:
                 conversation_name (str): Conversation name.
                 user_id: User_ID
         """
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        c.execute('''DELETE FROM Conversations 
-                     WHERE user_id = ? AND conversation_name = ?''', (user_id, conversation_name))
-        conn.commit()
-        conn.close()
+        self.thread_cache.invalidate((user_id, conversation_name))
+        self.store.remove_conversation(user_id, conversation_name)
 
     def export_conversation(self, format_of_export, conversation_name, username, user_id, path):
-        print("username:", username)
-        print("conversation name:", conversation_name)
-        conversation = self.retrieve_previous_conversation(user_id, conversation_name)
-        formatted_conversation = self.format_conversation(conversation)
-        if format_of_export == 'Word Doc':
-            doc = Document()
-            doc.add_paragraph(formatted_conversation)
-            doc.save(os.path.join(path, f"{username} - {conversation_name}.docx"))
-        elif format_of_export == 'PDF':
-            pdf = FPDF()
-            pdf.add_page()
-            pdf.set_font("Arial", size=12)
-            pdf.multi_cell(0, 10, formatted_conversation)
-            pdf.output(os.path.join(path, f"{username} - {conversation_name}.pdf"))
-        return
+        logger.debug("Exporting %s of user_id %s as %s", conversation_name, user_id, format_of_export)
+        # Messages are paged in from the database while the document is written, not loaded up front
+        conversation = self.store.conversation(user_id, conversation_name, with_messages=False)
+        messages = self.store.iter_messages(conversation["conversation_id"]) if conversation else None
+        write_export(format_of_export, conversation, username, conversation_name, path, messages)
 
     @staticmethod
     def format_conversation(conversation):
@@ -500,35 +915,5 @@ class Backend:
         """
         if not conversation:
             return "Conversation not found."
-
-        formatted_conversation = ""
-
-        user_messages = conversation.get("user_messages", [])
-        assistant_messages = conversation.get("assistant_messages", [])
-        username = conversation.get('username', 'User')
-        subject = conversation.get('subject', 'Subject')
-        mode = conversation.get('mode', 'Mode')
-        print("mode in formatted conversation:", mode)
-        if mode != 'Generate Conversation':
-
-            combined_messages = sorted(user_messages + assistant_messages, key=lambda x: x['timestamp'])
-
-            for message in combined_messages:
-                role = username if message in user_messages else f'{subject} Tutee'
-
-                content = message["content"]
-                timestamp = message["timestamp"]
-
-                timestamp_str = datetime.datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
-
-                formatted_conversation += f"({timestamp_str}) {role}: {content}\n\n"
-            return formatted_conversation
-
-        else:
-            timestamp = assistant_messages[0]["timestamp"]
-            timestamp_str = datetime.datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
-            formatted_conversation += f"({timestamp_str})\n"
-            for message in assistant_messages:
-                content = message["content"]
-                formatted_conversation += f"{content}\n"
-            return formatted_conversation
+        separator = "\n" if conversation.get('mode') == 'Generate Conversation' else "\n\n"
+        return "".join([f"{label}{text}{separator}" for label, text in transcript_paragraphs(conversation)])
@@ -0,0 +1,223 @@
+"""
+    Generates many 'Generate Conversation' transcripts without the GUI.
+
+    Each transcript gets its own session and thread. Transcripts run concurrently on a bounded pool of workers and
+    are stored through the normal Backend path, so they show up in the GUI like hand-made ones. Every request runs
+    at BATCH priority, so the backend's scheduler lets interactive turns on the same key go first. Failed requests
+    are retried by the scheduler only, within its retry budget; runs that fail on a rate limit or server error
+    are retried here with jittered exponential backoff.
+
+    Usage:
+        python batch.py Math Biology --count 20 --workers 4
+        SQLITE_DB_PATH=/tmp/batch.db python batch.py Writing --count 50 --fake   # offline, against FakeOpenAI
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import openai
+from app_logging import configure_logging
+from assistants import AssistantRegistry
+from backend import Backend
+from fake_openai import FakeOpenAI
+from run_waiter import PollingRunWaiter, RunError
+from scheduler import BATCH, priority, retry_after
+
+MODE = 'Generate Conversation'
+PROMPT = 'Continue Conversation'
+
+
+def is_retryable(error):
+    """
+        Decides whether a failed transcript is worth trying again. Failed requests are not: the scheduler has
+        already retried them until its attempts or the global retry budget ran out. Only runs that the API
+        ended on a rate limit or server error are retried here.
+
+        Args:
+            error (Exception): Error raised while generating the transcript.
+
+        Returns:
+            bool: True for runs that failed with rate_limit_exceeded or server_error.
+    """
+    if isinstance(error, RunError):
+        last_error = getattr(error.run, 'last_error', None)
+        return getattr(last_error, 'code', None) in ('rate_limit_exceeded', 'server_error')
+    return False
+
+
+class BatchReport:
+    """
+        Thread-safe tally of a batch run.
+
+        Attributes:
+            completed (int): Transcripts stored.
+            retries (int): Attempts repeated after a retryable error.
+            failures (list): (subject, error) pairs of transcripts that gave up.
+    """
+
+    def __init__(self, total):
+        self.total = total
+        self.completed = 0
+        self.retries = 0
+        self.failures = []
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def record_success(self, subject, conversation_name):
+        with self._lock:
+            self.completed += 1
+            done = self.completed + len(self.failures)
+        print(f"[{done}/{self.total}] {conversation_name}")
+
+    def record_retry(self, subject, error, delay):
+        with self._lock:
+            self.retries += 1
+        print(f"Retrying {subject} in {delay:.1f}s after {type(error).__name__}: {error}")
+
+    def record_failure(self, subject, error):
+        with self._lock:
+            self.failures.append((subject, error))
+            done = self.completed + len(self.failures)
+        print(f"[{done}/{self.total}] {subject} failed: {type(error).__name__}: {error}")
+
+    def summary(self, run_stats=()):
+        """
+            Formats the throughput and failure report.
+
+            Args:
+                run_stats (iterable): RunStats of the batch, used for the mean run time.
+
+            Returns:
+                str: Multi-line report.
+        """
+        elapsed = time.perf_counter() - self.started
+        lines = [f"Transcripts: {self.completed} stored, {len(self.failures)} failed, {self.retries} retries",
+                 f"Elapsed: {elapsed:.1f}s, throughput: {self.completed * 60 / elapsed if elapsed else 0:.1f} "
+                 f"transcripts/min"]
+        totals = [stats.total_seconds for stats in run_stats if stats.total_seconds is not None]
+        if totals:
+            lines.append(f"Mean run time: {sum(totals) / len(totals):.2f}s over {len(totals)} runs")
+        for subject, error in self.failures:
+            lines.append(f"  {subject}: {type(error).__name__}: {error}")
+        return "\n".join(lines)
+
+
+def generate_transcript(backend, username, subject, turns, report, max_attempts=5, base_delay=1.0,
+                        max_delay=60.0):
+    """
+        Generates and stores one transcript, retrying retryable errors with backoff.
+
+        Args:
+            backend (Backend): Backend shared by all workers.
+            username (str): User the transcripts are stored under.
+            subject (str): Subject of the transcript.
+            turns (int): Number of 'Continue Conversation' turns.
+            report (BatchReport): Report to record the outcome in.
+            max_attempts (int): Attempts per turn before giving up.
+            base_delay (float): Backoff before the first retry, in seconds.
+            max_delay (float): Upper bound of a single backoff, in seconds.
+    """
+    try:
+        session = backend.start_session(username, subject, MODE)
+        for _ in range(turns):
+            posted = False
+            for attempt in range(1, max_attempts + 1):
+                try:
+                    with priority(BATCH):
+                        if posted:
+                            # The prompt is already on the thread; posting it again would duplicate it
+                            backend.run_assistant(session)
+                        else:
+                            backend.generate_response(session, PROMPT)
+                    break
+                except Exception as e:
+                    # A failed run means the prompt was posted first
+                    posted = posted or isinstance(e, RunError)
+                    if attempt == max_attempts or not is_retryable(e):
+                        raise
+                    delay = retry_after(e)
+                    if delay is None:
+                        delay = random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
+                    report.record_retry(subject, e, delay)
+                    time.sleep(delay)
+    except Exception as e:
+        report.record_failure(subject, e)
+    else:
+        report.record_success(subject, session.conversation_name)
+
+
+def run_batch(backend, subjects, count, workers=4, turns=1, username='Batch Generator', **retry_options):
+    """
+        Generates count transcripts for every subject with at most `workers` in flight at once.
+
+        Args:
+            backend (Backend): Backend to generate and store through.
+            subjects (list): Subjects to generate for.
+            count (int): Transcripts per subject.
+            workers (int): Maximum number of transcripts generated concurrently.
+            turns (int): 'Continue Conversation' turns per transcript.
+            username (str): User the transcripts are stored under.
+            **retry_options: max_attempts, base_delay and max_delay for generate_transcript.
+
+        Returns:
+            BatchReport: Outcome of the batch.
+    """
+    jobs = [subject for subject in subjects for _ in range(count)]
+    report = BatchReport(len(jobs))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='batch') as pool:
+        futures = [pool.submit(generate_transcript, backend, username, subject, turns, report, **retry_options)
+                   for subject in jobs]
+        for future in as_completed(futures):
+            future.result()
+    return report
+
+
+def parse_args(argv=None, subjects=()):
+    parser = argparse.ArgumentParser(description="Generate 'Generate Conversation' transcripts in parallel.")
+    parser.add_argument('subjects', nargs='+', choices=subjects, metavar='subject',
+                        help=f"subjects to generate for: {', '.join(subjects)}")
+    parser.add_argument('--count', type=int, default=1, help='transcripts per subject (default 1)')
+    parser.add_argument('--workers', type=int, default=4, help='transcripts generated at once (default 4)')
+    parser.add_argument('--turns', type=int, default=1, help='turns per transcript (default 1)')
+    parser.add_argument('--username', default='Batch Generator', help='user the transcripts are stored under')
+    parser.add_argument('--max-attempts', type=int, default=5, help='attempts per turn before giving up')
+    parser.add_argument('--base-url', default=os.getenv('OPENAI_BASE_URL'),
+                        help='OpenAI API base URL, e.g. a proxy or an OpenAI-compatible server')
+    parser.add_argument('--fake', action='store_true',
+                        help='generate offline against the in-memory FakeOpenAI client instead of the API')
+    parser.add_argument('--poll', action='store_true', help='poll runs instead of streaming them')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    registry = AssistantRegistry.from_env()
+    args = parse_args(argv, registry.subjects(MODE))
+    configure_logging()
+    if args.fake:
+        client = FakeOpenAI()
+    else:
+        # The backend's scheduler retries with Retry-After aware backoff, so the client must not retry on its own
+        client = openai.OpenAI(api_key=os.environ.get("OPENAI_API_KEY"), base_url=args.base_url, max_retries=0)
+    backend = Backend(run_waiter=PollingRunWaiter() if args.poll else None, client=client, registry=registry)
+    # A wrong assistant ID would fail every transcript, so check them all before starting any
+    errors = backend.validate_assistants()
+    if errors:
+        for config, error in errors:
+            print(f"Assistant {config.assistant_id} for {config.mode}/{config.subject}: {type(error).__name__}: "
+                  f"{error}")
+        backend.close()
+        return 2
+    # Cached openers would repeat across transcripts, so every batch transcript is generated fresh
+    backend.response_cache = None
+    report = run_batch(backend, args.subjects, args.count, args.workers, args.turns, args.username,
+                       max_attempts=args.max_attempts)
+    print(report.summary(backend.run_stats))
+    backend.close()
+    return 1 if report.failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+"""
+    Drives Backend.generate_response through multi-turn sessions against FakeOpenAI and a scratch SQLite
+    database. Reports turn throughput, turn latency percentiles, time per stage of a turn (including the
+    SQLite work), API calls per turn and retries, so backend changes can be measured offline.
+
+    Usage:
+        python benchmarks/bench_backend.py [--sessions N] [--turns N] [--concurrency N] [--latency S]
+                                           [--run-seconds S] [--failure-rate P] [--poll] [--warm N]
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from assistants import AssistantRegistry  # noqa: E402
+from backend import Backend, opening_prompt  # noqa: E402
+from fake_openai import FakeOpenAI  # noqa: E402
+from metrics import percentile  # noqa: E402
+from run_waiter import PollingRunWaiter  # noqa: E402
+from scheduler import RequestScheduler  # noqa: E402
+
+MODES = ("Tutee", "Tutor", "Generate Conversation")
+STUDENT_LINES = ("Can you explain that again?", "I think the answer is twelve, is that right?",
+                 "What should I do first?", "Why does that step work?", "Could you give me another example?")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', type=int, default=40, help="Conversations to run.")
+    parser.add_argument('--turns', type=int, default=5, help="Turns per conversation, including the opener.")
+    parser.add_argument('--concurrency', type=int, default=8, help="Conversations running at once.")
+    parser.add_argument('--latency', type=float, default=0.02, help="Seconds per fake API call.")
+    parser.add_argument('--jitter', type=float, default=0.01, help="Random extra seconds per call and run.")
+    parser.add_argument('--run-seconds', type=float, default=0.3, help="Seconds a fake run takes.")
+    parser.add_argument('--failure-rate', type=float, default=0.0, help="Probability of an injected 429/500.")
+    parser.add_argument('--poll', action='store_true', help="Poll runs instead of streaming them.")
+    parser.add_argument('--warm', type=int, default=2, help="Warm threads kept per subject and mode.")
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args(argv)
+
+
+def run_session(backend, number, turns, rng):
+    subject = rng.choice(backend.registry.subjects('Generate Conversation'))
+    mode = rng.choice(MODES)
+    session = backend.start_session(f"bench{number % 10}", subject, mode)
+    latencies = []
+    for turn in range(turns):
+        message = opening_prompt(mode) if turn == 0 else rng.choice(STUDENT_LINES)
+        started = time.perf_counter()
+        backend.generate_response(session, message)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Retries are counted in the report; logging each one would only interleave with it
+    logging.basicConfig(level=logging.ERROR)
+    rng = random.Random(args.seed)
+    os.environ['SQLITE_DB_PATH'] = os.path.join(tempfile.mkdtemp(), 'bench_backend.db')
+    fake = FakeOpenAI(latency=args.latency, jitter=args.jitter, run_seconds=args.run_seconds,
+                      failure_rate=args.failure_rate, retry_after=0.05, stream=not args.poll, seed=args.seed)
+    registry = AssistantRegistry(os.getenv('ASSISTANTS_FILE', os.path.join(ROOT, 'assistants.json')),
+                                 reload_interval=None)
+    backend = Backend(run_waiter=PollingRunWaiter(initial_delay=0.05, max_delay=0.2) if args.poll else None,
+                      client=fake, scheduler=RequestScheduler(max_concurrency=args.concurrency * 2, base_delay=0.05),
+                      registry=registry)
+    # Cached replies would skip runs and hide the cost being measured
+    backend.response_cache = None
+    backend.thread_pool.size = args.warm
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        futures = [pool.submit(run_session, backend, number, args.turns, random.Random(rng.random()))
+                   for number in range(args.sessions)]
+        latencies = []
+        failed = 0
+        for future in futures:
+            try:
+                latencies.extend(future.result())
+            except Exception as e:
+                failed += 1
+                print(f"Session failed: {type(e).__name__}: {e}")
+    elapsed = time.perf_counter() - started
+    backend.close()
+
+    latencies.sort()
+    turns = len(latencies)
+    print(f"{args.sessions} sessions x {args.turns} turns, concurrency {args.concurrency}, "
+          f"{'polling' if args.poll else 'streaming'}, {args.latency * 1000:.0f} ms per call, "
+          f"{args.run_seconds:.2f} s per run")
+    print(f"{turns} turns in {elapsed:.2f}s: {turns / elapsed:.1f} turns/s, {failed} sessions failed")
+    if latencies:
+        print(f"turn latency p50 {percentile(latencies, 0.5) * 1000:.0f} ms, "
+              f"p95 {percentile(latencies, 0.95) * 1000:.0f} ms, p99 {percentile(latencies, 0.99) * 1000:.0f} ms")
+
+    print(f"\n{'stage':>20} {'count':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'total s':>8}")
+    for row in backend.metrics.summary(group_by=('stage',)):
+        print(f"{row['stage']:>20} {row['count']:>7} {row['p50'] * 1000:>8.2f} {row['p95'] * 1000:>8.2f} "
+              f"{row['p99'] * 1000:>8.2f} {row['total']:>8.2f}")
+
+    print(f"\n{'endpoint':>26} {'calls':>7} {'per turn':>9} {'injected failures':>18}")
+    for endpoint, calls in sorted(fake.calls.items()):
+        print(f"{endpoint:>26} {calls:>7} {calls / max(turns, 1):>9.2f} {fake.failures[endpoint]:>18}")
+    scheduler = backend.scheduler.stats()
+    warm = backend.thread_pool.stats()
+    print(f"\nretries {scheduler['retries']}, throttled {scheduler['throttled_seconds']:.2f}s, "
+          f"warm pool {warm['hits']} hits / {warm['misses']} misses, "
+          f"database {os.path.getsize(os.environ['SQLITE_DB_PATH']) / 1e6:.2f} MB")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,60 @@
+"""
+    Benchmarks render_export against the previous single-paragraph export on synthetic conversations, for both
+    the Word and PDF writers, and reports peak memory of each.
+
+    Usage:
+        python benchmarks/bench_export.py [sizes...]
+"""
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from docx import Document  # noqa: E402
+from fpdf import FPDF  # noqa: E402
+from backend import Backend, pdf_text, render_export  # noqa: E402
+from bench_format_conversation import make_conversation  # noqa: E402
+
+
+def legacy_render_export(format_of_export, conversation):
+    # The implementation render_export replaced: the whole transcript as one string in one paragraph
+    formatted_conversation = Backend.format_conversation(conversation)
+    if format_of_export == 'Word Doc':
+        doc = Document()
+        doc.add_paragraph(formatted_conversation)
+        buffer = io.BytesIO()
+        doc.save(buffer)
+        return buffer.getvalue()
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_font("Arial", size=12)
+    pdf.multi_cell(0, 10, pdf_text(formatted_conversation))
+    return pdf.output(dest='S')
+
+
+def measure(func, *args):
+    tracemalloc.start()
+    started = time.perf_counter()
+    func(*args)
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main(sizes):
+    print(f"{'format':>8} {'messages':>9} {'legacy (s)':>11} {'current (s)':>12} {'legacy MB':>10} {'current MB':>11}")
+    for format_of_export in ('Word Doc', 'PDF'):
+        for size in sizes:
+            conversation = make_conversation(size)
+            legacy, legacy_peak = measure(legacy_render_export, format_of_export, conversation)
+            current, current_peak = measure(render_export, format_of_export, conversation)
+            print(f"{format_of_export:>8} {size:>9} {legacy:>11.2f} {current:>12.2f} {legacy_peak / 1e6:>10.1f} "
+                  f"{current_peak / 1e6:>11.1f}")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [500, 1000, 2500, 5000])
@@ -0,0 +1,65 @@
+"""
+    Benchmarks Backend.format_conversation against the previous sort-and-scan implementation on synthetic
+    conversations.
+
+    Usage:
+        python benchmarks/bench_format_conversation.py [sizes...]
+"""
+import datetime
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend import Backend  # noqa: E402
+
+
+def legacy_format_conversation(conversation):
+    # The implementation format_conversation replaced: quadratic role lookup and += concatenation
+    formatted_conversation = ""
+    user_messages = conversation.get("user_messages", [])
+    assistant_messages = conversation.get("assistant_messages", [])
+    username = conversation.get('username', 'User')
+    subject = conversation.get('subject', 'Subject')
+    combined_messages = sorted(user_messages + assistant_messages, key=lambda x: x['timestamp'])
+    for message in combined_messages:
+        role = username if message in user_messages else f'{subject} Tutee'
+        timestamp_str = datetime.datetime.fromtimestamp(message["timestamp"]).strftime('%Y-%m-%d %H:%M:%S')
+        formatted_conversation += f"({timestamp_str}) {role}: {message['content']}\n\n"
+    return formatted_conversation
+
+
+def make_conversation(size):
+    start = 1_700_000_000
+    user_messages = []
+    assistant_messages = []
+    for i in range(size // 2):
+        user_messages.append({"content": f"Question number {i} about the homework", "timestamp": start + 4 * i})
+        assistant_messages.append({"content": f"Answer number {i} " + "explanation " * 20,
+                                   "timestamp": start + 4 * i + 2})
+    return {"username": "Tutor", "subject": "Math", "mode": "Tutee",
+            "user_messages": user_messages, "assistant_messages": assistant_messages}
+
+
+def best_of(func, conversation, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(conversation)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main(sizes):
+    print(f"{'messages':>10} {'legacy (ms)':>12} {'current (ms)':>13} {'speedup':>8}")
+    for size in sizes:
+        conversation = make_conversation(size)
+        assert Backend.format_conversation(conversation) == legacy_format_conversation(conversation)
+        legacy = best_of(legacy_format_conversation, conversation)
+        current = best_of(Backend.format_conversation, conversation)
+        print(f"{size:>10} {legacy * 1000:>12.1f} {current * 1000:>13.1f} {legacy / current:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [1000, 2500, 5000, 10000])
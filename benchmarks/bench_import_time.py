@@ -0,0 +1,85 @@
+"""
+    Measures how long importing the application's modules takes, by parsing the report of `python -X importtime`
+    in a fresh interpreter, and checks that heavy libraries stay out of the startup path.
+
+    Exits with status 1 when a module imports a forbidden library or exceeds the time budget, so it can run as a
+    check in CI or before building the PyInstaller release.
+
+    Usage:
+        python benchmarks/bench_import_time.py [modules...] [--budget MS] [--top N] [--forbid NAMES]
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Libraries that must only load on first use, not while the login screen is coming up
+LAZY_LIBRARIES = ["openai", "docx", "fpdf", "cryptography"]
+
+LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s+)(\S+)$')
+
+
+def import_times(module):
+    """
+        Imports a module in a fresh interpreter and parses its -X importtime report.
+
+        Args:
+            module (str): Module to import.
+
+        Returns:
+            list: (package, self microseconds, cumulative microseconds, depth) in the order reported.
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], cwd=ROOT,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr.strip().splitlines()[-1]}")
+    rows = []
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, package = match.groups()
+            rows.append((package, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return rows
+
+
+def check(module, budget_ms, top, forbidden):
+    rows = import_times(module)
+    total_ms = next(cumulative for package, _, cumulative, depth in reversed(rows)
+                    if package == module and depth == 0) / 1000
+    print(f"import {module}: {total_ms:.1f} ms")
+    for package, self_us, cumulative_us, depth in sorted(rows, key=lambda row: -row[2])[:top]:
+        print(f"    {cumulative_us / 1000:>8.1f} ms cumulative {self_us / 1000:>7.1f} ms self  {package}")
+
+    problems = []
+    imported = {package.split('.')[0] for package, _, _, _ in rows}
+    for library in forbidden:
+        if library in imported:
+            problems.append(f"{module} imports {library} at startup")
+    if budget_ms is not None and total_ms > budget_ms:
+        problems.append(f"{module} took {total_ms:.1f} ms to import, over the {budget_ms:.0f} ms budget")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('modules', nargs='*', default=['backend', 'gui'], help="Modules to import.")
+    parser.add_argument('--budget', type=float, help="Fail when a module takes longer than this many ms.")
+    parser.add_argument('--top', type=int, default=10, help="Slowest imports to list per module.")
+    parser.add_argument('--forbid', default=','.join(LAZY_LIBRARIES),
+                        help="Comma-separated libraries that must not be imported at startup.")
+    args = parser.parse_args()
+
+    forbidden = [name for name in args.forbid.split(',') if name]
+    problems = []
+    for module in args.modules:
+        problems += check(module, args.budget, args.top, forbidden)
+    for problem in problems:
+        print("FAIL:", problem)
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
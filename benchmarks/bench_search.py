@@ -0,0 +1,62 @@
+"""
+    Benchmarks ConversationStore.search_messages on a synthetic database: a rare word, a word in most messages,
+    two common words, and a common word filtered by mode.
+
+    Usage:
+        python benchmarks/bench_search.py [messages]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import ConnectionManager, ConversationStore, fts_query  # noqa: E402
+
+WORDS = ("photosynthesis mitochondria enzyme kinetics derivative integral velocity essay thesis dosage ledger "
+         "reaction equation momentum citation paragraph").split()
+MESSAGES_PER_CONVERSATION = 20
+
+
+def build(store, messages):
+    random.seed(0)
+    modes = ["Tutee", "Tutor", "Generate Conversation"]
+    for number in range(messages // MESSAGES_PER_CONVERSATION):
+        user_id = store.get_or_create_user_id(f"student{number % 200}")
+        rows = [(random.choice(["user", "assistant"]),
+                 " ".join(random.choices(WORDS, k=40)) + f" marker{number}",
+                 1_700_000_000 + number * 100 + i, f"msg_{number}_{i}")
+                for i in range(MESSAGES_PER_CONVERSATION)]
+        store.append_messages(f"thread_{number}", rows, user_id, f"student{number % 200}", "Math",
+                              modes[number % 3], f"Math Conversation {number}")
+
+
+def best_of(func, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main(messages):
+    path = os.path.join(tempfile.mkdtemp(), "bench_search.db")
+    store = ConversationStore(ConnectionManager(path))
+    store.initialize()
+    started = time.perf_counter()
+    build(store, messages)
+    print(f"Indexed {messages} messages in {time.perf_counter() - started:.1f}s")
+    cases = [("rare word", "marker1234", {}), ("common word", "enzyme", {}),
+             ("two common words", "enzyme kinetics", {}), ("common word, one mode", "enzyme", {"mode": "Tutor"})]
+    print(f"{'query':>24} {'matches':>8} {'ms':>8}")
+    for label, text, filters in cases:
+        matches = store.search_messages(fts_query(text), **filters)
+        elapsed = best_of(lambda: store.search_messages(fts_query(text), **filters))
+        print(f"{label:>24} {len(matches):>8} {elapsed * 1000:>8.1f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
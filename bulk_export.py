@@ -0,0 +1,120 @@
+import logging
+import os
+import re
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from backend import EXPORT_EXTENSIONS, render_export
+
+logger = logging.getLogger(__name__)
+
+
+class ExportReport:
+    """
+        Progress and outcome of a bulk export.
+
+        Attributes:
+            total (int): Conversations matching the filter.
+            exported (int): Conversations written to the archive.
+            failures (list): (username, conversation name, error) of conversations that could not be rendered.
+            bytes_written (int): Uncompressed size of the exported files.
+    """
+
+    def __init__(self, total):
+        self.total = total
+        self.exported = 0
+        self.failures = []
+        self.bytes_written = 0
+        self.started = time.perf_counter()
+
+    @property
+    def done(self):
+        return self.exported + len(self.failures)
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def throughput(self):
+        """Conversations exported per second."""
+        elapsed = self.elapsed
+        return self.exported / elapsed if elapsed else 0.0
+
+    def __repr__(self):
+        return (f"ExportReport({self.done}/{self.total} done, {len(self.failures)} failed, "
+                f"{self.bytes_written / 1e6:.1f} MB in {self.elapsed:.1f}s, {self.throughput:.1f} conversations/s)")
+
+
+def archive_name(conversation, extension):
+    """
+        Path of a conversation inside the archive: one folder per user, like the staff tree.
+
+        Args:
+            conversation (dict): Conversation data.
+            extension (str): File extension without the dot.
+
+        Returns:
+            str: Archive member name.
+    """
+    def clean(name):
+        return re.sub(r'[\\/:*?"<>|]+', '_', str(name or 'Unknown')).strip() or 'Unknown'
+
+    return f"{clean(conversation['username'])}/{clean(conversation['conversation_name'])}.{extension}"
+
+
+def export_conversations(store, archive_path, format_of_export, processes=None, on_progress=None, **filters):
+    """
+        Exports every conversation matching a filter into one zip archive.
+
+        Conversations are streamed from SQLite in batches and rendered in a process pool. Each rendered
+        file is written to the archive as soon as it is ready, and at most a few conversations per process
+        are in flight, so memory stays flat however many conversations match.
+
+        Args:
+            store (ConversationStore): Store to read conversations from.
+            archive_path (str): Zip file to create.
+            format_of_export (str): 'Word Doc' or 'PDF'.
+            processes (int, optional): Rendering processes; defaults to the CPU count.
+            on_progress (callable, optional): Called with the ExportReport after every conversation.
+            **filters: username, subject, mode, and since/until Unix timestamps bounding the first message.
+
+        Returns:
+            ExportReport: Outcome of the export.
+    """
+    extension = EXPORT_EXTENSIONS[format_of_export]
+    report = ExportReport(store.count_conversations(**filters))
+    processes = processes or os.cpu_count() or 1
+    max_in_flight = processes * 4
+    conversations = store.iter_conversations(**filters)
+    in_flight = {}
+    os.makedirs(os.path.dirname(os.path.abspath(archive_path)), exist_ok=True)
+
+    with ProcessPoolExecutor(max_workers=processes) as pool, \
+            zipfile.ZipFile(archive_path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        def submit_more():
+            while len(in_flight) < max_in_flight:
+                conversation = next(conversations, None)
+                if conversation is None:
+                    return
+                future = pool.submit(render_export, format_of_export, conversation)
+                in_flight[future] = conversation
+
+        submit_more()
+        while in_flight:
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                conversation = in_flight.pop(future)
+                try:
+                    data = future.result()
+                except Exception as e:
+                    report.failures.append((conversation['username'], conversation['conversation_name'], e))
+                else:
+                    archive.writestr(archive_name(conversation, extension), data)
+                    report.exported += 1
+                    report.bytes_written += len(data)
+                if on_progress is not None:
+                    on_progress(report)
+            submit_more()
+    logger.info("Bulk export finished: %r", report)
+    return report
@@ -0,0 +1,104 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+        Thread-safe LRU cache whose entries also expire after a fixed time to live.
+
+        Attributes:
+            maxsize (int): Maximum number of entries; the least recently used entry is evicted first.
+            ttl (float or None): Seconds an entry stays valid, or None to keep entries until evicted.
+            hits (int): Number of lookups answered from the cache.
+            misses (int): Number of lookups that had to load the value.
+    """
+
+    def __init__(self, maxsize=128, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """
+            Looks up a key, counting the hit or miss.
+
+            Args:
+                key (hashable): Cache key.
+                default: Value returned when the key is missing or expired.
+
+            Returns:
+                Cached value or default.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[0] is None or entry[0] > time.monotonic()):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        """
+            Stores a value, evicting the least recently used entry if the cache is full.
+
+            Args:
+                key (hashable): Cache key.
+                value: Value to store.
+        """
+        expires_at = None if self.ttl is None else time.monotonic() + self.ttl
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get_or_load(self, key, loader):
+        """
+            Returns the cached value for key, calling loader() and caching its result on a miss.
+            None results are not cached.
+
+            Args:
+                key (hashable): Cache key.
+                loader (callable): Produces the value when it is not cached.
+
+            Returns:
+                Cached or freshly loaded value.
+        """
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = loader()
+            if value is not None:
+                self.set(key, value)
+        return value
+
+    def invalidate(self, key):
+        """
+            Removes a key from the cache if present.
+
+            Args:
+                key (hashable): Cache key.
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+            Returns the cache counters.
+
+            Returns:
+                dict: hits, misses and current size.
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
@@ -0,0 +1,827 @@
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Random user IDs tried before falling back to the next free ID above the three-digit range
+USER_ID_ATTEMPTS = 20
+
+
+def make_conversation_name(subject, mode, number):
+    """
+        Builds the display name of a conversation.
+
+        Args:
+            subject (str): Subject.
+            mode (str): Mode ('Tutee', 'Tutor', 'Generate Conversation').
+            number (int): Conversation number.
+
+        Returns:
+            str: Conversation name.
+    """
+    if mode == "Generate Conversation":
+        return f"{subject} Generated Conversation {number}"
+    return f"{subject} {mode} Conversation {number}"
+
+
+def fts_query(text):
+    """
+        Turns what a user typed into an FTS5 query in which every word must appear. Words are quoted, so FTS5
+        operators and punctuation in the text are matched literally instead of failing to parse. Prefix
+        matching is left out on purpose: without a prefix index FTS5 has to merge every matching doclist before
+        it can return the first row.
+
+        Args:
+            text (str): Search text.
+
+        Returns:
+            str or None: FTS5 MATCH expression, or None if the text has no words.
+    """
+    words = text.split()
+    if not words:
+        return None
+    return ' '.join('"' + word.replace('"', '""') + '"' for word in words)
+
+
+class ConnectionManager:
+    """
+        Hands out one long-lived SQLite connection per thread instead of connecting for every query.
+
+        Each connection is opened with a statement cache so repeated queries reuse their prepared statements,
+        and is configured with the journal mode, synchronous level and busy timeout below.
+
+        Attributes:
+            db_path (str): Path to SQLite database file.
+            journal_mode (str): SQLite journal mode. WAL lets readers and a writer work at the same time, but
+                needs shared memory, so set SQLITE_JOURNAL_MODE=DELETE when the file lives on a network share
+                that does not support it.
+            synchronous (str): SQLite synchronous level; NORMAL is durable enough with WAL.
+            busy_timeout (float): Seconds to wait for a lock held by another station before failing.
+            cached_statements (int): Number of prepared statements kept per connection.
+    """
+
+    def __init__(self, db_path, journal_mode=None, synchronous='NORMAL', busy_timeout=5.0, cached_statements=128):
+        self.db_path = db_path
+        self.journal_mode = journal_mode or os.getenv('SQLITE_JOURNAL_MODE', 'WAL')
+        self.synchronous = synchronous
+        self.busy_timeout = busy_timeout
+        self.cached_statements = cached_statements
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+
+    def connection(self):
+        """
+            Returns the calling thread's connection, opening it on first use.
+
+            Returns:
+                sqlite3.Connection: Connection owned by the calling thread.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Connections are only used by the thread that opened them; close_all may run elsewhere
+            conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout,
+                                   cached_statements=self.cached_statements, check_same_thread=False)
+            conn.execute(f'PRAGMA journal_mode = {self.journal_mode}')
+            conn.execute(f'PRAGMA synchronous = {self.synchronous}')
+            conn.execute(f'PRAGMA busy_timeout = {int(self.busy_timeout * 1000)}')
+            conn.execute('PRAGMA foreign_keys = ON')
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """
+            Yields the calling thread's connection inside a transaction that is committed on success and
+            rolled back on error.
+
+            Yields:
+                sqlite3.Connection: Connection owned by the calling thread.
+        """
+        conn = self.connection()
+        with conn:
+            yield conn
+
+    def close_all(self):
+        """
+            Closes every connection handed out so far.
+        """
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+
+class ConversationStore:
+    """
+        SQL for users, conversations and messages. Every method takes what it needs as arguments, so one store
+        can serve any number of sessions from any thread.
+
+        Attributes:
+            db (ConnectionManager): Per-thread pooled connections to the database.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    def initialize(self):
+        """
+            Applies any schema migrations the database has not seen yet.
+        """
+        migrate(self.db.connection())
+
+    def get_or_create_user_id(self, username):
+        """
+            Returns the user ID for a username, registering the username with a random ID if it is new.
+
+            Args:
+                username (str): Username.
+
+            Returns:
+                int: User ID.
+        """
+        with self.db.transaction() as conn:
+            c = conn.cursor()
+            c.execute('''SELECT user_id FROM User_ID WHERE username = ?''', (username,))
+            user_data = c.fetchone()
+            # Usernames are unique, and the random user ID may already be taken; after a few collisions the
+            # three-digit range is treated as full and the next ID above the largest one is used instead
+            for attempt in range(USER_ID_ATTEMPTS + 1):
+                if user_data:
+                    break
+                if attempt < USER_ID_ATTEMPTS:
+                    user_id = random.randint(100, 999)
+                else:
+                    c.execute('''SELECT MAX(COALESCE(MAX(user_id), 0) + 1, 1000) FROM User_ID''')
+                    user_id = c.fetchone()[0]
+                c.execute('''INSERT OR IGNORE INTO User_ID (user_id, username) VALUES (?, ?)''', (user_id, username))
+                c.execute('''SELECT user_id FROM User_ID WHERE username = ?''', (username,))
+                user_data = c.fetchone()
+            return user_data[0]
+
+    def get_user_id(self, username):
+        """
+            Returns the user ID of an existing username.
+
+            Args:
+                username (str): Username.
+
+            Returns:
+                int: User ID.
+        """
+        c = self.db.connection().cursor()
+        c.execute('''SELECT user_id FROM User_ID WHERE username = ?''', (username,))
+        return c.fetchone()[0]
+
+    @staticmethod
+    def _take_conversation_number(conn, user_id, subject, mode):
+        # Runs inside the caller's write transaction, so two stations logged in as the same user never receive
+        # the same number
+        conn.execute('''INSERT INTO Conversation_Counters (user_id, subject, mode, last_number)
+                        VALUES (?, ?, ?, 1)
+                        ON CONFLICT (user_id, subject, mode) DO UPDATE SET last_number = last_number + 1''',
+                     (user_id, subject, mode))
+        return conn.execute(
+            '''SELECT last_number FROM Conversation_Counters WHERE user_id = ? AND subject = ? AND mode = ?''',
+            (user_id, subject, mode)).fetchone()[0]
+
+    def find_thread(self, user_id, conversation_name):
+        """
+            Returns the thread ID stored for a conversation.
+
+            Args:
+                user_id (int): User ID.
+                conversation_name (str): Conversation name.
+
+            Returns:
+                str or None: Thread ID if the conversation exists, None otherwise.
+        """
+        c = self.db.connection().cursor()
+        c.execute('''SELECT thread_id FROM Conversations 
+                     WHERE user_id = ? AND conversation_name = ?''', (user_id, conversation_name))
+        thread = c.fetchone()
+        return thread[0] if thread else None
+
+    def last_message_id(self, thread_id):
+        """
+            Returns the OpenAI ID of the newest stored message of a thread.
+
+            Args:
+                thread_id (str): Thread ID.
+
+            Returns:
+                str or None: Message ID, or None if nothing from the thread is stored yet.
+        """
+        c = self.db.connection().cursor()
+        c.execute('''SELECT Messages.message_id FROM Messages
+                     JOIN Conversations ON Conversations._id = Messages.conversation_id
+                     WHERE Conversations.thread_id = ? AND Messages.message_id IS NOT NULL
+                     ORDER BY Messages.created_at DESC, Messages._id DESC LIMIT 1''', (thread_id,))
+        row = c.fetchone()
+        return row[0] if row else None
+
+    def append_messages(self, thread_id, rows, user_id, username, subject, mode, conversation_name=None):
+        """
+            Creates the conversation row for a thread if needed and appends the messages not stored yet.
+
+            A new conversation without a name is numbered here, in the same transaction that inserts its row, so
+            conversations that never got a message do not use up numbers.
+
+            Args:
+                thread_id (str): Thread ID.
+                rows (list): (role, content, created_at, message_id) tuples, oldest first.
+                user_id (int): User ID.
+                username (str): Username.
+                subject (str): Subject.
+                mode (str): Mode.
+                conversation_name (str, optional): Conversation name; assigned from the next number if None.
+
+            Returns:
+                tuple: (ID of the conversation row, conversation name).
+        """
+        with self.db.transaction() as conn:
+            c = conn.cursor()
+
+            # Check if a conversation with the same thread_id exists
+            c.execute('''SELECT _id, conversation_name FROM Conversations WHERE thread_id = ?''', (thread_id,))
+            existing_conversation = c.fetchone()
+
+            if existing_conversation:
+                conversation_id, conversation_name = existing_conversation
+            else:
+                if conversation_name is None:
+                    number = self._take_conversation_number(conn, user_id, subject, mode)
+                    conversation_name = make_conversation_name(subject, mode, number)
+                # Insert a new row
+                c.execute('''INSERT INTO Conversations 
+                             (thread_id, user_id, username, subject, mode, conversation_name)
+                             VALUES (?, ?, ?, ?, ?, ?)''',
+                          (thread_id, user_id, username, subject, mode, conversation_name))
+                conversation_id = c.lastrowid
+
+            # Append only the messages that are not stored yet
+            c.executemany('''INSERT OR IGNORE INTO Messages (conversation_id, role, content, created_at, message_id)
+                             VALUES (?, ?, ?, ?, ?)''',
+                          [(conversation_id,) + tuple(row) for row in rows])
+        return conversation_id, conversation_name
+
+    def conversations_by_mode(self, user_id):
+        """
+            Returns a user's conversation names grouped by mode.
+
+            Args:
+                user_id (int): User ID.
+
+            Returns:
+                dict: Conversation names by mode.
+        """
+        c = self.db.connection().cursor()
+        c.execute('''SELECT mode, conversation_name FROM Conversations WHERE user_id = ?''', (user_id,))
+        conversations_by_mode = {}
+        for mode, conversation_name in c.fetchall():
+            conversations_by_mode.setdefault(mode, []).append(conversation_name)
+        return conversations_by_mode
+
+    def conversations_by_username(self, username):
+        """
+            Returns the conversation names of every other user, grouped by username and mode.
+
+            Args:
+                username (str): Username to exclude.
+
+            Returns:
+                dict: Conversation names by username and mode.
+        """
+        c = self.db.connection().cursor()
+        c.execute('''SELECT username, mode, conversation_name FROM Conversations WHERE username != ?''',
+                  (username,))
+        conversations_by_username = {}
+        for other_username, mode, conversation_name in c.fetchall():
+            conversations_by_username.setdefault(other_username, {}).setdefault(mode, []).append(conversation_name)
+        return conversations_by_username
+
+    @staticmethod
+    def _search_clause(search, clauses, params):
+        # Matches conversations whose username or name contains the search text
+        if search:
+            pattern = '%' + search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            clauses.append('''(username LIKE ? ESCAPE '\\' OR conversation_name LIKE ? ESCAPE '\\')''')
+            params.extend((pattern, pattern))
+
+    def user_counts(self, exclude_username, search=None, after=None, limit=100):
+        """
+            Returns one page of the other users with the number of their conversations, in username order.
+
+            Args:
+                exclude_username (str): Username to leave out.
+                search (str, optional): Only count conversations whose username or name contains this text.
+                after (str, optional): Last username of the previous page.
+                limit (int): Page size.
+
+            Returns:
+                list: (username, conversation count) tuples.
+        """
+        clauses, params = ['username != ?'], [exclude_username]
+        self._search_clause(search, clauses, params)
+        if after is not None:
+            clauses.append('username > ?')
+            params.append(after)
+        return self.db.connection().execute(
+            f'''SELECT username, COUNT(*) FROM Conversations WHERE {' AND '.join(clauses)}
+                GROUP BY username ORDER BY username LIMIT ?''', params + [limit]).fetchall()
+
+    def mode_counts(self, username, search=None):
+        """
+            Returns the modes a user has conversations in, with the number of conversations in each.
+
+            Args:
+                username (str): Username.
+                search (str, optional): Only count conversations whose username or name contains this text.
+
+            Returns:
+                list: (mode, conversation count) tuples in mode order.
+        """
+        clauses, params = ['username = ?'], [username]
+        self._search_clause(search, clauses, params)
+        return self.db.connection().execute(
+            f'''SELECT mode, COUNT(*) FROM Conversations WHERE {' AND '.join(clauses)}
+                GROUP BY mode ORDER BY mode''', params).fetchall()
+
+    def conversation_names(self, username, mode, search=None, after=None, limit=100):
+        """
+            Returns one page of a user's conversations in one mode, oldest first.
+
+            Args:
+                username (str): Username.
+                mode (str): Mode.
+                search (str, optional): Only return conversations whose username or name contains this text.
+                after (int, optional): Last conversation ID of the previous page.
+                limit (int): Page size.
+
+            Returns:
+                list: (conversation ID, conversation name) pairs in the order the conversations were created.
+        """
+        clauses, params = ['username = ?', 'mode IS ?'], [username, mode]
+        self._search_clause(search, clauses, params)
+        if after is not None:
+            clauses.append('_id > ?')
+            params.append(after)
+        c = self.db.connection().execute(
+            f'''SELECT _id, conversation_name FROM Conversations WHERE {' AND '.join(clauses)}
+                ORDER BY _id LIMIT ?''', params + [limit])
+        return c.fetchall()
+
+    def conversation(self, user_id, conversation_name, with_messages=True):
+        """
+            Returns a stored conversation with its messages, in stored order and split by role.
+
+            Args:
+                user_id (int): User ID.
+                conversation_name (str): Conversation name.
+                with_messages (bool): Whether to load the messages; without them the message lists stay empty.
+
+            Returns:
+                dict or None: Conversation data, or None if it does not exist.
+        """
+        c = self.db.connection().cursor()
+        c.execute('''SELECT _id, thread_id, user_id, username, subject, mode, conversation_name FROM Conversations 
+                     WHERE user_id = ? AND conversation_name = ?''', (user_id, conversation_name))
+        conversation_data = c.fetchone()
+        if not conversation_data:
+            return None
+        conversation = {
+            "conversation_id": conversation_data[0],
+            "thread_id": conversation_data[1],
+            "user_id": conversation_data[2],
+            "username": conversation_data[3],
+            "subject": conversation_data[4],
+            "mode": conversation_data[5],
+            "conversation_name": conversation_data[6],
+            "messages": [],
+            "user_messages": [],
+            "assistant_messages": []
+        }
+        if not with_messages:
+            return conversation
+        for message in self.messages(conversation["conversation_id"]):
+            entry = {"role": message["role"], "content": message["content"], "timestamp": message["timestamp"]}
+            conversation["messages"].append(entry)
+            conversation[f"{message['role']}_messages"].append(entry)
+        return conversation
+
+    @staticmethod
+    def _conversation_filter(username=None, subject=None, mode=None, since=None, until=None):
+        # WHERE clause over Conversations aliased as c; the date range applies to the first message
+        clauses, params = [], []
+        for column, value in (('username', username), ('subject', subject), ('mode', mode)):
+            if value is not None:
+                clauses.append(f'c.{column} = ?')
+                params.append(value)
+        first_message = '(SELECT MIN(created_at) FROM Messages WHERE conversation_id = c._id)'
+        if since is not None:
+            clauses.append(f'{first_message} >= ?')
+            params.append(since)
+        if until is not None:
+            clauses.append(f'{first_message} < ?')
+            params.append(until)
+        return ' AND '.join(clauses) or '1', params
+
+    def search_messages(self, query, limit=50, candidates=2000, **filters):
+        """
+            Full-text search over message content, best matches first.
+
+            Scoring every match of a common word is what makes searches slow, so only the most recent
+            `candidates` matches are ranked. FTS5 walks its index newest first and stops there, which keeps
+            queries fast however many messages are stored.
+
+            Args:
+                query (str): FTS5 MATCH expression, e.g. from fts_query.
+                limit (int): Maximum number of matches.
+                candidates (int): Most recent matches considered for ranking.
+                **filters: username, subject, mode, and since/until Unix timestamps bounding the first message.
+
+            Returns:
+                list: Dicts with the conversation's username, user_id, subject, mode and conversation_name, the
+                    message's role and timestamp, and a snippet with the matched words in [brackets].
+        """
+        where, params = self._conversation_filter(**filters)
+        c = self.db.connection().execute(
+            f'''WITH recent AS (
+                    SELECT Messages_FTS.rowid AS rowid FROM Messages_FTS
+                    JOIN Messages m ON m._id = Messages_FTS.rowid
+                    JOIN Conversations c ON c._id = m.conversation_id
+                    WHERE Messages_FTS MATCH ? AND {where}
+                    ORDER BY Messages_FTS.rowid DESC LIMIT ?
+                )
+                SELECT c.username, c.user_id, c.subject, c.mode, c.conversation_name, m.role, m.created_at,
+                       snippet(Messages_FTS, 0, '[', ']', '...', 16)
+                FROM Messages_FTS
+                JOIN Messages m ON m._id = Messages_FTS.rowid
+                JOIN Conversations c ON c._id = m.conversation_id
+                WHERE Messages_FTS MATCH ? AND Messages_FTS.rowid >= (SELECT MIN(rowid) FROM recent) AND {where}
+                ORDER BY Messages_FTS.rank LIMIT ?''', [query] + params + [candidates, query] + params + [limit])
+        return [{"username": username, "user_id": user_id, "subject": subject, "mode": mode,
+                 "conversation_name": conversation_name, "role": role, "timestamp": created_at, "snippet": snippet}
+                for username, user_id, subject, mode, conversation_name, role, created_at, snippet in c.fetchall()]
+
+    def count_conversations(self, **filters):
+        """
+            Counts the conversations matching a filter.
+
+            Args:
+                **filters: username, subject, mode, and since/until Unix timestamps bounding the first message.
+
+            Returns:
+                int: Number of matching conversations.
+        """
+        where, params = self._conversation_filter(**filters)
+        return self.db.connection().execute(f'''SELECT COUNT(*) FROM Conversations c WHERE {where}''',
+                                            params).fetchone()[0]
+
+    def iter_conversations(self, batch_size=100, **filters):
+        """
+            Yields the conversations matching a filter with their messages, reading one batch at a time so
+            exports of the whole database never hold it all in memory.
+
+            Args:
+                batch_size (int): Conversations read per query.
+                **filters: username, subject, mode, and since/until Unix timestamps bounding the first message.
+
+            Yields:
+                dict: Conversation data in the format returned by conversation().
+        """
+        where, params = self._conversation_filter(**filters)
+        conn = self.db.connection()
+        last_id = 0
+        while True:
+            rows = conn.execute(f'''SELECT c._id, c.thread_id, c.user_id, c.username, c.subject, c.mode,
+                                         c.conversation_name
+                                  FROM Conversations c WHERE c._id > ? AND {where}
+                                  ORDER BY c._id LIMIT ?''', [last_id] + params + [batch_size]).fetchall()
+            if not rows:
+                return
+            conversations = {}
+            for row in rows:
+                conversations[row[0]] = {
+                    "conversation_id": row[0],
+                    "thread_id": row[1],
+                    "user_id": row[2],
+                    "username": row[3],
+                    "subject": row[4],
+                    "mode": row[5],
+                    "conversation_name": row[6],
+                    "messages": [],
+                    "user_messages": [],
+                    "assistant_messages": []
+                }
+            placeholders = ', '.join('?' * len(conversations))
+            # Same order as messages(), so bulk exports match single exports and the GUI
+            for conversation_id, role, content, created_at in conn.execute(
+                    f'''SELECT conversation_id, role, content, created_at FROM Messages
+                         WHERE conversation_id IN ({placeholders})
+                         ORDER BY conversation_id, created_at, _id''', list(conversations)):
+                conversation = conversations[conversation_id]
+                entry = {"role": role, "content": content, "timestamp": created_at}
+                conversation["messages"].append(entry)
+                conversation[f"{role}_messages"].append(entry)
+            yield from conversations.values()
+            last_id = rows[-1][0]
+
+    def messages(self, conversation_id, after=None, limit=None):
+        """
+            Returns the messages of a conversation in chronological order, optionally one page at a time.
+
+            Args:
+                conversation_id (int): ID of the conversation row.
+                after (tuple, optional): (timestamp, _id) of the last message of the previous page.
+                limit (int, optional): Maximum number of messages to return.
+
+            Returns:
+                list: Message dicts with _id, role, content, timestamp and message_id.
+        """
+        c = self.db.connection().cursor()
+        if after is None:
+            c.execute('''SELECT _id, role, content, created_at, message_id FROM Messages
+                         WHERE conversation_id = ?
+                         ORDER BY created_at, _id LIMIT ?''', (conversation_id, -1 if limit is None else limit))
+        else:
+            c.execute('''SELECT _id, role, content, created_at, message_id FROM Messages
+                         WHERE conversation_id = ? AND (created_at, _id) > (?, ?)
+                         ORDER BY created_at, _id LIMIT ?''',
+                      (conversation_id, after[0], after[1], -1 if limit is None else limit))
+        return [{"_id": row[0], "role": row[1], "content": row[2], "timestamp": row[3], "message_id": row[4]}
+                for row in c.fetchall()]
+
+    def iter_messages(self, conversation_id, page_size=500):
+        """
+            Yields the messages of a conversation in chronological order, reading one page at a time.
+
+            Args:
+                conversation_id (int): ID of the conversation row.
+                page_size (int): Messages read per query.
+
+            Yields:
+                dict: Message dicts as returned by messages().
+        """
+        after = None
+        while True:
+            page = self.messages(conversation_id, after, page_size)
+            yield from page
+            if len(page) < page_size:
+                return
+            after = (page[-1]["timestamp"], page[-1]["_id"])
+
+    def remove_conversation(self, user_id, conversation_name):
+        """
+            Deletes a conversation and its messages.
+
+            Args:
+                user_id (int): User ID.
+                conversation_name (str): Conversation name.
+        """
+        with self.db.transaction() as conn:
+            conn.execute('''DELETE FROM Messages WHERE conversation_id IN
+                            (SELECT _id FROM Conversations WHERE user_id = ? AND conversation_name = ?)''',
+                         (user_id, conversation_name))
+            conn.execute('''DELETE FROM Conversations 
+                            WHERE user_id = ? AND conversation_name = ?''', (user_id, conversation_name))
+
+
+def create_base_tables(c):
+    """
+        Version 1: the original Conversations and User_ID tables.
+    """
+    c.execute('''CREATE TABLE IF NOT EXISTS Conversations (
+                    _id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    thread_id TEXT,
+                    user_id INTEGER,
+                    username TEXT,
+                    subject TEXT,
+                    mode TEXT,
+                    conversation_name TEXT,
+                    user_messages TEXT,
+                    assistant_messages TEXT
+                 )''')
+    c.execute('''CREATE TABLE IF NOT EXISTS User_ID (
+                    user_id INTEGER PRIMARY KEY,
+                    username TEXT
+                 )''')
+
+
+def create_messages_table(c):
+    """
+        Version 2: one row per message instead of JSON blobs. Messages still stored in the legacy
+        user_messages/assistant_messages columns are moved across and the columns are cleared.
+    """
+    c.execute('''CREATE TABLE IF NOT EXISTS Messages (
+                    _id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    conversation_id INTEGER NOT NULL REFERENCES Conversations (_id) ON DELETE CASCADE,
+                    role TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    created_at INTEGER NOT NULL,
+                    message_id TEXT UNIQUE
+                 )''')
+    c.execute('''CREATE INDEX IF NOT EXISTS Messages_conversation_created
+                 ON Messages (conversation_id, created_at, _id)''')
+
+    c.execute('''SELECT _id, user_messages, assistant_messages FROM Conversations
+                 WHERE user_messages IS NOT NULL OR assistant_messages IS NOT NULL''')
+    rows = c.fetchall()
+    for conversation_id, user_messages_json, assistant_messages_json in rows:
+        messages = [("user", message) for message in json.loads(user_messages_json or '[]')]
+        messages += [("assistant", message) for message in json.loads(assistant_messages_json or '[]')]
+        messages.sort(key=lambda item: item[1]["timestamp"])
+        c.executemany('''INSERT INTO Messages (conversation_id, role, content, created_at)
+                         VALUES (?, ?, ?, ?)''',
+                      [(conversation_id, role, message["content"], message["timestamp"])
+                       for role, message in messages])
+    if rows:
+        c.execute('''UPDATE Conversations SET user_messages = NULL, assistant_messages = NULL''')
+        logger.info("Migrated %d conversations to the Messages table", len(rows))
+
+
+def create_lookup_indexes(c):
+    """
+        Version 3: indexes for the lookups Backend runs on every login and turn, plus unique usernames and
+        thread IDs. Duplicate usernames are merged into the oldest user ID first.
+    """
+    c.execute('''SELECT username, MIN(rowid) FROM User_ID GROUP BY username HAVING COUNT(*) > 1''')
+    for username, keep_rowid in c.fetchall():
+        c.execute('''SELECT user_id FROM User_ID WHERE rowid = ?''', (keep_rowid,))
+        keep_user_id = c.fetchone()[0]
+        c.execute('''UPDATE Conversations SET user_id = ?
+                     WHERE user_id IN (SELECT user_id FROM User_ID WHERE username = ? AND rowid != ?)''',
+                  (keep_user_id, username, keep_rowid))
+        c.execute('''DELETE FROM User_ID WHERE username = ? AND rowid != ?''', (username, keep_rowid))
+
+    c.execute('''CREATE UNIQUE INDEX IF NOT EXISTS User_ID_username ON User_ID (username)''')
+    c.execute('''CREATE UNIQUE INDEX IF NOT EXISTS Conversations_thread_id ON Conversations (thread_id)''')
+    # Covering indexes: thread lookups, per-user listings and the staff listing never touch the table
+    c.execute('''CREATE INDEX IF NOT EXISTS Conversations_user_name
+                 ON Conversations (user_id, conversation_name, thread_id)''')
+    c.execute('''CREATE INDEX IF NOT EXISTS Conversations_user_mode
+                 ON Conversations (user_id, mode, conversation_name)''')
+    c.execute('''CREATE INDEX IF NOT EXISTS Conversations_username_mode
+                 ON Conversations (username, mode, conversation_name)''')
+
+
+def create_conversation_counters(c):
+    """
+        Version 4: the last conversation number handed out per (user, subject, mode), seeded from the numbers
+        at the end of the existing conversation names.
+    """
+    c.execute('''CREATE TABLE IF NOT EXISTS Conversation_Counters (
+                    user_id INTEGER NOT NULL,
+                    subject TEXT NOT NULL,
+                    mode TEXT NOT NULL,
+                    last_number INTEGER NOT NULL,
+                    PRIMARY KEY (user_id, subject, mode)
+                 ) WITHOUT ROWID''')
+    c.execute('''SELECT user_id, subject, mode, conversation_name FROM Conversations''')
+    last_numbers = {}
+    for user_id, subject, mode, conversation_name in c.fetchall():
+        number = (conversation_name or '').rsplit(' ', 1)[-1]
+        if subject is not None and mode is not None and number.isdigit():
+            key = (user_id, subject, mode)
+            last_numbers[key] = max(last_numbers.get(key, 0), int(number))
+    c.executemany('''INSERT OR REPLACE INTO Conversation_Counters (user_id, subject, mode, last_number)
+                     VALUES (?, ?, ?, ?)''', [key + (number,) for key, number in last_numbers.items()])
+
+
+def create_response_cache(c):
+    """
+        Version 5: cached assistant replies for ResponseCache, several variants per prompt, evicted by last use.
+    """
+    c.execute('''CREATE TABLE IF NOT EXISTS Response_Cache (
+                    _id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    cache_key TEXT NOT NULL,
+                    variant INTEGER NOT NULL,
+                    assistant_id TEXT NOT NULL,
+                    mode TEXT,
+                    reply TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0,
+                    UNIQUE (cache_key, variant)
+                 )''')
+    c.execute('''CREATE INDEX IF NOT EXISTS Response_Cache_last_used ON Response_Cache (last_used)''')
+
+
+def create_message_search(c):
+    """
+        Version 6: an FTS5 index over message content. It is an external-content table reading from Messages,
+        so the text is not stored twice, and triggers keep it in step with every insert, update and delete.
+    """
+    c.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS Messages_FTS USING fts5(
+                    content, content='Messages', content_rowid='_id', tokenize='unicode61 remove_diacritics 2'
+                 )''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS Messages_FTS_insert AFTER INSERT ON Messages BEGIN
+                    INSERT INTO Messages_FTS (rowid, content) VALUES (new._id, new.content);
+                 END''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS Messages_FTS_delete AFTER DELETE ON Messages BEGIN
+                    INSERT INTO Messages_FTS (Messages_FTS, rowid, content) VALUES ('delete', old._id, old.content);
+                 END''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS Messages_FTS_update AFTER UPDATE OF content ON Messages BEGIN
+                    INSERT INTO Messages_FTS (Messages_FTS, rowid, content) VALUES ('delete', old._id, old.content);
+                    INSERT INTO Messages_FTS (rowid, content) VALUES (new._id, new.content);
+                 END''')
+    # Index the messages stored before this version
+    c.execute('''INSERT INTO Messages_FTS (Messages_FTS) VALUES ('rebuild')''')
+
+
+def index_conversations_by_creation(c):
+    """
+        Version 7: the staff tree pages through a user's conversations in creation order, so the covering index
+        on (username, mode) is ordered by _id instead of by name.
+    """
+    c.execute('''DROP INDEX IF EXISTS Conversations_username_mode''')
+    c.execute('''CREATE INDEX IF NOT EXISTS Conversations_username_mode_id
+                 ON Conversations (username, mode, _id, conversation_name)''')
+
+
+# Applied in order; PRAGMA user_version records how many have run. Only ever append to this list.
+MIGRATIONS = [
+    create_base_tables,
+    create_messages_table,
+    create_lookup_indexes,
+    create_conversation_counters,
+    create_response_cache,
+    create_message_search,
+    index_conversations_by_creation,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def migrate(conn):
+    """
+        Brings the database schema up to SCHEMA_VERSION. The write lock is taken before reading the version,
+        so two stations starting at once cannot apply the same migration twice.
+
+        Args:
+            conn (sqlite3.Connection): Connection outside of any transaction.
+
+        Returns:
+            int: Schema version before migrating.
+    """
+    c = conn.cursor()
+    c.execute('''BEGIN IMMEDIATE''')
+    try:
+        version = c.execute('''PRAGMA user_version''').fetchone()[0]
+        for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+            migration(c)
+            c.execute(f'''PRAGMA user_version = {number}''')
+            logger.info("Applied database migration %d: %s", number, migration.__name__)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return version
+
+
+# Hot queries and sample parameters, checked by check_query_plans
+HOT_QUERIES = [
+    ('''SELECT thread_id FROM Conversations WHERE user_id = ? AND conversation_name = ?''', (0, '')),
+    ('''SELECT _id, conversation_name FROM Conversations WHERE thread_id = ?''', ('',)),
+    ('''SELECT mode, conversation_name FROM Conversations WHERE user_id = ?''', (0,)),
+    ('''SELECT last_number FROM Conversation_Counters WHERE user_id = ? AND subject = ? AND mode = ?''',
+     (0, '', '')),
+    ('''SELECT user_id FROM User_ID WHERE username = ?''', ('',)),
+    ('''SELECT username, mode, conversation_name FROM Conversations WHERE username != ?''', ('',)),
+    ('''SELECT _id, role, content, created_at, message_id FROM Messages
+         WHERE conversation_id = ? ORDER BY created_at, _id''', (0,)),
+    ('''SELECT _id, reply FROM Response_Cache WHERE cache_key = ?''', ('',)),
+    ('''SELECT username, COUNT(*) FROM Conversations WHERE username != ? AND username > ?
+         GROUP BY username ORDER BY username LIMIT ?''', ('', '', 100)),
+    ('''SELECT _id, conversation_name FROM Conversations WHERE username = ? AND mode IS ? AND _id > ?
+         ORDER BY _id LIMIT ?''', ('', '', 0, 100)),
+]
+
+
+def check_query_plans(conn, queries=None):
+    """
+        Runs EXPLAIN QUERY PLAN over the hot queries and reports any that read a table row by row.
+        A scan of a covering index is accepted, because the index is much smaller than the table.
+
+        Args:
+            conn (sqlite3.Connection): Connection to a migrated database.
+            queries (list, optional): (sql, params) pairs; defaults to HOT_QUERIES.
+
+        Returns:
+            list: (sql, plan detail) pairs for every full table scan found; empty when all queries use indexes.
+    """
+    problems = []
+    for sql, params in queries or HOT_QUERIES:
+        for row in conn.execute(f'''EXPLAIN QUERY PLAN {sql}''', params):
+            detail = row[-1]
+            if detail.startswith('SCAN') and 'COVERING INDEX' not in detail:
+                problems.append((sql, detail))
+    return problems
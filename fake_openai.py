@@ -0,0 +1,297 @@
+import itertools
+import random
+import threading
+import time
+from collections import Counter
+from types import SimpleNamespace
+
+WORDS = ("the reaction rate depends on concentration so let us work through the example step by step and check "
+         "each value against the units before we write the final answer").split()
+
+
+def default_reply(assistant_id, history, rng, words=60):
+    """
+        Builds a reply of random words, ignoring the conversation.
+
+        Args:
+            assistant_id (str): Assistant answering.
+            history (list): Message contents of the thread so far, oldest first.
+            rng (random.Random): Random source of the fake client.
+            words (int): Length of the reply.
+
+        Returns:
+            str: Reply text.
+    """
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def api_error(status, message, retry_after=None):
+    """
+        Builds the exception the real client raises for an HTTP error status, so the scheduler's retry logic
+        sees exactly what it would in production.
+
+        Args:
+            status (int): HTTP status, e.g. 429 or 500.
+            message (str): Error message.
+            retry_after (float, optional): Value of the Retry-After header.
+
+        Returns:
+            openai.APIStatusError: Subclass matching the status.
+    """
+    import httpx
+    import openai
+
+    classes = {400: openai.BadRequestError, 404: openai.NotFoundError, 429: openai.RateLimitError}
+    headers = {'retry-after': str(retry_after)} if retry_after is not None else {}
+    response = httpx.Response(status, headers=headers,
+                              request=httpx.Request('POST', 'https://api.openai.com/v1/fake'))
+    return classes.get(status, openai.InternalServerError)(message, response=response, body=None)
+
+
+class FakeOpenAI:
+    """
+        In-memory stand-in for the parts of the OpenAI client the backend uses: assistants.retrieve and
+        threads, messages and runs under client.beta. Pass it as Backend(client=FakeOpenAI()) to run the backend
+        offline, e.g. in benchmarks.
+
+        Runs complete after run_seconds. Polled runs report in_progress until then; streamed runs deliver the
+        reply in chunks spread over the same time. Every call waits `latency` seconds first and fails with a 429
+        or 500 at `failure_rate`.
+
+        Attributes:
+            latency (float): Seconds each API call takes.
+            jitter (float): Extra random seconds, up to this much, added to each call and run.
+            run_seconds (float): Time a run takes to generate its reply.
+            failure_rate (float): Probability that a call raises a retryable error.
+            run_failure_rate (float): Probability that a run ends with status 'failed'.
+            retry_after (float or None): Retry-After header sent with injected 429s.
+            assistant_ids (set or None): Known assistant IDs; None accepts any ID.
+            calls (Counter): Calls per endpoint, e.g. 'threads.create'.
+            failures (Counter): Injected failures per endpoint.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, run_seconds=0.5, failure_rate=0.0, run_failure_rate=0.0,
+                 retry_after=None, stream=True, assistant_ids=None, reply=default_reply, chunks=12, seed=None):
+        """
+            Args:
+                stream (bool): Whether runs.stream exists; without it the backend falls back to polling.
+                reply (callable): reply(assistant_id, history, rng) returns the text of a run's reply.
+                chunks (int): Deltas a streamed reply is split into.
+                seed (int, optional): Seed for latencies, failures and replies.
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.run_seconds = run_seconds
+        self.failure_rate = failure_rate
+        self.run_failure_rate = run_failure_rate
+        self.retry_after = retry_after
+        self.assistant_ids = set(assistant_ids) if assistant_ids is not None else None
+        self.reply = reply
+        self.chunks = chunks
+        self.calls = Counter()
+        self.failures = Counter()
+        self._rng = random.Random(seed)
+        self._ids = itertools.count(1)
+        self._threads = {}
+        self._runs = {}
+        self._lock = threading.Lock()
+        runs = _StreamingRuns(self) if stream else _Runs(self)
+        self.beta = SimpleNamespace(assistants=_Assistants(self),
+                                    threads=_Threads(self, _Messages(self), runs))
+
+    def _call(self, endpoint):
+        # Simulates the round-trip of one request, failing it at failure_rate
+        with self._lock:
+            self.calls[endpoint] += 1
+            delay = self.latency + self._rng.uniform(0, self.jitter)
+            fail = self._rng.random() < self.failure_rate
+            status = self._rng.choice((429, 500)) if fail else None
+            if fail:
+                self.failures[endpoint] += 1
+        if delay:
+            time.sleep(delay)
+        if status is not None:
+            raise api_error(status, f"Injected failure of {endpoint}",
+                            self.retry_after if status == 429 else None)
+
+    def _new_id(self, prefix):
+        return f"{prefix}_{next(self._ids):08d}"
+
+    def _thread(self, thread_id):
+        thread = self._threads.get(thread_id)
+        if thread is None:
+            raise api_error(404, f"No thread found with id '{thread_id}'")
+        return thread
+
+    def _add_message(self, thread_id, role, content):
+        # Caller holds the lock
+        message = SimpleNamespace(id=self._new_id('msg'), object='thread.message', thread_id=thread_id, role=role,
+                                  created_at=int(time.time()),
+                                  content=[SimpleNamespace(type='text', text=SimpleNamespace(value=content))])
+        self._thread(thread_id).append(message)
+        return message
+
+    def _start_run(self, thread_id, assistant_id):
+        with self._lock:
+            history = [message.content[0].text.value for message in self._thread(thread_id)]
+            run = SimpleNamespace(id=self._new_id('run'), thread_id=thread_id, assistant_id=assistant_id,
+                                  status='queued', last_error=None)
+            run.finishes_at = time.monotonic() + self.run_seconds + self._rng.uniform(0, self.jitter)
+            run.fails = self._rng.random() < self.run_failure_rate
+            run.text = self.reply(assistant_id, history, self._rng)
+            self._runs[run.id] = run
+        return run
+
+    def _finish_run(self, run):
+        with self._lock:
+            if run.status not in ('queued', 'in_progress'):
+                return
+            if run.fails:
+                run.status = 'failed'
+                run.last_error = SimpleNamespace(code='server_error', message="Injected run failure")
+            else:
+                run.status = 'completed'
+                self._add_message(run.thread_id, 'assistant', run.text)
+
+    def _snapshot(self, run):
+        return SimpleNamespace(id=run.id, thread_id=run.thread_id, assistant_id=run.assistant_id,
+                               status=run.status, last_error=run.last_error)
+
+
+class _Assistants:
+    def __init__(self, fake):
+        self._fake = fake
+
+    def retrieve(self, assistant_id, **kwargs):
+        self._fake._call('assistants.retrieve')
+        if self._fake.assistant_ids is not None and assistant_id not in self._fake.assistant_ids:
+            raise api_error(404, f"No assistant found with id '{assistant_id}'")
+        return SimpleNamespace(id=assistant_id, object='assistant', name=assistant_id, model='fake')
+
+
+class _Threads:
+    def __init__(self, fake, messages, runs):
+        self._fake = fake
+        self.messages = messages
+        self.runs = runs
+
+    def create(self, messages=None, **kwargs):
+        self._fake._call('threads.create')
+        fake = self._fake
+        with fake._lock:
+            thread_id = fake._new_id('thread')
+            fake._threads[thread_id] = []
+            for message in messages or ():
+                fake._add_message(thread_id, message['role'], message['content'])
+        return SimpleNamespace(id=thread_id, object='thread')
+
+    def retrieve(self, thread_id, **kwargs):
+        self._fake._call('threads.retrieve')
+        with self._fake._lock:
+            self._fake._thread(thread_id)
+        return SimpleNamespace(id=thread_id, object='thread')
+
+    def delete(self, thread_id, **kwargs):
+        self._fake._call('threads.delete')
+        with self._fake._lock:
+            self._fake._thread(thread_id)
+            del self._fake._threads[thread_id]
+        return SimpleNamespace(id=thread_id, object='thread.deleted', deleted=True)
+
+
+class _Messages:
+    def __init__(self, fake):
+        self._fake = fake
+
+    def create(self, thread_id, role, content, **kwargs):
+        self._fake._call('threads.messages.create')
+        with self._fake._lock:
+            return self._fake._add_message(thread_id, role, content)
+
+    def list(self, thread_id, order='desc', after=None, limit=20, **kwargs):
+        # One call returns every page, like iterating the real client's cursor page
+        self._fake._call('threads.messages.list')
+        with self._fake._lock:
+            messages = list(self._fake._thread(thread_id))
+        if order == 'desc':
+            messages.reverse()
+        if after is not None:
+            ids = [message.id for message in messages]
+            messages = messages[ids.index(after) + 1:] if after in ids else []
+        return messages
+
+
+class _Runs:
+    def __init__(self, fake):
+        self._fake = fake
+
+    def create(self, thread_id, assistant_id, **kwargs):
+        self._fake._call('threads.runs.create')
+        return self._fake._snapshot(self._fake._start_run(thread_id, assistant_id))
+
+    def retrieve(self, run_id, thread_id=None, **kwargs):
+        self._fake._call('threads.runs.retrieve')
+        run = self._fake._runs[run_id]
+        if time.monotonic() >= run.finishes_at:
+            self._fake._finish_run(run)
+        else:
+            with self._fake._lock:
+                if run.status == 'queued':
+                    run.status = 'in_progress'
+        return self._fake._snapshot(run)
+
+    def cancel(self, run_id, thread_id=None, **kwargs):
+        self._fake._call('threads.runs.cancel')
+        run = self._fake._runs[run_id]
+        with self._fake._lock:
+            if run.status in ('queued', 'in_progress'):
+                run.status = 'cancelled'
+        return self._fake._snapshot(run)
+
+
+class _StreamingRuns(_Runs):
+    def stream(self, thread_id, assistant_id, **kwargs):
+        return _RunStream(self._fake, thread_id, assistant_id)
+
+
+class _RunStream:
+    # Context manager like AssistantStreamManager: the request is only sent on __enter__
+    def __init__(self, fake, thread_id, assistant_id):
+        self._fake = fake
+        self._thread_id = thread_id
+        self._assistant_id = assistant_id
+        self._run = None
+
+    def __enter__(self):
+        self._fake._call('threads.runs.stream')
+        self._run = self._fake._start_run(self._thread_id, self._assistant_id)
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    @property
+    def text_deltas(self):
+        run = self._run
+        words = run.text.split(' ')
+        size = max(1, -(-len(words) // self._fake.chunks))
+        pieces = [' '.join(words[i:i + size]) + ' ' for i in range(0, len(words), size)]
+        pieces[-1] = pieces[-1].rstrip()
+        for number, piece in enumerate(pieces):
+            # Spread what is left of the run evenly over the pieces still to come
+            remaining = run.finishes_at - time.monotonic()
+            if remaining > 0:
+                time.sleep(remaining / (len(pieces) - number))
+            if run.fails:
+                break
+            yield piece
+        self._fake._finish_run(run)
+
+    def until_done(self):
+        for _ in self.text_deltas:
+            pass
+
+    def get_final_run(self):
+        if self._run.status in ('queued', 'in_progress'):
+            self.until_done()
+        return self._fake._snapshot(self._run)
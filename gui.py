@@ -1,11 +1,18 @@
 import os
+import datetime
+import logging
+import queue
 import ttkbootstrap as tb
 from tkinter import messagebox, simpledialog, filedialog
 from backend import Backend
+from bulk_export import export_conversations
+from metrics import summarize, write_jsonl, write_prometheus
+from worker import BackendWorker
 from PIL import Image, ImageTk
-from cryptography.fernet import Fernet
 import base64
 
+logger = logging.getLogger(__name__)
+
 
 class StartFrame:
     def __init__(self, parent, on_start):
@@ -107,6 +114,9 @@ class StartFrame:
         self.mode_menu.config(text=mode)
 
     def verify_password(self, entered_password):
+        # cryptography is slow to import and only needed once the staff password is entered
+        from cryptography.fernet import Fernet
+
         # Create a Fernet cipher with the encryption key
         cipher = Fernet(self.key.encode())
 
@@ -118,20 +128,29 @@ class StartFrame:
 
 
 class GUI:
+    UI_POLL_MS = 30  # how often work queued by background threads is applied to the widgets
+    TREE_PAGE_SIZE = 100  # users or conversations fetched per expand in the staff tree
+
     def __init__(self, root):
         self.conversation_frame = None
         self.input_frame = None
         self.tree_frame = None
         self.exit_and_export_frame = None
         self.tree = None
+        self.tree_nodes = {}
+        self.search_entry = None
         self.scrollbar = None
         self.add_message_button = None
         self.exit_button = None
         self.export_button = None
+        self.export_all_button = None
+        self.search_button = None
+        self.metrics_button = None
         self.save_button = None
         self.delete_button = None
         self.start_conversation_button = None
         self.info_label = None
+        self.busy_label = None
         self.conversation_text = None
         self.export_conversation_name = None
         self.export_conversation = None
@@ -144,9 +163,11 @@ class GUI:
         self.first_name = None
         self.subject = None
         self.mode = None
+        self.session = None
         self.path = os.path.join(os.getcwd(), 'Exported Conversations')
         self.root = root
-        self.backend = Backend()
+        # The database is migrated in the background while the login screen is up
+        self.backend = Backend(initialize=False)
         self.previous_conversation_loaded = False
         self.started_conversation = False
         self.root.title("FGCU Training AI")
@@ -155,9 +176,45 @@ class GUI:
 
         self.main_frame = tb.Frame(self.root)
         self.start_frame = None
+        self.ui_queue = queue.Queue()
+        self.root.after(self.UI_POLL_MS, self.drain_ui_queue)
+        self.worker = BackendWorker(self.call_in_ui, on_busy_change=self.set_busy)
+        # Sessions are started on the same key, so no login runs before the schema is ready
+        self.worker.submit(self.backend.initialize_database, key='conversation', on_error=self.show_error)
+        # Checked while the login screen is up, so a wrong assistant ID is reported before any session uses it
+        self.worker.submit(self.backend.validate_assistants, on_success=self.show_assistant_errors,
+                           on_error=self.show_error)
 
         self.show_start_frame()
 
+    def call_in_ui(self, func, *args, **kwargs):
+        # Tk widgets may only be touched from the main loop, so background threads hand work over here
+        self.ui_queue.put((func, args, kwargs))
+
+    def drain_ui_queue(self):
+        while True:
+            try:
+                func, args, kwargs = self.ui_queue.get_nowait()
+            except queue.Empty:
+                break
+            func(*args, **kwargs)
+        self.root.after(self.UI_POLL_MS, self.drain_ui_queue)
+
+    def set_busy(self, busy):
+        self.root.config(cursor='watch' if busy else '')
+        if self.busy_label is not None and self.busy_label.winfo_exists():
+            self.busy_label.config(text='Working...' if busy else '')
+
+    def show_error(self, error):
+        messagebox.showerror("Error", str(error))
+
+    def show_assistant_errors(self, errors):
+        if not errors:
+            return
+        lines = [f"{config.mode}/{config.subject}: {config.assistant_id} ({type(error).__name__})"
+                 for config, error in errors]
+        messagebox.showerror("Assistant configuration", "These assistants could not be loaded:\n" + "\n".join(lines))
+
     def show_start_frame(self):
         if self.main_frame:
             self.main_frame.pack_forget()  # Hide the main frame if it exists
@@ -167,14 +224,16 @@ class GUI:
         self.first_name = first_name
         self.subject = subject
         self.mode = mode
-        self.backend.set_subject(subject)
-        self.backend.set_mode(mode)
-        print(first_name, subject, mode)
-        self.backend.check_username(first_name)
-        self.backend.create_conversation_name()  # initialize conversation name
-        if self.start_frame:
-            self.start_frame.frame.pack_forget()  # Hide the start frame
-        self.show_main_frame()
+        logger.info("Starting session: subject %s, mode %s", subject, mode)
+
+        def on_logged_in(session):
+            self.session = session
+            if self.start_frame:
+                self.start_frame.frame.pack_forget()  # Hide the start frame
+            self.show_main_frame()
+
+        self.worker.submit(self.backend.start_session, first_name, subject, mode, key='conversation',
+                           on_success=on_logged_in, on_error=self.show_error)
 
     def show_main_frame(self):
         self.main_frame = tb.Frame(self.root)
@@ -185,6 +244,10 @@ class GUI:
                                    font=('Helvetica', 12))
         self.info_label.pack(side=tb.TOP, fill=tb.X, pady=5, padx=5)
 
+        # Shows whether backend work is still in progress
+        self.busy_label = tb.Label(self.info_label, text='', font=('Helvetica', 12), style='info')
+        self.busy_label.pack(side=tb.RIGHT)
+
         # Create conversation display area
         self.conversation_frame = tb.Frame(self.main_frame, padding=(10, 10, 0, 10))
         self.conversation_frame.pack(expand=True, fill=tb.BOTH, side=tb.RIGHT)
@@ -243,10 +306,21 @@ class GUI:
         self.tree_frame = tb.Frame(self.main_frame, padding=(10, 10, 10, 20))
         self.tree_frame.pack(side=tb.LEFT, fill=tb.BOTH)
 
+        if self.first_name == 'CAA Staff':
+            # Create the search box; filtering happens in the database
+            search_frame = tb.Frame(self.tree_frame)
+            search_frame.pack(side=tb.TOP, fill=tb.X, pady=(0, 5))
+            self.search_entry = tb.Entry(search_frame)
+            self.search_entry.pack(side=tb.LEFT, expand=True, fill=tb.X)
+            self.search_entry.bind('<Return>', lambda event: self.load_previous_conversations())
+            tb.Button(search_frame, text='Search', command=self.load_previous_conversations,
+                      style='primary').pack(side=tb.RIGHT, padx=(5, 0))
+
         # Create the TreeView
         self.tree = tb.Treeview(self.tree_frame, columns=('conversation',), style='primary')
         self.tree.heading('#0', text='Previous Conversations', anchor='w')
         self.tree.column('#0', width=300)
+        self.tree.tag_configure('big_font', font=('Helvetica', 10))
         self.tree.pack(expand=True, fill=tb.BOTH)
 
         # Create the frame for exit and export buttons
@@ -261,11 +335,29 @@ class GUI:
         self.export_button = tb.Button(self.exit_and_export_frame, text='Export', command=self.export, style='primary')
         self.export_button.pack(side=tb.RIGHT, anchor='se', padx=(10, 0), pady=5)
 
+        # Create the Search button
+        self.search_button = tb.Button(self.exit_and_export_frame, text='Search', command=self.search_transcripts,
+                                       style='primary')
+        self.search_button.pack(side=tb.RIGHT, anchor='se', padx=(10, 0), pady=5)
+
+        if self.first_name == 'CAA Staff':
+            # Create the Export All button
+            self.export_all_button = tb.Button(self.exit_and_export_frame, text='Export All', command=self.export_all,
+                                               style='primary')
+            self.export_all_button.pack(side=tb.RIGHT, anchor='se', padx=(10, 0), pady=5)
+
+            # Create the Metrics button
+            self.metrics_button = tb.Button(self.exit_and_export_frame, text='Metrics', command=self.show_metrics,
+                                            style='primary')
+            self.metrics_button.pack(side=tb.RIGHT, anchor='se', padx=(10, 0), pady=5)
+
         # Load previous conversations into the TreeView
         self.load_previous_conversations()
 
         # Bind the tree selection event to load the selected conversation
         self.tree.bind('<<TreeviewSelect>>', self.load_selected_conversation)
+        # Staff tree nodes fetch their children when first expanded
+        self.tree.bind('<<TreeviewOpen>>', self.expand_tree_node)
 
     def start_conversation(self):
         if self.previous_conversation_loaded:
@@ -293,40 +385,56 @@ class GUI:
             self.clear_conversation()
             self.previous_conversation_loaded = False
 
-        self.conversation_text.config(state='normal')  # Set state too normal to allow editing
-        conversation_name = self.backend.get_conversation_name()
-        user_id = self.backend.get_user_id()
-
         if self.mode == 'Generate Conversation':
-            response = self.backend.generate_response('Continue Conversation', user_id,
-                                                      self.first_name, conversation_name)
-            self.conversation_text.insert(tb.END, f"{response}\n\n")
+            self.stream_response('Continue Conversation')
 
         else:
 
             message = self.message_entry.get("1.0", tb.END)
             if self.message == 'Start':
-                response = self.backend.generate_response(self.message, user_id, self.first_name, conversation_name)
-                self.conversation_text.insert(tb.END, f"{self.subject} {self.mode}: {response}\n\n")
+                self.stream_response(self.message, f"{self.subject} {self.mode}: ")
                 self.message = ''
             elif message == '' and self.started_conversation:
                 messagebox.showwarning('Error', 'Enter a message')
                 return
             else:
-                self.conversation_text.insert(tb.END, f"{self.first_name}: {message}\n\n")
-                response = self.backend.generate_response(message, user_id, self.first_name, conversation_name)
-                self.conversation_text.insert(tb.END, f"{self.subject} {self.mode}: {response}\n\n")
+                self.stream_response(message, f"{self.subject} {self.mode}: ", f"{self.first_name}: {message}\n\n")
 
             # Clear the entry box after adding the message
             self.message_entry.delete(1.0, tb.END)
 
+        return 'break'  # move cursor back to first line
+
+    def stream_response(self, message, prefix='', echo=''):
+        # Turns are serialized on the 'conversation' key, so each one renders after the previous reply ends
+        session = self.session
+
+        def turn():
+            task = self.worker.current_task()
+
+            def show(text):
+                # Fragments queued before a cancel must not reach the pane after it was cleared
+                if not task.cancelled:
+                    self.append_text(text)
+
+            self.call_in_ui(show, echo + prefix)
+            # A cancelled turn still drains the reply, so the key is held until its run has finished and been
+            # stored; otherwise the next turn could post to a thread with an active run
+            for delta in self.backend.generate_response_stream(session, message):
+                if not task.cancelled:
+                    self.call_in_ui(show, delta)
+            self.call_in_ui(show, "\n\n")
+
+        self.worker.submit(turn, key='conversation', on_error=self.show_error)
+
+    def append_text(self, text):
+        self.conversation_text.config(state='normal')  # Set state too normal to allow editing
+        self.conversation_text.insert(tb.END, text)
         self.conversation_text.config(state='disabled')
 
         # Scroll to the bottom of the conversation text widget
         self.conversation_text.see(tb.END)
 
-        return 'break'  # move cursor back to first line
-
     def save_conversation(self):
         self.started_conversation = False
         if self.is_conversation_empty():
@@ -342,9 +450,8 @@ class GUI:
         # Clear the conversation display area
         self.clear_conversation()
 
-        self.backend.create_conversation_name()  # create new conversation name
-        print("new conversation name:  ", self.backend.get_conversation_name())
-        print("Conversation cleared. You can start a new conversation now.")
+        # Start a new conversation; it is numbered once its first message is stored
+        self.worker.submit(self.backend.new_conversation, self.session, key='conversation', on_error=self.show_error)
 
     def export(self):
         if self.export_username is None or self.export_conversation_name is None:
@@ -352,9 +459,10 @@ class GUI:
             return
 
         def on_button_click(export_format):
-            # Call the backend function to export the conversation
-            self.backend.export_conversation(export_format, self.export_conversation_name, self.export_username,
-                                             self.export_user_id, self.path)
+            # Export in the background; the pop-up can close straight away
+            self.worker.submit(self.backend.export_conversation, export_format, self.export_conversation_name,
+                               self.export_username, self.export_user_id, self.path, key='export',
+                               on_error=self.show_error)
             # Close the pop-up window
             top.destroy()
 
@@ -394,6 +502,214 @@ class GUI:
         # Wait for the pop-up window to be closed before returning
         top.wait_window()
 
+    def export_all(self):
+        subjects = ["All", "Writing", "Chemistry", "Biology", "Physics", "Nursing", "Math", "Business"]
+        modes = ["All", "Tutor", "Tutee", "Generate Conversation"]
+
+        def on_button_click(export_format):
+            filters = {}
+            if username_entry.get().strip():
+                filters['username'] = username_entry.get().strip()
+            if subject_box.get() != 'All':
+                filters['subject'] = subject_box.get()
+            if mode_box.get() != 'All':
+                filters['mode'] = mode_box.get()
+            stamp = datetime.datetime.now().strftime('%Y-%m-%d %H%M%S')
+            archive_path = os.path.join(self.path, f"Conversations {stamp}.zip")
+
+            def on_progress(report):
+                self.call_in_ui(self.show_export_progress, report.done, report.total)
+
+            def on_exported(report):
+                message = f"Exported {report.exported} conversations to {archive_path}"
+                if report.failures:
+                    message += f"\n{len(report.failures)} could not be exported"
+                messagebox.showinfo("Export All", message)
+
+            self.worker.submit(export_conversations, self.backend.store, archive_path, export_format,
+                               on_progress=on_progress, key='export', on_success=on_exported,
+                               on_error=self.show_error, **filters)
+            top.destroy()
+
+        # Create a new pop-up window
+        top = tb.Toplevel()
+        top.title("Export All Conversations")
+        top.minsize(350, 250)
+
+        # Filters: blank or 'All' matches everything
+        filter_frame = tb.Frame(top)
+        filter_frame.pack(pady=10)
+        tb.Label(filter_frame, text="Username:", font=('Helvetica', 12)).grid(row=0, column=0, sticky='w', pady=2)
+        username_entry = tb.Entry(filter_frame)
+        username_entry.grid(row=0, column=1, pady=2)
+        tb.Label(filter_frame, text="Subject:", font=('Helvetica', 12)).grid(row=1, column=0, sticky='w', pady=2)
+        subject_box = tb.Combobox(filter_frame, values=subjects, state='readonly')
+        subject_box.set('All')
+        subject_box.grid(row=1, column=1, pady=2)
+        tb.Label(filter_frame, text="Mode:", font=('Helvetica', 12)).grid(row=2, column=0, sticky='w', pady=2)
+        mode_box = tb.Combobox(filter_frame, values=modes, state='readonly')
+        mode_box.set('All')
+        mode_box.grid(row=2, column=1, pady=2)
+
+        # Add buttons for exporting to Word Doc and PDF
+        button_frame = tb.Frame(top)
+        button_frame.pack()
+        word_doc_button = tb.Button(button_frame, text="Word Doc", command=lambda: on_button_click("Word Doc"))
+        word_doc_button.pack(side='left', padx=5, pady=5)
+        pdf_button = tb.Button(button_frame, text="PDF", command=lambda: on_button_click("PDF"))
+        pdf_button.pack(side='left', padx=5, pady=5)
+
+        # Add button to set export directory
+        set_directory_button = tb.Button(top, text="Set Export Directory",
+                                         command=lambda: self.set_export_directory(selected_directory_label))
+        set_directory_button.pack(pady=5)
+        selected_directory_label = tb.Label(top, text=self.path, font=('Helvetica', 12))
+        selected_directory_label.pack(side=tb.BOTTOM)
+
+        top.grab_set()
+        top.wait_window()
+
+    def search_transcripts(self):
+        subjects = ["All", "Writing", "Chemistry", "Biology", "Physics", "Nursing", "Math", "Business"]
+        modes = ["All", "Tutor", "Tutee", "Generate Conversation"]
+        staff = self.first_name == 'CAA Staff'
+        results = {}
+
+        def run_search():
+            filters = {}
+            if not staff:
+                filters['username'] = self.first_name
+            elif username_entry.get().strip():
+                filters['username'] = username_entry.get().strip()
+            if subject_box.get() != 'All':
+                filters['subject'] = subject_box.get()
+            if mode_box.get() != 'All':
+                filters['mode'] = mode_box.get()
+            # Only the latest search matters
+            self.worker.cancel('search')
+            self.worker.submit(self.backend.search_conversations, query_entry.get(), filters, key='search',
+                               on_success=show_results, on_error=self.show_error)
+
+        def show_results(matches):
+            if not top.winfo_exists():
+                return
+            results_tree.delete(*results_tree.get_children())
+            results.clear()
+            for match in matches:
+                label = (f"{match['username']}: {match['conversation_name']}" if staff
+                         else match['conversation_name'])
+                item = results_tree.insert('', 'end', text=label, values=(match['snippet'].replace('\n', ' '),))
+                results[item] = match
+            status_label.config(text=f"{len(matches)} matches" if matches else "No matches")
+
+        def on_select(event):
+            selected = results_tree.selection()
+            match = results.get(selected[0]) if selected else None
+            if match is not None:
+                self.previous_conversation_loaded = True
+                self.open_conversation(match['username'], match['conversation_name'], match['user_id'])
+
+        # Create a new pop-up window; it stays open so several matches can be viewed in turn
+        top = tb.Toplevel()
+        top.title("Search Conversations")
+        top.minsize(600, 400)
+
+        query_frame = tb.Frame(top)
+        query_frame.pack(fill=tb.X, padx=10, pady=10)
+        query_entry = tb.Entry(query_frame)
+        query_entry.pack(side=tb.LEFT, expand=True, fill=tb.X)
+        query_entry.bind('<Return>', lambda event: run_search())
+        tb.Button(query_frame, text="Search", command=run_search, style='primary').pack(side=tb.RIGHT, padx=(5, 0))
+
+        # Filters: blank or 'All' matches everything
+        filter_frame = tb.Frame(top)
+        filter_frame.pack(fill=tb.X, padx=10)
+        username_entry = tb.Entry(filter_frame, width=15)
+        if staff:
+            tb.Label(filter_frame, text="Username:").pack(side=tb.LEFT)
+            username_entry.pack(side=tb.LEFT, padx=(2, 10))
+        tb.Label(filter_frame, text="Subject:").pack(side=tb.LEFT)
+        subject_box = tb.Combobox(filter_frame, values=subjects, state='readonly', width=12)
+        subject_box.set('All')
+        subject_box.pack(side=tb.LEFT, padx=(2, 10))
+        tb.Label(filter_frame, text="Mode:").pack(side=tb.LEFT)
+        mode_box = tb.Combobox(filter_frame, values=modes, state='readonly', width=20)
+        mode_box.set('All')
+        mode_box.pack(side=tb.LEFT, padx=2)
+
+        status_label = tb.Label(top, text="", font=('Helvetica', 10))
+        status_label.pack(side=tb.BOTTOM, anchor='w', padx=10, pady=(0, 10))
+
+        # Matches, best first; selecting one shows its conversation
+        results_tree = tb.Treeview(top, columns=('snippet',), style='primary')
+        results_tree.heading('#0', text='Conversation', anchor='w')
+        results_tree.heading('snippet', text='Match', anchor='w')
+        results_tree.column('#0', width=220)
+        results_tree.column('snippet', width=380)
+        results_tree.pack(expand=True, fill=tb.BOTH, padx=10, pady=10)
+        results_tree.bind('<<TreeviewSelect>>', on_select)
+
+        query_entry.focus_set()
+
+    def show_metrics(self):
+        columns = ('subject', 'mode', 'count', 'p50', 'p95', 'p99', 'max')
+        loaded = []  # Spans of the last refresh, from every station writing to the metrics directory
+
+        def show(records):
+            if not metrics_tree.winfo_exists():
+                return
+            loaded[:] = records
+            metrics_tree.delete(*metrics_tree.get_children())
+            for row in summarize(records):
+                metrics_tree.insert('', 'end', text=row['stage'], values=(
+                    row['subject'] or '', row['mode'] or '', row['count'],
+                    *(f"{row[column]:.3f}" for column in ('p50', 'p95', 'p99', 'max'))))
+
+        def refresh():
+            # Reading the files of every station can take a moment, so it happens off the main loop
+            self.worker.submit(self.backend.load_metrics, key='metrics', on_success=show, on_error=self.show_error)
+
+        def export(extension):
+            stamp = datetime.datetime.now().strftime('%Y-%m-%d %H%M%S')
+            path = os.path.join(self.path, f"Metrics {stamp}.{extension}")
+            records = list(loaded)
+
+            def write():
+                os.makedirs(self.path, exist_ok=True)
+                if extension == 'jsonl':
+                    write_jsonl(path, records)
+                else:
+                    write_prometheus(path, summarize(records))
+
+            self.worker.submit(write, key='export', on_error=self.show_error,
+                               on_success=lambda _: messagebox.showinfo("Metrics", f"Metrics written to {path}"))
+
+        # Create a new pop-up window
+        top = tb.Toplevel()
+        top.title("Turn Latency (seconds)")
+        top.minsize(700, 400)
+
+        button_frame = tb.Frame(top)
+        button_frame.pack(side=tb.BOTTOM, pady=10)
+        tb.Button(button_frame, text="Refresh", command=refresh).pack(side='left', padx=5)
+        tb.Button(button_frame, text="Export JSONL", command=lambda: export('jsonl')).pack(side='left', padx=5)
+        tb.Button(button_frame, text="Export Prometheus", command=lambda: export('prom')).pack(side='left', padx=5)
+
+        # One row per stage, subject and mode over the turns of the last week
+        metrics_tree = tb.Treeview(top, columns=columns, style='primary')
+        metrics_tree.heading('#0', text='Stage', anchor='w')
+        metrics_tree.column('#0', width=140)
+        for column in columns:
+            metrics_tree.heading(column, text=column.title() if column in ('subject', 'mode', 'count') else column,
+                                 anchor='w')
+            metrics_tree.column(column, width=150 if column == 'mode' else 80)
+        metrics_tree.pack(expand=True, fill=tb.BOTH, padx=10, pady=10)
+        refresh()
+
+    def show_export_progress(self, done, total):
+        if self.busy_label is not None and self.busy_label.winfo_exists() and self.worker.busy:
+            self.busy_label.config(text=f'Exported {done}/{total}')
+
     def set_export_directory(self, label_widget):
         # Open a file dialog to select the export directory
         export_directory = filedialog.askdirectory(initialdir=os.getcwd())
@@ -402,9 +718,9 @@ class GUI:
         if export_directory:
             self.path = export_directory
             label_widget.config(text=self.path)
-            print("Export directory selected:", export_directory)
+            logger.debug("Export directory selected: %s", export_directory)
         else:
-            print("No export directory selected.")
+            logger.debug("No export directory selected")
 
     def is_conversation_empty(self):
         # Get the content of the conversation text widget
@@ -416,7 +732,11 @@ class GUI:
         if not self.is_conversation_empty():
             # Get the selected conversation
             selected_item = self.tree.selection()
-            conversation_name = self.tree.item(selected_item, 'text')
+            node = self.tree_nodes.get(selected_item[0]) if selected_item else None
+            if node is None or node['kind'] != 'conversation':
+                messagebox.showwarning('Error', 'Select a conversation to delete')
+                return
+            conversation_name = node['conversation_name']
 
             # Prompt the user for confirmation
             confirmed = messagebox.askyesno("Confirmation",
@@ -424,56 +744,147 @@ class GUI:
 
             if confirmed:
                 # If user confirms deletion, proceed with deletion
-                if self.first_name == 'CAA Staff':
-                    parent_item = self.tree.parent(selected_item)
-                    username_item = self.tree.parent(parent_item)
-                    username_text = self.tree.item(username_item, 'text')
-                    username = username_text.split("'s Conversations")[0]
-                    user_id = self.backend.get_user_id_by_username(username)
-                else:
-                    user_id = self.backend.get_user_id()
-                self.backend.remove_conversation(conversation_name, user_id)
-                self.load_previous_conversations()
-                self.clear_conversation()
-                print("Deleting conversation")
+                username = node['username'] if self.first_name == 'CAA Staff' else None
+
+                def remove():
+                    if username is not None:
+                        user_id = self.backend.get_user_id_by_username(username)
+                    else:
+                        user_id = self.session.user_id
+                    self.backend.remove_conversation(conversation_name, user_id)
+
+                def on_removed(_):
+                    self.load_previous_conversations()
+                    self.clear_conversation()
+                    logger.debug("Deleted conversation %s", conversation_name)
+
+                self.worker.submit(remove, key='conversation', on_success=on_removed, on_error=self.show_error)
         else:
             messagebox.showwarning('Error', 'Cannot delete empty conversation')
 
     def load_previous_conversations(self):
         self.started_conversation = False
         self.previous_conversation_loaded = True
-        # Clear existing items in the TreeView
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-
+        # Only the most recent reload matters
+        self.worker.cancel('tree')
         if self.first_name == 'CAA Staff':
-            conversations_by_username = self.backend.retrieve_conversations_by_username(self.first_name)
-            for username, data in conversations_by_username.items():
-                user_node = self.tree.insert('', 'end', text=f"{username}'s Conversations")
-                for mode, conversations in data.items():
-                    if mode == 'Generate Conversation':
-                        mode_node = self.tree.insert(user_node, 'end', text=f"Generated Conversations")
-                    else:
-                        mode_node = self.tree.insert(user_node, 'end', text=f"{mode} Conversations")
-                    for conversation in conversations:
-                        self.tree.insert(mode_node, 'end', text=conversation)
+            # Only the first page of users is fetched; their modes and conversations load on expand
+            self.clear_tree()
+            search = self.search_entry.get().strip() or None
+            self.load_user_page(search, None)
         else:
             # Retrieve previous conversations from the backend grouped by mode
-            user_id = self.backend.get_user_id()
-            conversations_by_mode = self.backend.retrieve_conversations_by_mode(user_id)
+            self.worker.submit(self.backend.retrieve_conversations_by_mode, self.session.user_id, key='tree',
+                               on_success=self.populate_tree, on_error=self.show_error)
 
-            # Insert mode folders and conversations into the TreeView
-            for mode, conversations in conversations_by_mode.items():
-                if mode == 'Generate Conversation':
-                    mode_item = self.tree.insert('', 'end', text="Generated Conversations")
-                else:
-                    mode_item = self.tree.insert('', 'end', text=f"{mode} Conversations")
-                for conversation in conversations:
-                    self.tree.insert(mode_item, 'end', text=conversation)
+    @staticmethod
+    def mode_label(mode):
+        if mode == 'Generate Conversation':
+            return "Generated Conversations"
+        return f"{mode} Conversations"
 
-        self.tree.tag_configure('big_font', font=('Helvetica', 10))
+    def clear_tree(self):
         for item in self.tree.get_children():
-            self.tree.item(item, tags=('big_font',))
+            self.tree.delete(item)
+        self.tree_nodes.clear()
+
+    def forget_tree_node(self, item):
+        # Drops an item and its descendants from the tree and from tree_nodes
+        stack = [item]
+        while stack:
+            current = stack.pop()
+            self.tree_nodes.pop(current, None)
+            stack.extend(self.tree.get_children(current))
+        self.tree.delete(item)
+
+    def add_tree_node(self, parent, text, node, lazy=False):
+        item = self.tree.insert(parent, 'end', text=text, tags=('big_font',) if parent == '' else ())
+        self.tree_nodes[item] = node
+        if lazy:
+            # Placeholder child so the node shows an expand arrow before its children are fetched
+            self.tree_nodes[self.tree.insert(item, 'end', text='Loading...')] = {'kind': 'placeholder'}
+        return item
+
+    def populate_tree(self, conversations_by_mode):
+        self.clear_tree()
+        # Insert mode folders and conversations into the TreeView
+        for mode, conversations in conversations_by_mode.items():
+            mode_item = self.add_tree_node('', self.mode_label(mode), {'kind': 'mode', 'mode': mode})
+            for conversation in conversations:
+                self.add_tree_node(mode_item, conversation, {'kind': 'conversation', 'username': self.first_name,
+                                                             'conversation_name': conversation})
+
+    def load_user_page(self, search, after, more_item=None):
+        self.worker.submit(self.backend.retrieve_user_counts, self.first_name, search, after, self.TREE_PAGE_SIZE,
+                           key='tree', on_success=lambda users: self.add_user_nodes(users, search, more_item),
+                           on_error=self.show_error)
+
+    def add_user_nodes(self, users, search, more_item):
+        if more_item is not None and self.tree.exists(more_item):
+            self.forget_tree_node(more_item)
+        for username, count in users:
+            self.add_tree_node('', f"{username}'s Conversations ({count})",
+                               {'kind': 'user', 'username': username, 'search': search, 'loaded': False},
+                               lazy=True)
+        if len(users) == self.TREE_PAGE_SIZE:
+            self.add_tree_node('', 'Load more...', {'kind': 'more', 'search': search, 'after': users[-1][0]})
+
+    def expand_tree_node(self, event):
+        item = self.tree.focus()
+        node = self.tree_nodes.get(item)
+        if node is None or node['kind'] not in ('user', 'mode') or node.get('loaded', True):
+            return
+        node['loaded'] = True
+        if node['kind'] == 'user':
+            self.worker.submit(self.backend.retrieve_mode_counts, node['username'], node['search'], key='tree',
+                               on_success=lambda modes: self.add_mode_nodes(item, node, modes),
+                               on_error=self.show_error)
+        else:
+            self.load_conversation_page(item, node, None)
+
+    def clear_placeholder(self, item):
+        for child in self.tree.get_children(item):
+            if self.tree_nodes.get(child, {}).get('kind') == 'placeholder':
+                self.forget_tree_node(child)
+
+    def add_mode_nodes(self, user_item, user_node, modes):
+        if not self.tree.exists(user_item):
+            return
+        self.clear_placeholder(user_item)
+        for mode, count in modes:
+            self.add_tree_node(user_item, f"{self.mode_label(mode)} ({count})",
+                               {'kind': 'mode', 'username': user_node['username'], 'mode': mode,
+                                'search': user_node['search'], 'loaded': False}, lazy=True)
+
+    def load_conversation_page(self, mode_item, mode_node, after, more_item=None):
+        self.worker.submit(self.backend.retrieve_conversation_names, mode_node['username'], mode_node['mode'],
+                           mode_node['search'], after, self.TREE_PAGE_SIZE, key='tree',
+                           on_success=lambda rows: self.add_conversation_nodes(mode_item, mode_node, rows,
+                                                                               more_item),
+                           on_error=self.show_error)
+
+    def add_conversation_nodes(self, mode_item, mode_node, rows, more_item):
+        if not self.tree.exists(mode_item):
+            return
+        self.clear_placeholder(mode_item)
+        if more_item is not None and self.tree.exists(more_item):
+            self.forget_tree_node(more_item)
+        for conversation_id, name in rows:
+            self.add_tree_node(mode_item, name, {'kind': 'conversation', 'username': mode_node['username'],
+                                                 'conversation_name': name})
+        if len(rows) == self.TREE_PAGE_SIZE:
+            self.add_tree_node(mode_item, 'Load more...',
+                               {'kind': 'more', 'parent': mode_node, 'after': rows[-1][0]})
+
+    def load_more(self, item, node):
+        if node.get('requested'):
+            return
+        node['requested'] = True
+        parent = self.tree.parent(item)
+        if parent == '':
+            self.load_user_page(node['search'], node['after'], item)
+        else:
+            self.load_conversation_page(parent, node['parent'], node['after'], item)
 
     def load_selected_conversation(self, event):
         self.previous_conversation_loaded = True
@@ -483,34 +894,43 @@ class GUI:
             return
 
         selected_item = selected_item[0]  # Get the first selected item
+        node = self.tree_nodes.get(selected_item)
+        if node is None:
+            return
+        if node['kind'] == 'more':
+            self.load_more(selected_item, node)
+            return
+        if node['kind'] != 'conversation':
+            return
 
-        # Retrieve the conversation name associated with the selected item
-        conversation_name = self.tree.item(selected_item, 'text')
+        self.open_conversation(node['username'], node['conversation_name'])
 
-        if self.first_name == 'CAA Staff':
-            parent_item = self.tree.parent(selected_item)
-            username_item = self.tree.parent(parent_item)
-            username_text = self.tree.item(username_item, 'text')
-            username = username_text.split("'s Conversations")[0]
-            if username not in ['Tutee Conversations', 'Tutor Conversations', 'Generated Conversations', '']:
-                user_id = self.backend.get_user_id_by_username(username)
+    def open_conversation(self, username, conversation_name, user_id=None):
+        logger.debug("Loading conversation %s", conversation_name)
+
+        def retrieve():
+            if user_id is not None:
+                conversation_user_id = user_id
+            elif self.first_name == 'CAA Staff':
+                conversation_user_id = self.backend.get_user_id_by_username(username)
             else:
-                return
+                conversation_user_id = self.session.user_id
+            # Retrieve the conversation from the backend
+            conversation = self.backend.retrieve_previous_conversation(conversation_user_id, conversation_name)
+            # Format the conversation for display
+            formatted_conversation = self.backend.format_conversation(conversation) if conversation else None
+            return conversation_user_id, formatted_conversation
 
-        else:
-            username = self.first_name
-            user_id = self.backend.get_user_id()
-        print("conversation name", conversation_name)
-        # Retrieve the conversation from the backend
+        # A newer selection supersedes one that is still loading
+        self.worker.cancel('load')
+        self.worker.submit(retrieve, key='load', on_success=lambda result: self.show_selected_conversation(
+            username, conversation_name, *result), on_error=self.show_error)
+
+    def show_selected_conversation(self, username, conversation_name, user_id, formatted_conversation):
         self.export_conversation_name = conversation_name
         self.export_username = username
         self.export_user_id = user_id
-        conversation = self.backend.retrieve_previous_conversation(user_id, conversation_name)
-        # print(conversation)
-        if conversation:
-            # Format the conversation for display
-            formatted_conversation = self.backend.format_conversation(conversation)
-            print("formatting done")
+        if formatted_conversation:
             # Display the selected conversation in the conversation text widget
             self.conversation_text.config(state='normal')  # Set state too normal to allow editing
             self.conversation_text.delete(1.0, tb.END)  # Clear existing conversation
@@ -518,12 +938,15 @@ class GUI:
             self.conversation_text.config(state='disabled')  # Set state to disabled to disable editing
 
     def clear_conversation(self):
+        # Stop any reply that is still streaming into the display area
+        self.worker.cancel('conversation')
         # Clear the conversation display area
         self.conversation_text.config(state='normal')  # Set state too normal to allow editing
         self.conversation_text.delete(1.0, tb.END)  # Clear existing conversation
         self.conversation_text.config(state='disabled')  # Set state to disabled to disable editing
 
     def exit(self):
+        self.worker.cancel()
         self.clear_conversation()
         self.show_start_frame()
 
@@ -532,3 +955,5 @@ def start_gui():
     root = tb.Window(themename='darkly')
     gui = GUI(root)
     root.mainloop()
+    gui.worker.shutdown()
+    gui.backend.close()
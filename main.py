@@ -1,9 +1,16 @@
-import gui
-from tkinter import messagebox
-
-
-if __name__ == "__main__":
-    try:
-        gui.start_gui()
-    except Exception as e:
-        messagebox.showerror("Error", str(e))
+import gui
+import logging
+import multiprocessing
+from tkinter import messagebox
+from app_logging import configure_logging
+
+
+if __name__ == "__main__":
+    # Bulk exports render in worker processes, which a frozen executable has to dispatch here
+    multiprocessing.freeze_support()
+    configure_logging()
+    try:
+        gui.start_gui()
+    except Exception as e:
+        logging.getLogger(__name__).exception("Unhandled error")
+        messagebox.showerror("Error", str(e))
@@ -0,0 +1,280 @@
+import datetime
+import glob
+import json
+import math
+import os
+import socket
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def percentile(sorted_values, fraction):
+    """
+        Nearest-rank percentile.
+
+        Args:
+            sorted_values (list): Values in ascending order; must not be empty.
+            fraction (float): Percentile as a fraction, e.g. 0.95.
+
+        Returns:
+            float: Smallest value with at least `fraction` of the values at or below it.
+    """
+    index = max(0, math.ceil(fraction * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def escape_label(value):
+    # Label values in the Prometheus text format escape backslashes, double quotes and newlines
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class SpanRecord:
+    """
+        Duration of one stage of a turn.
+
+        Attributes:
+            stage (str): Stage name, e.g. 'message_create' or 'run_wait'.
+            seconds (float): Duration.
+            labels (dict): Labels such as subject and mode.
+            ok (bool): False when the stage raised.
+            timestamp (float): Unix time the stage finished.
+    """
+
+    __slots__ = ('stage', 'seconds', 'labels', 'ok', 'timestamp')
+
+    def __init__(self, stage, seconds, labels, ok=True, timestamp=None):
+        self.stage = stage
+        self.seconds = seconds
+        self.labels = labels
+        self.ok = ok
+        self.timestamp = time.time() if timestamp is None else timestamp
+
+    def as_dict(self):
+        return {"time": self.timestamp, "stage": self.stage, "seconds": self.seconds, "ok": self.ok, **self.labels}
+
+    @classmethod
+    def from_dict(cls, data):
+        data = dict(data)
+        return cls(data.pop('stage'), data.pop('seconds'), data, data.pop('ok', True), data.pop('time', None))
+
+
+def summarize(records, group_by=('stage', 'subject', 'mode')):
+    """
+        Summarizes spans per group.
+
+        Args:
+            records (iterable): SpanRecords.
+            group_by (tuple): 'stage' and/or label names to group by. Spans without a label are grouped under None.
+
+        Returns:
+            list: Dicts with the group's keys plus count, errors, total, mean, max and p50/p95/p99 in seconds,
+                sorted by group.
+    """
+    groups = {}
+    for record in records:
+        key = tuple(record.stage if name == 'stage' else record.labels.get(name) for name in group_by)
+        groups.setdefault(key, []).append(record)
+    rows = []
+    for key in sorted(groups, key=lambda key: tuple('' if value is None else str(value) for value in key)):
+        values = sorted(record.seconds for record in groups[key])
+        row = dict(zip(group_by, key))
+        row.update(count=len(values), errors=sum(not record.ok for record in groups[key]), total=sum(values),
+                   mean=sum(values) / len(values), max=values[-1])
+        for quantile in QUANTILES:
+            row[f"p{round(quantile * 100)}"] = percentile(values, quantile)
+        rows.append(row)
+    return rows
+
+
+def write_jsonl(path, records, mode='w'):
+    """
+        Writes spans as one JSON object per line.
+
+        Args:
+            path (str): File to write.
+            records (list): SpanRecords.
+            mode (str): 'w' to replace the file, 'a' to append to it.
+
+        Returns:
+            int: Number of spans written.
+    """
+    with open(path, mode, encoding='utf-8') as f:
+        f.write(''.join(json.dumps(record.as_dict()) + '\n' for record in records))
+    return len(records)
+
+
+def read_jsonl(directory, since=None):
+    """
+        Reads the spans every process appended to a metrics directory, e.g. all stations sharing a database.
+        Files last written before `since` are skipped unread, and a line cut short by a writer that is still
+        appending is ignored.
+
+        Args:
+            directory (str): Directory of .jsonl files.
+            since (float, optional): Unix time; older spans are left out.
+
+        Returns:
+            list: SpanRecords, oldest file first.
+    """
+    records = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.jsonl'))):
+        try:
+            if since is not None and os.path.getmtime(path) < since:
+                continue
+            with open(path, encoding='utf-8') as f:
+                lines = f.readlines()
+        except OSError:
+            continue
+        for line in lines:
+            try:
+                record = SpanRecord.from_dict(json.loads(line))
+            except (ValueError, KeyError, TypeError):
+                continue
+            if since is None or record.timestamp >= since:
+                records.append(record)
+    return records
+
+
+def write_prometheus(path, rows, name='turn_stage_seconds'):
+    """
+        Writes summary rows in the Prometheus text exposition format, e.g. for node_exporter's textfile
+        collector.
+
+        Args:
+            path (str): File to write.
+            rows (list): Rows from summarize grouped by stage, subject and mode.
+            name (str): Metric name.
+    """
+    def labels(row, **extra):
+        pairs = {key: row[key] for key in ('stage', 'subject', 'mode') if row.get(key) is not None}
+        pairs.update(extra)
+        return '{' + ','.join(f'{key}="{escape_label(value)}"' for key, value in pairs.items()) + '}'
+
+    lines = [f"# HELP {name} Duration of each stage of a turn, over the most recent spans.",
+             f"# TYPE {name} summary"]
+    for row in rows:
+        for quantile in QUANTILES:
+            lines.append(f"{name}{labels(row, quantile=quantile)} {row[f'p{round(quantile * 100)}']:.6f}")
+        lines.append(f"{name}_sum{labels(row)} {row['total']:.6f}")
+        lines.append(f"{name}_count{labels(row)} {row['count']}")
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+
+
+class Metrics:
+    """
+        Records how long each stage of a turn takes into a ring buffer, so memory stays bounded however long
+        the application runs, and summarizes the recent spans as percentiles.
+
+        With a directory set, new spans are also appended to a JSONL file there on every flush, one file per
+        process and day, so spans outlive the process and can be aggregated across stations with read_jsonl.
+
+        Attributes:
+            capacity (int): Spans kept; the oldest are dropped first.
+            directory (str or None): Directory spans are persisted to; None keeps them in memory only.
+    """
+
+    def __init__(self, capacity=5000, directory=None):
+        self.capacity = capacity
+        self.directory = directory
+        self._records = deque(maxlen=capacity)
+        self._pending = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    def record(self, stage, seconds, labels=None, ok=True):
+        """
+            Records a stage timed elsewhere, e.g. from RunStats.
+
+            Args:
+                stage (str): Stage name.
+                seconds (float): Duration.
+                labels (dict, optional): Labels such as subject and mode.
+                ok (bool): False when the stage failed.
+        """
+        record = SpanRecord(stage, seconds, labels or {}, ok)
+        with self._lock:
+            self._records.append(record)
+            if self.directory is not None:
+                self._pending.append(record)
+
+    @contextmanager
+    def span(self, stage, labels=None):
+        """
+            Times the enclosed block as one stage. The span is recorded even when the block raises.
+
+            Args:
+                stage (str): Stage name.
+                labels (dict, optional): Labels such as subject and mode.
+        """
+        started = time.perf_counter()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            self.record(stage, time.perf_counter() - started, labels, ok)
+
+    def path(self):
+        """
+            Returns:
+                str: File this process appends to today.
+        """
+        return os.path.join(self.directory,
+                            f"{datetime.date.today():%Y-%m-%d}-{socket.gethostname()}-{os.getpid()}.jsonl")
+
+    def flush(self):
+        """
+            Appends the spans recorded since the last flush to today's file. Does nothing without a directory.
+
+            Returns:
+                int: Number of spans written.
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+            if not pending:
+                return 0
+            os.makedirs(self.directory, exist_ok=True)
+            return write_jsonl(self.path(), pending, mode='a')
+
+    def records(self):
+        with self._lock:
+            return list(self._records)
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+            self._pending.clear()
+
+    def summary(self, group_by=('stage', 'subject', 'mode')):
+        """
+            Summarizes the spans in the ring buffer per group; see summarize.
+        """
+        return summarize(self.records(), group_by)
+
+    def write_jsonl(self, path):
+        """
+            Writes every span in the ring buffer as one JSON object per line.
+
+            Args:
+                path (str): File to write.
+
+            Returns:
+                int: Number of spans written.
+        """
+        return write_jsonl(path, self.records())
+
+    def write_prometheus(self, path, name='turn_stage_seconds'):
+        """
+            Writes the summary of the ring buffer in the Prometheus text exposition format.
+
+            Args:
+                path (str): File to write.
+                name (str): Metric name.
+        """
+        write_prometheus(path, self.summary(), name)
@@ -0,0 +1,140 @@
+import hashlib
+import json
+import random
+import threading
+import time
+
+# Variants collected per prompt before cached replies are served, by mode. Modes not listed are never cached.
+DEFAULT_POLICIES = {
+    'Tutee': 5,
+    'Tutor': 5,
+    'Generate Conversation': 5,
+}
+
+
+class ResponseCache:
+    """
+        Persistent cache of assistant replies keyed by assistant and prompt history, stored in the Response_Cache
+        table.
+
+        For each prompt the cache first collects a number of distinct replies set by the mode's policy, so
+        openers keep some variety. Once enough variants are stored, a random one is served instead of starting a
+        run. The table is kept to max_entries rows by evicting the least recently used replies.
+
+        Attributes:
+            db (ConnectionManager): Pooled connections to the database.
+            max_entries (int): Maximum number of cached replies.
+            policies (dict): Variants to collect per prompt, by mode.
+            hits (int): Lookups answered from the cache.
+            misses (int): Lookups that had to run the assistant.
+    """
+
+    def __init__(self, db, max_entries=500, policies=None):
+        self.db = db
+        self.max_entries = max_entries
+        self.policies = dict(DEFAULT_POLICIES if policies is None else policies)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(assistant_id, history, run_options=None):
+        """
+            Content address of a prompt.
+
+            Args:
+                assistant_id (str): Assistant ID.
+                history (list): Message bodies sent so far, oldest first.
+                run_options (dict, optional): Model and instructions overrides of the run, so replies generated
+                    under other overrides are not served. Without overrides the key is the same as before.
+
+            Returns:
+                str: SHA-256 hex digest.
+        """
+        parts = [assistant_id, list(history)]
+        if run_options:
+            parts.append(run_options)
+        return hashlib.sha256(json.dumps(parts, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def lookup(self, assistant_id, history, mode, run_options=None):
+        """
+            Picks a cached reply for a prompt once its mode's quota of variants has been collected.
+
+            Args:
+                assistant_id (str): Assistant ID.
+                history (list): Message bodies sent so far, oldest first.
+                mode (str): Mode of the conversation.
+                run_options (dict, optional): Model and instructions overrides of the run.
+
+            Returns:
+                str or None: Cached reply, or None if the assistant has to run.
+        """
+        variants = self.policies.get(mode)
+        if not variants:
+            return None
+        conn = self.db.connection()
+        rows = conn.execute('''SELECT _id, reply FROM Response_Cache WHERE cache_key = ?''',
+                            (self.key(assistant_id, history, run_options),)).fetchall()
+        if len(rows) < variants:
+            self._count(False)
+            return None
+        row_id, reply = random.choice(rows)
+        with self.db.transaction() as conn:
+            conn.execute('''UPDATE Response_Cache SET last_used = ?, hits = hits + 1 WHERE _id = ?''',
+                         (time.time(), row_id))
+        self._count(True)
+        return reply
+
+    def add(self, assistant_id, history, mode, reply, run_options=None):
+        """
+            Stores a freshly generated reply if its prompt still needs variants, then evicts the least recently
+            used replies beyond max_entries.
+
+            Args:
+                assistant_id (str): Assistant ID.
+                history (list): Message bodies sent so far, oldest first.
+                mode (str): Mode of the conversation.
+                reply (str): Reply generated by the assistant.
+                run_options (dict, optional): Model and instructions overrides the reply was generated with.
+        """
+        variants = self.policies.get(mode)
+        if not variants:
+            return
+        cache_key = self.key(assistant_id, history, run_options)
+        now = time.time()
+        with self.db.transaction() as conn:
+            stored, last_variant = conn.execute(
+                '''SELECT COUNT(*), MAX(variant) FROM Response_Cache WHERE cache_key = ?''', (cache_key,)).fetchone()
+            if stored >= variants:
+                return
+            conn.execute('''INSERT INTO Response_Cache
+                            (cache_key, variant, assistant_id, mode, reply, created_at, last_used)
+                            VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                         (cache_key, 0 if last_variant is None else last_variant + 1, assistant_id, mode, reply,
+                          now, now))
+            conn.execute('''DELETE FROM Response_Cache WHERE _id IN (
+                                SELECT _id FROM Response_Cache ORDER BY last_used
+                                LIMIT MAX(0, (SELECT COUNT(*) FROM Response_Cache) - ?))''',
+                         (self.max_entries,))
+
+    def clear(self):
+        with self.db.transaction() as conn:
+            conn.execute('''DELETE FROM Response_Cache''')
+
+    def stats(self):
+        """
+            Returns the cache counters.
+
+            Returns:
+                dict: hits, misses and number of stored replies.
+        """
+        size = self.db.connection().execute('''SELECT COUNT(*) FROM Response_Cache''').fetchone()[0]
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": size}
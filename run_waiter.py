@@ -0,0 +1,298 @@
+import random
+import time
+
+TERMINAL_STATUSES = ('completed', 'failed', 'cancelled', 'expired', 'requires_action')
+
+
+class RunError(Exception):
+    """
+        Raised when an assistant run ends in any state other than 'completed'.
+
+        Attributes:
+            run (Run): Last observed run object.
+            stats (RunStats): Timing statistics for the run.
+    """
+
+    def __init__(self, run, stats, message=None):
+        self.run = run
+        self.stats = stats
+        if message is None:
+            message = f"Assistant run {getattr(run, 'id', '?')} ended with status '{stats.status}'"
+            last_error = getattr(run, 'last_error', None)
+            if last_error is not None:
+                message += f": {getattr(last_error, 'message', last_error)}"
+        super().__init__(message)
+
+
+class RunStats:
+    """
+        Timing statistics collected while waiting for a single run.
+
+        Attributes:
+            run_id (str): ID of the run.
+            waiter (str): Name of the waiter that produced the stats.
+            status (str): Final status of the run.
+            polls (int): Number of runs.retrieve calls (0 when streamed).
+            create_seconds (float): Time spent creating the run.
+            first_poll_seconds (float or None): Time from run creation until the first poll (or stream event)
+                returned a terminal status.
+            total_seconds (float): Time from run creation until the waiter returned.
+    """
+
+    __slots__ = ('run_id', 'waiter', 'status', 'polls', 'create_seconds', 'first_poll_seconds', 'total_seconds')
+
+    def __init__(self, waiter):
+        self.run_id = None
+        self.waiter = waiter
+        self.status = None
+        self.polls = 0
+        self.create_seconds = 0.0
+        self.first_poll_seconds = None
+        self.total_seconds = 0.0
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return (f"RunStats(run_id={self.run_id!r}, waiter={self.waiter!r}, status={self.status!r}, "
+                f"polls={self.polls}, create={self.create_seconds:.3f}s, "
+                f"first_poll={self.first_poll_seconds}, total={self.total_seconds:.3f}s)")
+
+
+class PollingRunWaiter:
+    """
+        Creates a run and polls it with exponential backoff and full jitter until it reaches a terminal state.
+
+        Attributes:
+            initial_delay (float): First delay between polls in seconds.
+            max_delay (float): Upper bound on the delay between polls.
+            multiplier (float): Backoff growth factor.
+            deadline (float): Total time allowed for the run before it is cancelled.
+    """
+
+    name = 'polling'
+
+    def __init__(self, initial_delay=0.1, max_delay=2.0, multiplier=1.6, deadline=120.0):
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.deadline = deadline
+
+    def wait(self, client, thread_id, assistant_id, on_delta=None, **run_options):
+        """
+            Creates a run on the thread and blocks until it finishes.
+
+            Args:
+                client (OpenAI): OpenAI client.
+                thread_id (str): Thread ID.
+                assistant_id (str): Assistant ID.
+                on_delta (callable or None): Ignored, polling cannot deliver partial text.
+                **run_options: Extra keyword arguments passed to runs.create.
+
+            Returns:
+                tuple: (Run, RunStats) for the completed run.
+
+            Raises:
+                RunError: If the run fails, is cancelled, expires, requires action or misses the deadline.
+        """
+        stats = RunStats(self.name)
+        started = time.monotonic()
+        run = client.beta.threads.runs.create(thread_id=thread_id, assistant_id=assistant_id, **run_options)
+        created = time.monotonic()
+        stats.run_id = run.id
+        stats.create_seconds = created - started
+
+        delay = self.initial_delay
+        while run.status not in TERMINAL_STATUSES:
+            remaining = self.deadline - (time.monotonic() - created)
+            if remaining <= 0:
+                _cancel_quietly(client, thread_id, run.id)
+                stats.status = 'deadline_exceeded'
+                stats.total_seconds = time.monotonic() - created
+                raise RunError(run, stats, f"Assistant run {run.id} did not finish within {self.deadline:g}s")
+            time.sleep(min(random.uniform(0, delay), remaining))
+            delay = min(delay * self.multiplier, self.max_delay)
+            run = client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run.id)
+            stats.polls += 1
+
+        return _finish(client, thread_id, run, stats, created)
+
+
+class StreamingRunWaiter:
+    """
+        Waits on a run by consuming its server-sent events, delivering text deltas as they arrive.
+        Falls back to another waiter when the installed openai package has no run streaming support.
+
+        Attributes:
+            fallback (PollingRunWaiter): Waiter used when streaming is unavailable.
+    """
+
+    name = 'streaming'
+
+    def __init__(self, fallback=None):
+        self.fallback = fallback or PollingRunWaiter()
+
+    @staticmethod
+    def supported(client):
+        """
+            Checks whether the client can stream runs.
+
+            Args:
+                client (OpenAI): OpenAI client.
+
+            Returns:
+                bool: True if runs.stream is available.
+        """
+        return hasattr(client.beta.threads.runs, 'stream')
+
+    def wait(self, client, thread_id, assistant_id, on_delta=None, **run_options):
+        """
+            Streams a run on the thread and blocks until it finishes.
+
+            Args:
+                client (OpenAI): OpenAI client.
+                thread_id (str): Thread ID.
+                assistant_id (str): Assistant ID.
+                on_delta (callable or None): Called with each text fragment as it arrives.
+                **run_options: Extra keyword arguments passed to runs.stream.
+
+            Returns:
+                tuple: (Run, RunStats) for the completed run.
+
+            Raises:
+                RunError: If the run fails, is cancelled, expires or requires action.
+        """
+        if not self.supported(client):
+            return self.fallback.wait(client, thread_id, assistant_id, on_delta, **run_options)
+
+        stats = RunStats(self.name)
+        started = time.monotonic()
+        with client.beta.threads.runs.stream(thread_id=thread_id, assistant_id=assistant_id,
+                                             **run_options) as stream:
+            stats.create_seconds = time.monotonic() - started
+            for delta in stream.text_deltas:
+                if stats.first_poll_seconds is None:
+                    stats.first_poll_seconds = time.monotonic() - started
+                if on_delta is not None:
+                    on_delta(delta)
+            run = stream.get_final_run()
+        stats.run_id = run.id
+        return _finish(client, thread_id, run, stats, started)
+
+
+def default_run_waiter():
+    """
+        Returns the waiter Backend uses unless another one is supplied.
+
+        Returns:
+            StreamingRunWaiter: Streaming waiter that falls back to polling.
+    """
+    return StreamingRunWaiter(PollingRunWaiter())
+
+
+def _finish(client, thread_id, run, stats, started):
+    stats.status = run.status
+    stats.total_seconds = time.monotonic() - started
+    if stats.first_poll_seconds is None:
+        stats.first_poll_seconds = stats.total_seconds
+    if run.status == 'requires_action':
+        # None of the assistants use tools, so a pending action would block the thread forever
+        _cancel_quietly(client, thread_id, run.id)
+    if run.status != 'completed':
+        raise RunError(run, stats)
+    return run, stats
+
+
+def _cancel_quietly(client, thread_id, run_id):
+    try:
+        client.beta.threads.runs.cancel(thread_id=thread_id, run_id=run_id)
+    except Exception:  # the run may already have reached a terminal state
+        pass
+
+
+class AsyncPollingRunWaiter(PollingRunWaiter):
+    """
+        PollingRunWaiter for AsyncOpenAI clients; sleeps with asyncio instead of blocking a thread.
+    """
+
+    async def wait(self, client, thread_id, assistant_id, on_delta=None, **run_options):
+        # Imported here: it is loaded anyway once an event loop runs, and the Tk app never starts one
+        import asyncio
+
+        stats = RunStats(self.name)
+        started = time.monotonic()
+        run = await client.beta.threads.runs.create(thread_id=thread_id, assistant_id=assistant_id, **run_options)
+        created = time.monotonic()
+        stats.run_id = run.id
+        stats.create_seconds = created - started
+
+        delay = self.initial_delay
+        while run.status not in TERMINAL_STATUSES:
+            remaining = self.deadline - (time.monotonic() - created)
+            if remaining <= 0:
+                await _cancel_quietly_async(client, thread_id, run.id)
+                stats.status = 'deadline_exceeded'
+                stats.total_seconds = time.monotonic() - created
+                raise RunError(run, stats, f"Assistant run {run.id} did not finish within {self.deadline:g}s")
+            await asyncio.sleep(min(random.uniform(0, delay), remaining))
+            delay = min(delay * self.multiplier, self.max_delay)
+            run = await client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run.id)
+            stats.polls += 1
+
+        return await _finish_async(client, thread_id, run, stats, created)
+
+
+class AsyncStreamingRunWaiter(StreamingRunWaiter):
+    """
+        StreamingRunWaiter for AsyncOpenAI clients.
+    """
+
+    def __init__(self, fallback=None):
+        super().__init__(fallback or AsyncPollingRunWaiter())
+
+    async def wait(self, client, thread_id, assistant_id, on_delta=None, **run_options):
+        if not self.supported(client):
+            return await self.fallback.wait(client, thread_id, assistant_id, on_delta, **run_options)
+
+        stats = RunStats(self.name)
+        started = time.monotonic()
+        async with client.beta.threads.runs.stream(thread_id=thread_id, assistant_id=assistant_id,
+                                                   **run_options) as stream:
+            stats.create_seconds = time.monotonic() - started
+            async for delta in stream.text_deltas:
+                if stats.first_poll_seconds is None:
+                    stats.first_poll_seconds = time.monotonic() - started
+                if on_delta is not None:
+                    on_delta(delta)
+            run = await stream.get_final_run()
+        stats.run_id = run.id
+        return await _finish_async(client, thread_id, run, stats, started)
+
+
+def default_async_run_waiter():
+    """
+        Returns the waiter AsyncBackend uses unless another one is supplied.
+
+        Returns:
+            AsyncStreamingRunWaiter: Streaming waiter that falls back to polling.
+    """
+    return AsyncStreamingRunWaiter(AsyncPollingRunWaiter())
+
+
+async def _finish_async(client, thread_id, run, stats, started):
+    stats.status = run.status
+    stats.total_seconds = time.monotonic() - started
+    if stats.first_poll_seconds is None:
+        stats.first_poll_seconds = stats.total_seconds
+    if run.status == 'requires_action':
+        await _cancel_quietly_async(client, thread_id, run.id)
+    if run.status != 'completed':
+        raise RunError(run, stats)
+    return run, stats
+
+
+async def _cancel_quietly_async(client, thread_id, run_id):
+    try:
+        await client.beta.threads.runs.cancel(thread_id=thread_id, run_id=run_id)
+    except Exception:  # the run may already have reached a terminal state
+        pass
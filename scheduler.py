@@ -0,0 +1,384 @@
+import contextlib
+import contextvars
+import heapq
+import itertools
+import logging
+import os
+import random
+import threading
+import time
+from functools import lru_cache
+
+INTERACTIVE = 0
+BATCH = 10
+
+logger = logging.getLogger(__name__)
+
+_priority = contextvars.ContextVar('request_priority', default=INTERACTIVE)
+
+
+@contextlib.contextmanager
+def priority(level):
+    """
+        Runs the enclosed OpenAI calls at the given priority. Lower numbers are admitted first, so INTERACTIVE
+        turns overtake queued BATCH generation.
+
+        Args:
+            level (int): Priority, e.g. INTERACTIVE or BATCH.
+    """
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority():
+    return _priority.get()
+
+
+@lru_cache(maxsize=None)
+def retryable_errors():
+    """
+        Errors worth retrying: 429s, 5xx responses, timeouts and dropped connections. openai is imported here
+        rather than at module level, so loading the scheduler does not pull it in before the first request.
+
+        Returns:
+            tuple: Exception classes.
+    """
+    import openai
+    return (openai.RateLimitError, openai.APIConnectionError, openai.APITimeoutError, openai.InternalServerError)
+
+
+def __getattr__(name):
+    # Keeps `from scheduler import RETRYABLE_ERRORS` working without importing openai up front
+    if name == 'RETRYABLE_ERRORS':
+        return retryable_errors()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def retry_after(error):
+    """
+        Reads the delay the API asked for in a Retry-After header.
+
+        Args:
+            error (Exception): Error raised by the OpenAI client.
+
+        Returns:
+            float or None: Seconds to wait, or None if the error carries no usable header.
+    """
+    response = getattr(error, 'response', None)
+    value = response.headers.get('retry-after') if response is not None else None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+        Token bucket refilled continuously at a fixed rate per minute. Not thread-safe on its own; the scheduler
+        only touches it under its lock.
+
+        Attributes:
+            rate (float): Tokens added per second.
+            capacity (float): Maximum number of tokens held, i.e. the largest burst.
+            tokens (float): Tokens currently available.
+    """
+
+    def __init__(self, per_minute, capacity=None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay(self, amount, now):
+        """
+            Returns how long to wait until `amount` tokens are available. Requests larger than the capacity
+            only wait for a full bucket.
+        """
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.tokens
+        return max(0.0, missing / self.rate)
+
+    def take(self, amount, now):
+        self._refill(now)
+        self.tokens -= amount
+
+
+class RetryBudget:
+    """
+        Caps retries at a fraction of recent traffic so an outage does not multiply the load on the API.
+
+        Every first attempt deposits `ratio` of a retry; every retry withdraws one. A small reserve refilled
+        over time lets an idle application still retry its first failures.
+
+        Attributes:
+            ratio (float): Retries earned per request.
+            max_balance (float): Most retries that can be saved up.
+            balance (float): Retries currently available.
+    """
+
+    def __init__(self, ratio=0.2, reserve_per_minute=10, max_balance=100):
+        self.ratio = ratio
+        self.max_balance = max_balance
+        self.balance = 0.0
+        self._reserve = TokenBucket(reserve_per_minute)
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self.balance = min(self.balance + self.ratio, self.max_balance)
+
+    def withdraw(self):
+        """
+            Takes one retry from the budget.
+
+            Returns:
+                bool: False when the budget is exhausted and the error should be raised instead.
+        """
+        with self._lock:
+            if self.balance >= 1:
+                self.balance -= 1
+                return True
+            now = time.monotonic()
+            if self._reserve.delay(1, now) == 0:
+                self._reserve.take(1, now)
+                return True
+            return False
+
+
+class RequestScheduler:
+    """
+        Admits every OpenAI request through one gate that enforces requests-per-minute and tokens-per-minute
+        buckets, a concurrency cap and priorities, and retries 429/5xx/connection errors with jittered
+        backoff drawn from a shared retry budget.
+
+        Waiting requests are admitted strictly in (priority, arrival) order. A 429 with Retry-After pauses
+        admission for everyone, since the limit it reports is shared by the whole API key.
+
+        Attributes:
+            requests (TokenBucket or None): Requests-per-minute bucket.
+            tokens (TokenBucket or None): Tokens-per-minute bucket.
+            max_concurrency (int): Maximum number of requests in flight.
+            max_attempts (int): Attempts per request, including the first.
+            retry_budget (RetryBudget): Shared retry allowance.
+            retries (int): Retries performed so far.
+            throttled_seconds (float): Total time requests spent waiting for admission.
+    """
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None, max_concurrency=8, max_attempts=4,
+                 base_delay=0.5, max_delay=30.0, retry_budget=None):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_concurrency = max_concurrency
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_budget = retry_budget or RetryBudget()
+        self.retries = 0
+        self.throttled_seconds = 0.0
+        self._active = 0
+        self._paused_until = 0.0
+        self._waiting = []  # heap of (priority, sequence)
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+
+    def _admission_delay(self, tokens, now):
+        delay = self._paused_until - now
+        if self.requests is not None:
+            delay = max(delay, self.requests.delay(1, now))
+        if self.tokens is not None and tokens:
+            delay = max(delay, self.tokens.delay(tokens, now))
+        return delay
+
+    def _acquire(self, tokens):
+        started = time.monotonic()
+        with self._condition:
+            ticket = (current_priority(), next(self._sequence))
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    if self._waiting[0] == ticket and self._active < self.max_concurrency:
+                        now = time.monotonic()
+                        delay = self._admission_delay(tokens, now)
+                        if delay <= 0:
+                            break
+                        self._condition.wait(delay)
+                    else:
+                        self._condition.wait()
+            except BaseException:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._condition.notify_all()
+                raise
+            heapq.heappop(self._waiting)
+            self._active += 1
+            if self.requests is not None:
+                self.requests.take(1, now)
+            if self.tokens is not None and tokens:
+                self.tokens.take(tokens, now)
+            self.throttled_seconds += now - started
+            # The next waiter may be admissible too
+            self._condition.notify_all()
+
+    def _release(self):
+        with self._condition:
+            self._active -= 1
+            self._condition.notify_all()
+
+    def _pause(self, seconds):
+        with self._condition:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def _backoff(self, attempt):
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def call(self, func, *args, estimated_tokens=0, **kwargs):
+        """
+            Calls func(*args, **kwargs) once admitted, retrying retryable errors.
+
+            Args:
+                func (callable): Function performing one API request.
+                estimated_tokens (int): Tokens charged to the tokens-per-minute bucket.
+
+            Returns:
+                Result of func.
+        """
+        attempt = 1
+        while True:
+            self._acquire(estimated_tokens)
+            try:
+                result = func(*args, **kwargs)
+            except retryable_errors() as e:
+                if attempt >= self.max_attempts or not self.retry_budget.withdraw():
+                    raise
+                delay = retry_after(e)
+                if delay is not None:
+                    self._pause(delay)
+                else:
+                    delay = self._backoff(attempt)
+                logger.warning("Retrying OpenAI request in %.1fs after %s: %s", delay, type(e).__name__, e)
+                with self._condition:
+                    self.retries += 1
+            else:
+                if attempt == 1:
+                    self.retry_budget.deposit()
+                return result
+            finally:
+                self._release()
+            time.sleep(delay)
+            attempt += 1
+
+    def stats(self):
+        """
+            Returns the scheduler counters.
+
+            Returns:
+                dict: retries, throttled_seconds, active and waiting requests.
+        """
+        with self._condition:
+            return {"retries": self.retries, "throttled_seconds": self.throttled_seconds,
+                    "active": self._active, "waiting": len(self._waiting)}
+
+
+def default_scheduler():
+    """
+        Builds a scheduler from OPENAI_REQUESTS_PER_MINUTE, OPENAI_TOKENS_PER_MINUTE and OPENAI_MAX_CONCURRENCY.
+        Unset limits are not enforced.
+
+        Returns:
+            RequestScheduler: Scheduler for the application's client.
+    """
+    def limit(name):
+        value = os.getenv(name)
+        return int(value) if value else None
+
+    return RequestScheduler(requests_per_minute=limit("OPENAI_REQUESTS_PER_MINUTE"),
+                            tokens_per_minute=limit("OPENAI_TOKENS_PER_MINUTE"),
+                            max_concurrency=limit("OPENAI_MAX_CONCURRENCY") or 8)
+
+
+def estimate_tokens(path, kwargs, run_tokens=1000):
+    """
+        Rough token cost of a request for the tokens-per-minute bucket: four characters per token of message
+        content, and a flat allowance for runs, which is where the model actually consumes tokens.
+
+        Args:
+            path (str): Dotted resource path of the call, e.g. 'beta.threads.runs.create'.
+            kwargs (dict): Keyword arguments of the call.
+            run_tokens (int): Allowance charged for creating or streaming a run.
+
+        Returns:
+            int: Estimated tokens.
+    """
+    if path.startswith('beta.threads.runs.') and path.rsplit('.', 1)[1] in ('create', 'stream'):
+        return run_tokens
+    content = kwargs.get('content')
+    return len(content) // 4 if isinstance(content, str) else 0
+
+
+class ScheduledClient:
+    """
+        Wraps an OpenAI client so every call under client.beta goes through a RequestScheduler. Anything
+        else is passed straight through to the wrapped client.
+
+        Attributes:
+            client (OpenAI): Wrapped client.
+            scheduler (RequestScheduler): Scheduler admitting the calls.
+    """
+
+    def __init__(self, client, scheduler):
+        self.client = client
+        self.scheduler = scheduler
+        self.beta = _ScheduledResource(client.beta, scheduler, 'beta')
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+
+class _ScheduledResource:
+    def __init__(self, resource, scheduler, path):
+        self._resource = resource
+        self._scheduler = scheduler
+        self._path = path
+
+    def __getattr__(self, name):
+        attribute = getattr(self._resource, name)
+        path = f"{self._path}.{name}"
+        if not callable(attribute):
+            return _ScheduledResource(attribute, self._scheduler, path)
+        if name == 'stream':
+            return lambda *args, **kwargs: _ScheduledStream(self._scheduler, attribute, args, kwargs, path)
+
+        def scheduled(*args, **kwargs):
+            return self._scheduler.call(attribute, *args, estimated_tokens=estimate_tokens(path, kwargs),
+                                        **kwargs)
+        return scheduled
+
+
+class _ScheduledStream:
+    # Stream managers only send the request on __enter__, so that is the part admitted and retried
+    def __init__(self, scheduler, open_stream, args, kwargs, path):
+        self._scheduler = scheduler
+        self._open_stream = open_stream
+        self._args = args
+        self._kwargs = kwargs
+        self._path = path
+        self._manager = None
+
+    def _enter(self):
+        manager = self._open_stream(*self._args, **self._kwargs)
+        stream = manager.__enter__()
+        self._manager = manager
+        return stream
+
+    def __enter__(self):
+        return self._scheduler.call(self._enter, estimated_tokens=estimate_tokens(self._path, self._kwargs))
+
+    def __exit__(self, *exc_info):
+        return self._manager.__exit__(*exc_info)
@@ -0,0 +1,27 @@
+class Session:
+    """
+        State of one tutoring conversation, passed explicitly to backend calls instead of living on the backend.
+
+        Attributes:
+            username (str): Username.
+            subject (str): Subject.
+            mode (str): Mode ('Tutee', 'Tutor', 'Generate Conversation').
+            user_id (int or None): User ID, set once the username is registered.
+            conversation_name (str or None): Name of the current conversation, assigned when it is first stored.
+            thread_id (str or None): OpenAI thread of the current conversation, set after the first turn.
+    """
+
+    __slots__ = ('username', 'subject', 'mode', 'user_id', 'conversation_name', 'thread_id')
+
+    def __init__(self, username, subject, mode, user_id=None, conversation_name=None, thread_id=None):
+        self.username = username
+        self.subject = subject
+        self.mode = mode
+        self.user_id = user_id
+        self.conversation_name = conversation_name
+        self.thread_id = thread_id
+
+    def __repr__(self):
+        return (f"Session(username={self.username!r}, subject={self.subject!r}, mode={self.mode!r}, "
+                f"user_id={self.user_id!r}, conversation_name={self.conversation_name!r}, "
+                f"thread_id={self.thread_id!r})")
@@ -0,0 +1,52 @@
+import os
+import pytest
+
+pytest.importorskip('dotenv')
+
+from assistants import AssistantRegistry  # noqa: E402
+from backend import Backend, transcript_paragraphs  # noqa: E402
+from fake_openai import FakeOpenAI  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def backend(tmp_path, monkeypatch):
+    monkeypatch.setenv('SQLITE_DB_PATH', str(tmp_path / 'backend.db'))
+    monkeypatch.setenv('STREAM_THREADS', '2')
+    backend = Backend(client=FakeOpenAI(run_seconds=0.01, seed=0),
+                      registry=AssistantRegistry(os.path.join(ROOT, 'assistants.json'), reload_interval=None))
+    backend.thread_pool.size = 0
+    yield backend
+    backend.close()
+
+
+def test_streamed_turns_reuse_database_connections(backend):
+    session = backend.start_session('ann', 'Math', 'Tutee')
+    for turn in range(30):
+        assert ''.join(backend.generate_response_stream(session, f'turn {turn}'))
+    # The calling thread plus at most one connection per stream thread
+    assert len(backend.db._connections) <= 3
+    assert len(backend.store.conversation(session.user_id, session.conversation_name)['messages']) == 60
+
+
+def test_turn_metrics_are_persisted(backend):
+    session = backend.start_session('ann', 'Math', 'Tutee')
+    backend.generate_response(session, 'hello')
+    stages = {record.stage for record in backend.load_metrics() if record.labels.get('subject') == 'Math'}
+    assert {'turn', 'message_create', 'run_wait', 'sqlite_write'} <= stages
+
+
+def test_bulk_and_single_export_render_the_same_transcript(backend):
+    store = backend.store
+    user_id = store.get_or_create_user_id('erin')
+    conversation_id, name = store.append_messages(
+        'thread_e', [('user', 'one', 100, 'msg_1'), ('assistant', 'two', 100, 'msg_2'),
+                     ('user', 'three', 100, 'msg_3'), ('assistant', 'four', 100, 'msg_4')],
+        user_id, 'erin', 'Math', 'Tutee')
+    # What bulk_export and Backend.export_conversation hand to render_export
+    [bulk] = store.iter_conversations(username='erin')
+    single = list(transcript_paragraphs(store.conversation(user_id, name, with_messages=False),
+                                        store.iter_messages(conversation_id)))
+    assert list(transcript_paragraphs(bulk)) == single
+    assert [text for _, text in single] == ['one', 'two', 'three', 'four']
@@ -0,0 +1,22 @@
+import os
+import pytest
+
+pytest.importorskip('dotenv')
+pytest.importorskip('openai')
+
+import batch  # noqa: E402
+from database import ConnectionManager, ConversationStore  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_fake_batch_stores_transcripts_offline(tmp_path, monkeypatch):
+    path = str(tmp_path / 'batch.db')
+    monkeypatch.setenv('SQLITE_DB_PATH', path)
+    monkeypatch.setenv('ASSISTANTS_FILE', os.path.join(ROOT, 'assistants.json'))
+    assert batch.main(['Math', 'Biology', '--count', '2', '--fake']) == 0
+    db = ConnectionManager(path)
+    transcripts = list(ConversationStore(db).iter_conversations(username='Batch Generator'))
+    db.close_all()
+    assert sorted(transcript['subject'] for transcript in transcripts) == ['Biology', 'Biology', 'Math', 'Math']
+    assert all(len(transcript['messages']) == 2 for transcript in transcripts)
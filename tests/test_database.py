@@ -0,0 +1,95 @@
+import json
+import sqlite3
+import pytest
+from database import (SCHEMA_VERSION, ConnectionManager, ConversationStore, check_query_plans,
+                      create_base_tables)
+
+
+def blob(*messages):
+    return json.dumps([{'content': content, 'timestamp': timestamp} for content, timestamp in messages])
+
+
+@pytest.fixture
+def baseline_path(tmp_path):
+    # A database as the original application left it: JSON message blobs and a username registered twice
+    path = str(tmp_path / 'baseline.db')
+    conn = sqlite3.connect(path)
+    create_base_tables(conn.cursor())
+    conn.executemany('''INSERT INTO User_ID (user_id, username) VALUES (?, ?)''',
+                     [(101, 'alice'), (102, 'alice'), (103, 'bob')])
+    conn.executemany('''INSERT INTO Conversations (thread_id, user_id, username, subject, mode, conversation_name,
+                                                   user_messages, assistant_messages)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+                     [('thread_a', 101, 'alice', 'Math', 'Tutee', 'Math Tutee Conversation 1',
+                       blob(('hi', 10), ('and then?', 30)), blob(('hello', 20), ('done', 40))),
+                      ('thread_b', 102, 'alice', 'Math', 'Tutor', 'Math Tutor Conversation 1',
+                       blob(('start', 50)), blob(('ok', 60))),
+                      ('thread_c', 103, 'bob', 'Biology', 'Generate Conversation',
+                       'Biology Generated Conversation 1', None, blob(('generated', 70)))])
+    conn.commit()
+    conn.close()
+    return path
+
+
+@pytest.fixture
+def store(baseline_path):
+    db = ConnectionManager(baseline_path)
+    store = ConversationStore(db)
+    store.initialize()
+    yield store
+    db.close_all()
+
+
+def test_migration_reaches_current_version(store):
+    assert store.db.connection().execute('''PRAGMA user_version''').fetchone()[0] == SCHEMA_VERSION
+
+
+def test_hot_queries_use_indexes(store):
+    assert check_query_plans(store.db.connection()) == []
+
+
+def test_blob_messages_move_to_messages_table(store):
+    conversation_id = store.db.connection().execute(
+        '''SELECT _id FROM Conversations WHERE thread_id = ?''', ('thread_a',)).fetchone()[0]
+    assert [(message['role'], message['content']) for message in store.messages(conversation_id)] == [
+        ('user', 'hi'), ('assistant', 'hello'), ('user', 'and then?'), ('assistant', 'done')]
+    assert store.db.connection().execute(
+        '''SELECT COUNT(*) FROM Conversations WHERE user_messages IS NOT NULL
+           OR assistant_messages IS NOT NULL''').fetchone()[0] == 0
+
+
+def test_duplicate_usernames_are_merged(store):
+    assert store.get_user_id('alice') == 101
+    assert store.conversations_by_mode(101) == {'Tutee': ['Math Tutee Conversation 1'],
+                                                'Tutor': ['Math Tutor Conversation 1']}
+    with pytest.raises(sqlite3.IntegrityError):
+        with store.db.transaction() as conn:
+            conn.execute('''INSERT INTO User_ID (user_id, username) VALUES (104, 'bob')''')
+
+
+def test_new_user_id_when_three_digit_ids_are_taken(store):
+    with store.db.transaction() as conn:
+        conn.executemany('''INSERT OR IGNORE INTO User_ID (user_id, username) VALUES (?, ?)''',
+                         [(user_id, f'user{user_id}') for user_id in range(100, 1000)])
+    assert store.get_or_create_user_id('carol') == 1000
+    assert store.get_or_create_user_id('dave') == 1001
+    assert store.get_or_create_user_id('carol') == 1000
+
+
+def test_conversation_keeps_stored_order_within_a_second(store):
+    user_id = store.get_or_create_user_id('erin')
+    store.append_messages('thread_e', [('user', 'one', 100, 'msg_1'), ('assistant', 'two', 100, 'msg_2'),
+                                       ('user', 'three', 100, 'msg_3'), ('assistant', 'four', 100, 'msg_4')],
+                          user_id, 'erin', 'Math', 'Tutee', 'Math Tutee Conversation 1')
+    conversation = store.conversation(user_id, 'Math Tutee Conversation 1')
+    assert [message['content'] for message in conversation['messages']] == ['one', 'two', 'three', 'four']
+    assert [message['content'] for message in conversation['user_messages']] == ['one', 'three']
+
+
+def test_bulk_iteration_keeps_stored_order_within_a_second(store):
+    user_id = store.get_or_create_user_id('erin')
+    store.append_messages('thread_e', [('user', 'one', 100, 'msg_1'), ('assistant', 'two', 100, 'msg_2'),
+                                       ('user', 'three', 100, 'msg_3'), ('assistant', 'four', 100, 'msg_4')],
+                          user_id, 'erin', 'Math', 'Tutee', 'Math Tutee Conversation 1')
+    [bulk] = store.iter_conversations(username='erin')
+    assert bulk['messages'] == store.conversation(user_id, 'Math Tutee Conversation 1')['messages']
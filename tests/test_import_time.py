@@ -0,0 +1,24 @@
+import importlib.util
+import os
+import re
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The check lives with the benchmarks so it can also be run by hand; load it from there
+_spec = importlib.util.spec_from_file_location('bench_import_time',
+                                               os.path.join(ROOT, 'benchmarks', 'bench_import_time.py'))
+bench_import_time = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(bench_import_time)
+
+
+@pytest.mark.parametrize('module', ['backend', 'gui'])
+def test_startup_leaves_heavy_libraries_unloaded(module):
+    try:
+        problems = bench_import_time.check(module, None, 0, bench_import_time.LAZY_LIBRARIES)
+    except RuntimeError as e:
+        missing = re.search(r"No module named '([^'.]+)", str(e))
+        if missing is None or missing.group(1) in bench_import_time.LAZY_LIBRARIES:
+            raise
+        pytest.skip(f"{module} needs {missing.group(1)}, which is not installed")
+    assert problems == []
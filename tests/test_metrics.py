@@ -0,0 +1,43 @@
+import time
+from metrics import Metrics, percentile, read_jsonl, summarize
+
+
+def test_percentile_is_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 0.5) == 50
+    assert percentile(values, 0.95) == 95
+    assert percentile([7], 0.99) == 7
+
+
+def test_flushed_spans_are_read_back_across_processes(tmp_path):
+    # Two Metrics writing to one directory stand in for two stations sharing it
+    first, second = Metrics(directory=str(tmp_path)), Metrics(directory=str(tmp_path))
+    second.path = lambda: str(tmp_path / 'other-station.jsonl')
+    first.record('run_wait', 1.0, {'subject': 'Math', 'mode': 'Tutee'})
+    first.record('run_wait', 3.0, {'subject': 'Math', 'mode': 'Tutee'}, ok=False)
+    second.record('run_wait', 2.0, {'subject': 'Math', 'mode': 'Tutee'})
+    assert first.flush() == 2
+    assert second.flush() == 1
+    assert first.flush() == 0
+
+    rows = summarize(read_jsonl(str(tmp_path)))
+    assert [(row['stage'], row['subject'], row['mode'], row['count'], row['errors'], row['p50'], row['max'])
+            for row in rows] == [('run_wait', 'Math', 'Tutee', 3, 1, 2.0, 3.0)]
+
+
+def test_read_skips_old_spans_and_partial_lines(tmp_path):
+    metrics = Metrics(directory=str(tmp_path))
+    metrics.record('turn', 1.0)
+    metrics.flush()
+    with open(metrics.path(), 'a', encoding='utf-8') as f:
+        f.write('{"time": 1, "stage": "turn", "seconds": 5.0, "ok": true}\n{"time": ')
+    assert [record.seconds for record in read_jsonl(str(tmp_path))] == [1.0, 5.0]
+    assert [record.seconds for record in read_jsonl(str(tmp_path), since=time.time() - 60)] == [1.0]
+
+
+def test_memory_only_metrics_do_not_queue_spans():
+    metrics = Metrics(capacity=2)
+    for seconds in (1.0, 2.0, 3.0):
+        metrics.record('turn', seconds)
+    assert metrics.flush() == 0
+    assert [record.seconds for record in metrics.records()] == [2.0, 3.0]
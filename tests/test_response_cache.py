@@ -0,0 +1,49 @@
+from types import SimpleNamespace
+import pytest
+from database import ConnectionManager, ConversationStore
+from response_cache import ResponseCache
+
+HISTORY = ['Hello, what are we studying today?']
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = ConnectionManager(str(tmp_path / 'cache.db'))
+    ConversationStore(db).initialize()
+    yield db
+    db.close_all()
+
+
+def test_replies_are_served_once_enough_variants_are_collected(db):
+    cache = ResponseCache(db, policies={'Tutee': 2})
+    assert cache.lookup('asst_a', HISTORY, 'Tutee') is None
+    cache.add('asst_a', HISTORY, 'Tutee', 'first')
+    assert cache.lookup('asst_a', HISTORY, 'Tutee') is None
+    cache.add('asst_a', HISTORY, 'Tutee', 'second')
+    cache.add('asst_a', HISTORY, 'Tutee', 'third')
+    assert cache.lookup('asst_a', HISTORY, 'Tutee') in ('first', 'second')
+    assert cache.stats() == {'hits': 1, 'misses': 2, 'size': 2}
+
+
+def test_replies_are_not_shared_across_assistants_overrides_or_uncached_modes(db):
+    cache = ResponseCache(db, policies={'Tutee': 1})
+    cache.add('asst_a', HISTORY, 'Tutee', 'default model')
+    cache.add('asst_a', HISTORY, 'Tutor', 'never stored')
+    assert cache.lookup('asst_a', HISTORY, 'Tutee') == 'default model'
+    assert cache.lookup('asst_b', HISTORY, 'Tutee') is None
+    assert cache.lookup('asst_a', HISTORY, 'Tutee', {'model': 'gpt-4o-mini'}) is None
+    assert cache.lookup('asst_a', HISTORY, 'Tutor') is None
+    assert cache.stats()['size'] == 1
+
+
+def test_least_recently_used_replies_are_evicted(db, monkeypatch):
+    clock = iter(range(100))
+    monkeypatch.setattr('response_cache.time', SimpleNamespace(time=lambda: next(clock)))
+    cache = ResponseCache(db, max_entries=2, policies={'Tutee': 1})
+    for prompt in ('one', 'two'):
+        cache.add('asst_a', [prompt], 'Tutee', prompt)
+    assert cache.lookup('asst_a', ['one'], 'Tutee') == 'one'
+    cache.add('asst_a', ['three'], 'Tutee', 'three')
+    assert cache.lookup('asst_a', ['two'], 'Tutee') is None
+    assert cache.lookup('asst_a', ['one'], 'Tutee') == 'one'
+    assert cache.lookup('asst_a', ['three'], 'Tutee') == 'three'
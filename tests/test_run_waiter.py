@@ -0,0 +1,49 @@
+import pytest
+from fake_openai import FakeOpenAI
+from run_waiter import PollingRunWaiter, RunError, StreamingRunWaiter
+
+
+def waiter(stream):
+    return StreamingRunWaiter(PollingRunWaiter(initial_delay=0.01)) if stream else PollingRunWaiter(initial_delay=0.01)
+
+
+def new_thread(client):
+    return client.beta.threads.create(messages=[{'role': 'user', 'content': 'Hello'}]).id
+
+
+@pytest.mark.parametrize('stream', [False, True])
+def test_completed_run_returns_stats(stream):
+    client = FakeOpenAI(run_seconds=0.01, stream=stream, seed=0)
+    run, stats = waiter(stream).wait(client, new_thread(client), 'asst_test')
+    assert run.status == stats.status == 'completed'
+    assert stats.waiter == ('streaming' if stream else 'polling')
+
+
+@pytest.mark.parametrize('stream', [False, True])
+def test_failed_run_raises(stream):
+    client = FakeOpenAI(run_seconds=0.01, run_failure_rate=1.0, stream=stream, seed=0)
+    with pytest.raises(RunError, match='Injected run failure') as error:
+        waiter(stream).wait(client, new_thread(client), 'asst_test')
+    assert error.value.stats.status == 'failed'
+
+
+@pytest.mark.parametrize('stream', [False, True])
+@pytest.mark.parametrize('status', ['expired', 'cancelled'])
+def test_run_ending_without_completing_raises(monkeypatch, stream, status):
+    client = FakeOpenAI(run_seconds=0.01, stream=stream, seed=0)
+
+    def finish(run):
+        run.status = status
+    monkeypatch.setattr(client, '_finish_run', finish)
+    with pytest.raises(RunError, match=status) as error:
+        waiter(stream).wait(client, new_thread(client), 'asst_test')
+    assert error.value.run.status == error.value.stats.status == status
+
+
+def test_polling_deadline_cancels_the_run():
+    client = FakeOpenAI(run_seconds=5.0, stream=False, seed=0)
+    with pytest.raises(RunError, match='did not finish within') as error:
+        PollingRunWaiter(initial_delay=0.01, deadline=0.05).wait(client, new_thread(client), 'asst_test')
+    assert error.value.stats.status == 'deadline_exceeded'
+    assert client._runs[error.value.run.id].status == 'cancelled'
+    assert client.calls['threads.runs.cancel'] == 1
@@ -0,0 +1,58 @@
+import time
+import pytest
+from fake_openai import api_error
+from scheduler import RequestScheduler, RetryBudget
+
+# api_error builds the real client's exceptions
+pytest.importorskip('openai')
+pytest.importorskip('httpx')
+
+
+def failing(errors):
+    # Raises the given errors one per call, then returns 'ok'
+    calls = []
+
+    def call():
+        calls.append(time.monotonic())
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return 'ok'
+    return call, calls
+
+
+def test_rate_limit_waits_for_retry_after():
+    scheduler = RequestScheduler(base_delay=0.0)
+    call, calls = failing([api_error(429, "Slow down", retry_after=0.2)])
+    assert scheduler.call(call) == 'ok'
+    assert len(calls) == 2
+    assert calls[1] - calls[0] >= 0.2
+    assert scheduler.stats()['retries'] == 1
+
+    # The pause applies to every request, since the limit is shared by the whole API key
+    scheduler._pause(0.2)
+    started = time.monotonic()
+    assert scheduler.call(lambda: 'other') == 'other'
+    assert time.monotonic() - started >= 0.19
+
+
+def test_exhausted_retry_budget_raises_instead_of_retrying():
+    import openai
+
+    budget = RetryBudget(ratio=0.0, reserve_per_minute=1)
+    scheduler = RequestScheduler(base_delay=0.0, max_attempts=10, retry_budget=budget)
+    call, calls = failing([api_error(500, "Unavailable")] * 10)
+    with pytest.raises(openai.InternalServerError):
+        scheduler.call(call)
+    # The reserve held a single retry
+    assert len(calls) == 2
+    assert scheduler.stats()['retries'] == 1
+
+
+def test_non_retryable_errors_are_raised_at_once():
+    import openai
+
+    scheduler = RequestScheduler(base_delay=0.0)
+    call, calls = failing([api_error(400, "Bad request")])
+    with pytest.raises(openai.BadRequestError):
+        scheduler.call(call)
+    assert len(calls) == 1
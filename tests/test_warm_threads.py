@@ -0,0 +1,65 @@
+import time
+from fake_openai import FakeOpenAI
+from warm_threads import WarmThread, WarmThreadPool
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def new_pool(client, **kwargs):
+    return WarmThreadPool(lambda subject, mode: WarmThread(client.beta.threads.create().id),
+                          lambda warm_thread: client.beta.threads.delete(warm_thread.thread_id), **kwargs)
+
+
+def ready(pool, key=('Math', 'Tutee')):
+    return pool.stats()['ready'].get(key, 0)
+
+
+def test_claim_hands_out_a_primed_thread_and_replaces_it():
+    client = FakeOpenAI(seed=0)
+    pool = new_pool(client, size=2)
+    assert pool.claim('Math', 'Tutee') is None
+    wait_for(lambda: ready(pool) == 1 and not pool.stats()['pending'])
+    warm_thread = pool.claim('Math', 'Tutee')
+    assert warm_thread.thread_id in client._threads
+    assert (pool.hits, pool.misses) == (1, 1)
+    pool.close()
+    # Threads still waiting in the pool are deleted; the claimed one now belongs to a conversation
+    assert list(client._threads) == [warm_thread.thread_id]
+
+
+def test_pool_grows_with_demand_up_to_size():
+    client = FakeOpenAI(seed=0)
+    pool = new_pool(client, size=3)
+    pool.prime('Math', 'Tutee')
+    pool.prime('Biology', 'Tutor')
+    wait_for(lambda: not pool.stats()['pending'])
+    # Primed but never claimed: one thread each
+    assert pool.stats()['ready'] == {('Math', 'Tutee'): 1, ('Biology', 'Tutor'): 1}
+    for _ in range(4):
+        pool.claim('Math', 'Tutee')
+        wait_for(lambda: not pool.stats()['pending'])
+    assert ready(pool) == 3
+    assert ready(pool, ('Biology', 'Tutor')) == 1
+    pool.close()
+
+
+def test_expired_threads_of_every_key_are_discarded():
+    client = FakeOpenAI(seed=0)
+    pool = new_pool(client, ttl=0.05)
+    pool.prime('Math', 'Tutee')
+    wait_for(lambda: ready(pool) == 1)
+    [stale] = client._threads
+    time.sleep(0.06)
+    # Priming another key sweeps the expired Math thread too
+    pool.prime('Biology', 'Tutor')
+    wait_for(lambda: stale not in client._threads)
+    assert ready(pool) == 0
+    wait_for(lambda: ready(pool, ('Biology', 'Tutor')) == 1)
+    fresh = pool.claim('Biology', 'Tutor')
+    assert fresh is not None and fresh.thread_id != stale
+    pool.close()
@@ -0,0 +1,75 @@
+import queue
+import threading
+import time
+from worker import BackendWorker
+
+
+class MainLoop:
+    # Stands in for Tk: dispatched callbacks wait until the test runs them
+    def __init__(self):
+        self.pending = queue.Queue()
+
+    def dispatch(self, func, *args):
+        self.pending.put((func, args))
+
+    def run_pending(self):
+        while not self.pending.empty():
+            func, args = self.pending.get()
+            func(*args)
+
+
+def wait_until_idle(worker, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while worker.busy and time.monotonic() < deadline:
+        time.sleep(0.005)
+
+
+def test_cancel_drops_a_result_waiting_for_the_main_loop():
+    loop = MainLoop()
+    worker = BackendWorker(loop.dispatch)
+    delivered = []
+    task = worker.submit(lambda: 'stale', key='turn', on_success=delivered.append)
+    task.future.result(timeout=2.0)
+    worker.cancel('turn')
+    wait_until_idle(worker)
+    loop.run_pending()
+    assert delivered == []
+    worker.shutdown()
+
+
+def test_cancel_drops_the_running_task_and_skips_queued_ones():
+    loop = MainLoop()
+    worker = BackendWorker(loop.dispatch)
+    started, release = threading.Event(), threading.Event()
+    delivered, ran = [], []
+
+    def slow():
+        started.set()
+        release.wait(2.0)
+        return 'stale'
+
+    running = worker.submit(slow, key='turn', on_success=delivered.append)
+    queued = worker.submit(ran.append, 'queued', key='turn')
+    worker.submit(lambda: 'fresh', key='search', on_success=delivered.append)
+    started.wait(2.0)
+    worker.cancel('turn')
+    release.set()
+    assert running.future.result(timeout=2.0) == 'stale'
+    assert queued.future.cancelled()
+    wait_until_idle(worker)
+    loop.run_pending()
+    assert delivered == ['fresh']
+    assert ran == []
+    assert not worker.busy
+    worker.shutdown()
+
+
+def test_tasks_with_a_key_run_in_submission_order():
+    loop = MainLoop()
+    worker = BackendWorker(loop.dispatch, max_workers=4)
+    order = []
+    tasks = [worker.submit(order.append, number, key='turn') for number in range(20)]
+    for task in tasks:
+        task.future.result(timeout=2.0)
+    assert order == list(range(20))
+    worker.shutdown()
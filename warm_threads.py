@@ -0,0 +1,188 @@
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from scheduler import BATCH, priority
+
+logger = logging.getLogger(__name__)
+
+
+class WarmThread:
+    """
+        A thread created ahead of time, optionally with its opening turn already generated.
+
+        Attributes:
+            thread_id (str): OpenAI thread ID.
+            created_at (float): time.monotonic() when the thread was prepared.
+            opener (str or None): Prompt of the pre-generated opening turn.
+            reply (str or None): Assistant reply to the opener.
+            messages (list): Messages of the opening turn, oldest first, not stored yet.
+    """
+
+    __slots__ = ('thread_id', 'created_at', 'opener', 'reply', 'messages')
+
+    def __init__(self, thread_id, opener=None, reply=None, messages=()):
+        self.thread_id = thread_id
+        self.created_at = time.monotonic()
+        self.opener = opener
+        self.reply = reply
+        self.messages = list(messages)
+
+
+class WarmThreadPool:
+    """
+        Keeps prepared threads per (subject, mode) so starting a conversation does not wait on threads.create.
+        Claimed threads are replaced in the background at BATCH priority, and threads older than the TTL are
+        discarded instead of handed out.
+
+        A key holds one thread until it is claimed, and then as many as were claimed within the last TTL, up to
+        size, so subjects that are only browsed past do not each cost a batch of threads that expire unused.
+
+        Attributes:
+            size (int): Most threads kept ready per key.
+            ttl (float): Seconds a prepared thread may wait before it is discarded.
+            hits (int): Claims served from the pool.
+            misses (int): Claims that found the pool empty.
+    """
+
+    def __init__(self, prepare, discard=None, size=2, ttl=1800.0, max_workers=2):
+        """
+            Args:
+                prepare (callable): prepare(subject, mode) returns a new WarmThread.
+                discard (callable, optional): discard(warm_thread) releases an expired or unused thread.
+                size (int): Most threads kept ready per key.
+                ttl (float): Seconds a prepared thread may wait before it is discarded.
+                max_workers (int): Threads preparing pool entries in the background.
+        """
+        self.size = size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._prepare = prepare
+        self._discard = discard
+        self._ready = defaultdict(deque)
+        self._pending = defaultdict(int)
+        self._claims = defaultdict(deque)  # key -> time.monotonic() of recent claims
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='warm-thread')
+        self._closed = False
+
+    def prime(self, subject, mode):
+        """
+            Starts filling the pool for a key, e.g. as soon as the user has chosen a subject and mode.
+        """
+        with self._lock:
+            expired = self._expire()
+            self._schedule_refill((subject, mode))
+            self._discard_later(expired)
+
+    def claim(self, subject, mode):
+        """
+            Takes a prepared thread for a key and schedules its replacement.
+
+            Returns:
+                WarmThread or None: Prepared thread, or None if none is ready.
+        """
+        key = (subject, mode)
+        with self._lock:
+            expired = self._expire()
+            ready = self._ready[key]
+            warm_thread = ready.popleft() if ready else None
+            if warm_thread is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            self._claims[key].append(time.monotonic())
+            self._schedule_refill(key)
+            self._discard_later(expired)
+        return warm_thread
+
+    def close(self):
+        """
+            Stops refilling and discards every thread still waiting in the pool.
+        """
+        with self._lock:
+            self._closed = True
+            leftovers = [warm_thread for ready in self._ready.values() for warm_thread in ready]
+            self._ready.clear()
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self._discard_all(leftovers)
+
+    def stats(self):
+        """
+            Returns the pool counters.
+
+            Returns:
+                dict: hits, misses, ready threads per key and refills in progress.
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "ready": {key: len(ready) for key, ready in self._ready.items()},
+                    "pending": sum(self._pending.values())}
+
+    def _expire(self):
+        # Caller holds the lock. Sweeps every key, so threads of keys nobody selects again do not linger.
+        expired = []
+        deadline = time.monotonic() - self.ttl
+        for ready in self._ready.values():
+            while ready and ready[0].created_at < deadline:
+                expired.append(ready.popleft())
+        for key in [key for key, claims in self._claims.items() if not claims or claims[-1] < deadline]:
+            del self._claims[key]
+        for claims in self._claims.values():
+            while claims[0] < deadline:
+                claims.popleft()
+        return expired
+
+    def _target(self, key):
+        # Caller holds the lock; _expire has just dropped claims older than the TTL
+        return min(self.size, max(1, len(self._claims.get(key, ()))))
+
+    def _schedule_refill(self, key):
+        # Caller holds the lock
+        if self._closed:
+            return
+        missing = self._target(key) - len(self._ready[key]) - self._pending[key]
+        for _ in range(missing):
+            self._pending[key] += 1
+            self._executor.submit(self._refill, key)
+
+    def _refill(self, key):
+        try:
+            with priority(BATCH):
+                warm_thread = self._prepare(*key)
+        except Exception as e:
+            logger.warning("Could not prepare a thread for %s: %s", key, e)
+            warm_thread = None
+        with self._lock:
+            self._pending[key] -= 1
+            if warm_thread is not None and not self._closed:
+                self._ready[key].append(warm_thread)
+                warm_thread = None
+        if warm_thread is not None:
+            self._discard_all([warm_thread])
+
+    def discard_later(self, warm_threads):
+        """
+            Discards threads in the background; deleting them is a round-trip the caller should not wait for.
+
+            Args:
+                warm_threads (list): WarmThreads to discard.
+        """
+        with self._lock:
+            self._discard_later(warm_threads)
+
+    def _discard_later(self, warm_threads):
+        # Caller holds the lock, so close() cannot shut the executor down in between
+        if warm_threads and not self._closed:
+            self._executor.submit(self._discard_all, warm_threads)
+
+    def _discard_all(self, warm_threads):
+        if self._discard is None:
+            return
+        for warm_thread in warm_threads:
+            try:
+                self._discard(warm_thread)
+            except Exception as e:
+                logger.warning("Could not discard thread %s: %s", warm_thread.thread_id, e)
@@ -0,0 +1,167 @@
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class Task:
+    """
+        Handle for a unit of work submitted to a BackendWorker.
+
+        Attributes:
+            key (hashable or None): Serialization key; tasks sharing a key run one after another.
+            future (Future): Future resolved with the task's result.
+    """
+
+    def __init__(self, func, args, kwargs, key, on_success, on_error):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.key = key
+        self.on_success = on_success
+        self.on_error = on_error
+        self.future = Future()
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        """
+            Cancels the task. A task that has not started yet never runs; a running task finishes in the
+            background but its callbacks are dropped.
+        """
+        self._cancelled.set()
+        self.future.cancel()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+
+class BackendWorker:
+    """
+        Runs blocking Backend calls on a thread pool and hands the results back to the Tk main loop.
+
+        Attributes:
+            dispatch (callable): Schedules a callable on the UI thread, e.g. GUI.call_in_ui.
+            on_busy_change (callable or None): Called on the UI thread with True when work starts and False
+                when the worker becomes idle.
+    """
+
+    def __init__(self, dispatch, max_workers=4, on_busy_change=None):
+        self.dispatch = dispatch
+        self.on_busy_change = on_busy_change
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='backend')
+        self._lock = threading.Lock()
+        self._waiting = {}  # key -> deque of tasks queued behind the running one
+        self._tasks = set()
+        self._delivering = set()  # finished tasks whose callback is waiting for the main loop
+        self._local = threading.local()
+
+    def submit(self, func, *args, key=None, on_success=None, on_error=None, **kwargs):
+        """
+            Submits func(*args, **kwargs) to the pool.
+
+            Args:
+                func (callable): Blocking function to run.
+                key (hashable, optional): Tasks with the same key run one at a time in submission order.
+                on_success (callable, optional): Called on the UI thread with the result.
+                on_error (callable, optional): Called on the UI thread with the raised exception.
+
+            Returns:
+                Task: Handle that can be cancelled.
+        """
+        task = Task(func, args, kwargs, key, on_success, on_error)
+        start = True
+        with self._lock:
+            was_idle = not self._tasks
+            self._tasks.add(task)
+            if key is not None:
+                if key in self._waiting:
+                    self._waiting[key].append(task)
+                    start = False
+                else:
+                    self._waiting[key] = deque()
+        if was_idle:
+            self._notify_busy(True)
+        if start:
+            self._executor.submit(self._run, task)
+        return task
+
+    def cancel(self, key=None):
+        """
+            Cancels every outstanding task, or only those with the given key.
+
+            Args:
+                key (hashable, optional): Key of the tasks to cancel.
+        """
+        with self._lock:
+            tasks = [task for task in self._tasks | self._delivering if key is None or task.key == key]
+        for task in tasks:
+            task.cancel()
+
+    def current_task(self):
+        """
+            Returns the task running on the calling worker thread, so long-running functions can stop early
+            once they have been cancelled.
+
+            Returns:
+                Task or None: Running task.
+        """
+        return getattr(self._local, 'task', None)
+
+    def shutdown(self):
+        self.cancel()
+        self._executor.shutdown(wait=False)
+
+    @property
+    def busy(self):
+        with self._lock:
+            return bool(self._tasks)
+
+    def _run(self, task):
+        if task.future.set_running_or_notify_cancel():
+            self._local.task = task
+            try:
+                result = task.func(*task.args, **task.kwargs)
+            except Exception as e:
+                task.future.set_exception(e)
+                if task.on_error is not None and not task.cancelled:
+                    self._dispatch_callback(task, task.on_error, e)
+            else:
+                task.future.set_result(result)
+                if task.on_success is not None and not task.cancelled:
+                    self._dispatch_callback(task, task.on_success, result)
+            finally:
+                self._local.task = None
+        self._advance(task)
+
+    def _dispatch_callback(self, task, callback, value):
+        # Still reachable by cancel() after _advance forgets the task
+        with self._lock:
+            self._delivering.add(task)
+        self.dispatch(self._deliver, task, callback, value)
+
+    def _deliver(self, task, callback, value):
+        # The task may have been cancelled while its result was waiting for the main loop
+        with self._lock:
+            self._delivering.discard(task)
+        if not task.cancelled:
+            callback(value)
+
+    def _advance(self, task):
+        next_task = None
+        with self._lock:
+            self._tasks.discard(task)
+            if task.key is not None:
+                waiting = self._waiting[task.key]
+                if waiting:
+                    next_task = waiting.popleft()
+                else:
+                    del self._waiting[task.key]
+            now_idle = not self._tasks
+        if next_task is not None:
+            self._executor.submit(self._run, next_task)
+        if now_idle:
+            self._notify_busy(False)
+
+    def _notify_busy(self, busy):
+        if self.on_busy_change is not None:
+            self.dispatch(self.on_busy_change, busy)